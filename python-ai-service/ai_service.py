@@ -1,35 +1,57 @@
 # AI Service for DPR System
 # Python-based ML/NLP service that integrates with Node.js backend
 
+# Start the startup clock before anything heavy is imported
+from startup_report import WARMUP_ENABLED, startup_report, timed_import
+
 import os
 import json
+import time
+import codecs
 import asyncio
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+from typing import AsyncIterator, BinaryIO, Collection, FrozenSet, Iterator, List, Dict, Optional, Any, Tuple
 import uvicorn
 
-# ML/AI Libraries
-import numpy as np
-import pandas as pd
-from transformers import (
-    AutoTokenizer, AutoModel, AutoModelForSequenceClassification,
-    pipeline, BertTokenizer, BertModel
+from batching import MicroBatcher
+from chunking import TOKEN_BUDGET, TextWindow, merge_entities, merge_sentiment, split_into_windows
+from delay_model import DELAY_MODEL_PATH, DelayModel, delay_covariates
+from embedding_index import EmbeddingIndex, normalize
+from gbm_risk import GBM_PREDICTOR, GBM_RISK_MODEL_PATH, GBM_THREADS, GBMRiskModel, risk_feature_rows
+from event_stream import StageEvent, admitted_event_stream
+from features import build_features, extract_features, feature_scanner
+from inference_backend import INFERENCE_BACKEND, NER_MODEL, SENTIMENT_MODEL, build_pipeline
+from inference_executor import InferenceExecutor
+from job_queue import JobQueue
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, MetricsRegistry, StageTimer, service_samples
+from model_registry import PRELOAD_MODELS, ModelRegistry
+from near_duplicates import NearDuplicateIndex, minhash_signature
+from paragraphs import (
+    PARAGRAPH_CACHE_DB_PATH, PARAGRAPH_CACHE_ENTRIES, PARAGRAPH_CACHE_MAX_BYTES, PARAGRAPH_CACHE_TTL_SECONDS,
+    Paragraph, paragraph_cache_key, split_paragraphs
 )
-import torch
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-import xgboost as xgb
-import lightgbm as lgb
-from lifelines import CoxPHFitter, KaplanMeierFitter
-import re
-from datetime import datetime, timedelta
+from portfolio import (
+    BASE_RISK, DEFAULT_ISSUE_DELAY_DAYS, DEFAULT_ISSUE_RISK, DELAY_CONFIDENCE, ISSUE_DELAY_DAYS, ISSUE_RISK_WEIGHTS,
+    PORTFOLIO_CHUNK_ROWS, PORTFOLIO_MAX_BYTES, csv_pieces, keep_columns, score_table, summarize_table, table_format
+)
+from request_timing import add_stages, debug_timing_requested, request_timer, span
+from result_cache import ResultCache, make_cache_key
+from stage_graph import StageGraph
+from streaming_upload import iter_text_segments, receive_upload, upload_field
+from text_scanner import SCRIPT_PATTERNS, detect_scripts
+
+# ML/AI Libraries; torch, transformers, xgboost and lightgbm are imported by the model loaders and gbm_risk
+import numpy as np
+from datetime import datetime
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+startup_report.mark("imports")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -47,6 +69,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts and latencies per route, and per-stage latencies, served at /metrics
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# Stages of the analysis and the stages each response field is computed from; a request
+# that names `fields` only runs the stages those fields need, so e.g. risk and completeness
+# never load the transformer models
+analysis_graph = StageGraph(
+    dependencies={
+        "language": [],
+        "windows": [],  # token windows for the sentiment and NER models
+        "sentiment": ["windows"],
+        "ner": ["windows"],
+        "features": [],
+        "risk": ["features"],
+        "delay": ["features"],
+    },
+    outputs={
+        # The analysis text also describes the risk level when risk was scored
+        "analysis": ["language", "sentiment", "features"],
+        "sentiment": ["sentiment"],
+        "confidence": ["sentiment"],
+        "completeness": ["features"],
+        "compliance": ["risk"],
+        "risk": ["risk"],
+        "language": ["language"],
+        "entities": ["ner"],
+        "recommendations": ["risk"],
+        "risk_factors": ["features"],
+        "delay": ["delay"],
+        "document_coverage": ["windows"],
+    }
+)
+ALL_STAGES = frozenset(analysis_graph.order)
+
+# Left out when a request sets include_risk_assessment=False
+RISK_FIELDS = frozenset({"risk", "compliance", "recommendations", "risk_factors"})
+
+# What /analyze-files returns, unless the request names its own fields
+FILE_ANALYSIS_FIELDS = ["analysis", "confidence", "recommendations"]
+
 # Pydantic models for request/response
 class DPRAnalysisRequest(BaseModel):
     text: str
@@ -55,94 +118,324 @@ class DPRAnalysisRequest(BaseModel):
     language: str = "en"
     include_risk_assessment: bool = True
     include_delay_prediction: bool = True
+    use_cache: bool = True  # False forces a fresh analysis (the result still refreshes the cache)
+    debug_timing: bool = False  # True (or an X-Debug-Timing header) adds a per-span `timing` breakdown
+    fields: Optional[List[str]] = None  # response fields to compute (analysis_graph outputs); None means all
+    
+    @field_validator('fields')
+    @classmethod
+    def check_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        return fields if fields is None else analysis_graph.validate_fields(fields)
 
+# Fields a request did not ask for are None
 class DPRAnalysisResponse(BaseModel):
-    analysis: str
-    sentiment_score: float
-    confidence_score: float
-    completeness_score: float
-    compliance_score: float
-    risk_score: float
-    language_detected: str
-    entities: List[Dict[str, Any]]
-    recommendations: List[str]
-    risk_factors: List[str]
+    analysis: Optional[str] = None
+    sentiment_score: Optional[float] = None
+    confidence_score: Optional[float] = None
+    completeness_score: Optional[float] = None
+    compliance_score: Optional[float] = None
+    risk_score: Optional[float] = None
+    language_detected: Optional[str] = None
+    entities: Optional[List[Dict[str, Any]]] = None
+    recommendations: Optional[List[str]] = None
+    risk_factors: Optional[List[str]] = None
     delay_prediction: Optional[Dict[str, Any]] = None
+    document_coverage: Optional[Dict[str, Any]] = None
+    near_duplicate: Optional[Dict[str, Any]] = None  # set when model outputs were reused from a near-identical text
     processing_time: float
+    cached: bool = False
+    timing: Optional[Dict[str, Any]] = None
 
 class FileAnalysisRequest(BaseModel):
     file_content: str
     file_type: str
     issue_type: str
     language: str = "en"
+    use_cache: bool = True
+    debug_timing: bool = False
+    fields: Optional[List[str]] = None  # defaults to FILE_ANALYSIS_FIELDS
+    
+    @field_validator('fields')
+    @classmethod
+    def check_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        return fields if fields is None else analysis_graph.validate_fields(fields)
+
+class FileAnalysisJobRequest(FileAnalysisRequest):
+    priority: int = 0  # higher priorities run first
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+class EmbeddingItem(BaseModel):
+    id: str
+    text: str
+    metadata: Dict[str, Any] = {}  # returned with similarity results, e.g. title and project
+
+class EmbeddingIndexRequest(BaseModel):
+    items: List[EmbeddingItem]
+
+class SimilarRequest(BaseModel):
+    # Either the text of a report or the id of an indexed one (which is left out of the results)
+    text: Optional[str] = None
+    id: Optional[str] = None
+    top_k: int = Field(10, ge=1, le=100)
+    
+    @model_validator(mode='after')
+    def check_query(self) -> 'SimilarRequest':
+        if (self.text is None) == (self.id is None):
+            raise ValueError("Give exactly one of `text` and `id`")
+        return self
+
+class BatchAnalysisRequest(BaseModel):
+    # Each item is a DPRAnalysisRequest, validated individually so a malformed item only fails itself
+    requests: List[Any]
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[DPRAnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+    processing_time: float
 
-# Global variables for models (loaded once at startup)
-models = {}
-tokenizers = {}
-pipelines = {}
+MAX_BATCH_ITEMS = int(os.getenv("AI_MAX_BATCH_ITEMS", "1000"))
+MAX_EMBED_ITEMS = int(os.getenv("AI_MAX_EMBED_ITEMS", "256"))
+# BERT takes 512 tokens including [CLS] and [SEP]; longer documents are embedded window by window
+EMBEDDING_WINDOW_TOKENS = int(os.getenv("AI_EMBEDDING_WINDOW_TOKENS", "510"))
+
+# Model identifiers; part of the result cache key, with SENTIMENT_MODEL and NER_MODEL from inference_backend
+BERT_MODEL = "bert-base-multilingual-cased"
+INDIC_BERT_MODEL = "ai4bharat/indic-bert"
+
+# Global variables for models; every model lives in the registry and loads on first use
+batchers = {}
+model_registry = ModelRegistry()
+
+# Short text pushed through preloaded pipelines so the first request does not pay for lazy initialization
+WARMUP_TEXT = "Project timeline and budget are under review."
 
 class AIModelManager:
     def __init__(self):
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        logger.info(f"Using device: {self.device}")
+        self.device = None  # resolved when torch is first imported by a model loader
+        # Quantized and ONNX backends give slightly different scores, so the backend is part of the version
+        self.model_version = f"{app.version}|{SENTIMENT_MODEL}|{NER_MODEL}|{INFERENCE_BACKEND}"
+        self.startup_loaded = False
+        self.delay_model: Optional[DelayModel] = None
+        self.delay_model_info: Dict[str, Any] = {"source": "rules", "version": None}
+        self.risk_model: Optional[GBMRiskModel] = None
+        self.risk_model_info: Dict[str, Any] = {"source": "rules", "version": None}
+        self.register_models()
         
+    def register_models(self):
+        """Register models with the lazy registry"""
+        model_registry.register('bert', self.load_bert, description=f"BERT multilingual ({BERT_MODEL})")
+        model_registry.register('indic_bert', self.load_indic_bert, description=f"IndicBERT ({INDIC_BERT_MODEL})")
+        model_registry.register('sentiment', self.load_sentiment_pipeline, description=f"Sentiment pipeline ({SENTIMENT_MODEL}, {INFERENCE_BACKEND})")
+        model_registry.register('ner', self.load_ner_pipeline, description=f"NER pipeline ({NER_MODEL}, {INFERENCE_BACKEND})")
+
+    def resolve_device(self):
+        """Import torch and pick the inference device"""
+        torch = timed_import('torch')
+        if self.device is None:
+            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            logger.info(f"Using device: {self.device}")
+        return self.device
+
+    def pipeline_device(self) -> int:
+        return 0 if self.resolve_device().type == 'cuda' else -1
+
+    def load_bert(self) -> Dict[str, Any]:
+        """Load BERT multilingual model"""
+        self.resolve_device()
+        transformers = timed_import('transformers')
+        return {
+            'tokenizer': transformers.AutoTokenizer.from_pretrained(BERT_MODEL),
+            'model': transformers.AutoModel.from_pretrained(BERT_MODEL)
+        }
+
+    def load_indic_bert(self) -> Dict[str, Any]:
+        """Load IndicBERT for Indian languages"""
+        self.resolve_device()
+        transformers = timed_import('transformers')
+        return {
+            'tokenizer': transformers.AutoTokenizer.from_pretrained(INDIC_BERT_MODEL),
+            'model': transformers.AutoModel.from_pretrained(INDIC_BERT_MODEL)
+        }
+
+    def load_sentiment_pipeline(self):
+        """Load sentiment analysis pipeline on the configured inference backend"""
+        return build_pipeline(
+            "sentiment-analysis",
+            SENTIMENT_MODEL,
+            device=self.pipeline_device()
+        )
+
+    def load_ner_pipeline(self):
+        """Load NER pipeline on the configured inference backend"""
+        return build_pipeline(
+            "ner",
+            NER_MODEL,
+            aggregation_strategy="simple",
+            device=self.pipeline_device()
+        )
+
     async def load_models(self):
-        """Load all AI models at startup"""
+        """Load models needed at startup; everything else loads on first use"""
+        # Workers forked by serve.py inherit the models loaded in its master process
+        if not self.startup_loaded:
+            self.load_models_sync()
+
+    def load_models_sync(self):
+        """Load startup models (blocking, also used by process-pool workers)"""
         try:
             logger.info("Loading AI models...")
             
-            # Load BERT multilingual model
-            models['bert_tokenizer'] = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
-            models['bert_model'] = AutoModel.from_pretrained('bert-base-multilingual-cased')
-            
-            # Load IndicBERT for Indian languages
-            try:
-                models['indic_tokenizer'] = AutoTokenizer.from_pretrained('ai4bharat/indic-bert')
-                models['indic_model'] = AutoModel.from_pretrained('ai4bharat/indic-bert')
-            except Exception as e:
-                logger.warning(f"Could not load IndicBERT: {e}")
-            
-            # Load sentiment analysis pipeline
-            pipelines['sentiment'] = pipeline(
-                "sentiment-analysis",
-                model="cardiffnlp/twitter-roberta-base-sentiment-latest",
-                device=0 if torch.cuda.is_available() else -1
-            )
-            
-            # Load NER pipeline
-            pipelines['ner'] = pipeline(
-                "ner",
-                model="dbmdz/bert-large-cased-finetuned-conll03-english",
-                aggregation_strategy="simple",
-                device=0 if torch.cuda.is_available() else -1
-            )
-            
-            # Initialize traditional ML models
-            models['random_forest'] = RandomForestClassifier(n_estimators=100, random_state=42)
-            models['xgboost'] = xgb.XGBClassifier(random_state=42)
-            models['lightgbm'] = lgb.LGBMClassifier(random_state=42)
-            models['scaler'] = StandardScaler()
+            # Models listed in AI_PRELOAD_MODELS are loaded now instead of on first use
+            with startup_report.phase("model_loading"):
+                model_registry.preload(PRELOAD_MODELS)
+                self.load_delay_model()
+                self.load_risk_model()
             
+            self.startup_loaded = True
             logger.info("All models loaded successfully!")
             
         except Exception as e:
             logger.error(f"Error loading models: {e}")
             raise e
 
+    def load_delay_model(self):
+        """Load the trained Cox delay model; without an artifact, delays come from the rule tables"""
+        if not os.path.exists(DELAY_MODEL_PATH):
+            logger.info(f"No delay model artifact at {DELAY_MODEL_PATH}; using rule-based delays (train one with train_delay_model.py)")
+            return
+        self.delay_model = DelayModel.load(DELAY_MODEL_PATH)
+        metadata = self.delay_model.metadata
+        self.delay_model_info = {
+            "source": "artifact",
+            "version": metadata['version'],
+            "trained_at": metadata.get('trained_at'),
+            "rows": metadata.get('rows'),
+            "horizon_days": self.delay_model.horizon_days,
+            "path": DELAY_MODEL_PATH
+        }
+        logger.info(f"Loaded delay model {metadata['version']} from {DELAY_MODEL_PATH}")
+
+    def load_risk_model(self):
+        """Load and warm up the trained gradient-boosted risk model; without an artifact, risk comes from the rule tables"""
+        if not os.path.exists(GBM_RISK_MODEL_PATH):
+            logger.info(f"No risk model artifact at {GBM_RISK_MODEL_PATH}; using rule-based risk scores (train one with train_gbm_risk_model.py)")
+            return
+        model = GBMRiskModel.load(GBM_RISK_MODEL_PATH)
+        with startup_report.phase("warmup"):
+            model.warmup()
+        self.risk_model = model
+        metadata = model.metadata
+        self.risk_model_info = {
+            "source": "artifact",
+            "library": model.library,
+            "predictor": model.predictor,
+            "threads": GBM_THREADS,
+            "version": metadata['version'],
+            "trained_at": metadata.get('trained_at'),
+            "rows": metadata.get('rows'),
+            "path": GBM_RISK_MODEL_PATH
+        }
+        logger.info(f"Loaded {model.library} risk model {metadata['version']} from {GBM_RISK_MODEL_PATH} ({GBM_PREDICTOR} predictor)")
+
+    @property
+    def analysis_version(self) -> str:
+        """Version of full analysis results: the text models plus the risk and delay models"""
+        return (
+            f"{self.model_version}|risk:{self.risk_model_info['version'] or 'rules'}"
+            f"|delay:{self.delay_model_info['version'] or 'rules'}"
+        )
+
+    def warmup(self):
+        """Run a short input through each preloaded pipeline"""
+        with startup_report.phase("warmup"):
+            if model_registry.is_loaded('sentiment'):
+                run_sentiment_batch([WARMUP_TEXT])
+            if model_registry.is_loaded('ner'):
+                run_ner_batch([WARMUP_TEXT])
+
 model_manager = AIModelManager()
 
+def init_inference_worker():
+    """Make sure startup models exist in a process-pool worker"""
+    if not model_manager.startup_loaded:
+        model_manager.load_models_sync()
+
+inference_executor = InferenceExecutor(initializer=init_inference_worker)
+result_cache = ResultCache()
+near_duplicates = NearDuplicateIndex()
+# Per-paragraph model outputs and text statistics, so an edited report only re-runs the changed paragraphs
+paragraph_cache = ResultCache(
+    max_entries=PARAGRAPH_CACHE_ENTRIES,
+    max_bytes=PARAGRAPH_CACHE_MAX_BYTES,
+    ttl_seconds=PARAGRAPH_CACHE_TTL_SECONDS,
+    db_path=PARAGRAPH_CACHE_DB_PATH
+)
+job_queue = JobQueue()
+embedding_index = EmbeddingIndex(model=BERT_MODEL)
+
+def run_sentiment_batch(texts: List[str]) -> List[Dict[str, Any]]:
+    """Run the sentiment pipeline once over a batch of texts"""
+    return model_registry.get('sentiment')(texts, batch_size=len(texts), truncation=True)
+
+def run_ner_batch(texts: List[str]) -> List[List[Dict[str, Any]]]:
+    """Run the NER pipeline once over a batch of texts"""
+    results = model_registry.get('ner')(texts, batch_size=len(texts))
+    # A single-item list comes back unwrapped
+    return [results] if len(texts) == 1 and results and isinstance(results[0], dict) else results
+
+def run_embedding_batch(texts: List[str]) -> List[np.ndarray]:
+    """Mean-pooled BERT embeddings of a batch of texts, one float32 vector each"""
+    torch = timed_import('torch')
+    bert = model_registry.get('bert')
+    model = bert['model']
+    encoded = bert['tokenizer'](
+        texts, padding=True, truncation=True, max_length=EMBEDDING_WINDOW_TOKENS + 2, return_tensors='pt'
+    ).to(model.device)
+    with torch.no_grad():
+        hidden = model(**encoded).last_hidden_state
+    # Average over real tokens only; padding positions are masked out
+    mask = encoded['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return list(pooled.float().cpu().numpy())
+
 @app.on_event("startup")
 async def startup_event():
     """Load models when the service starts"""
     await model_manager.load_models()
+    if WARMUP_ENABLED:
+        model_manager.warmup()
+    batchers['sentiment'] = MicroBatcher('sentiment', run_sentiment_batch, executor=inference_executor.executor)
+    batchers['ner'] = MicroBatcher('ner', run_ner_batch, executor=inference_executor.executor)
+    batchers['embedding'] = MicroBatcher('embedding', run_embedding_batch, executor=inference_executor.executor)
+    await job_queue.start()
+    startup_report.models_ready()
+    startup_report.ready()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the job workers, the batching workers and the inference executor, then commit queued cache writes"""
+    await job_queue.stop()
+    for batcher in batchers.values():
+        await batcher.stop()
+    inference_executor.shutdown()
+    result_cache.close_disk()
+    paragraph_cache.close_disk()
 
 @app.get("/")
 async def root():
     return {
         "message": "AI DPR Analysis Service",
         "status": "running",
-        "models_loaded": len(models) + len(pipelines),
-        "device": str(model_manager.device)
+        "models_loaded": sum(1 for name in model_registry.names() if model_registry.is_loaded(name)),
+        "device": str(model_manager.device or "not initialized")
     }
 
 @app.get("/health")
@@ -151,70 +444,42 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "models": {
-            "bert": "bert_model" in models,
-            "indic_bert": "indic_model" in models,
-            "sentiment": "sentiment" in pipelines,
-            "ner": "ner" in pipelines,
-            "random_forest": "random_forest" in models,
-            "xgboost": "xgboost" in models,
-            "lightgbm": "lightgbm" in models
-        }
+            "bert": model_registry.is_loaded('bert'),
+            "indic_bert": model_registry.is_loaded('indic_bert'),
+            "sentiment": model_registry.is_loaded('sentiment'),
+            "ner": model_registry.is_loaded('ner'),
+            "xgboost": model_manager.risk_model_info.get('library') == 'xgboost',
+            "lightgbm": model_manager.risk_model_info.get('library') == 'lightgbm'
+        },
+        "risk_model": model_manager.risk_model_info,
+        "delay_model": model_manager.delay_model_info,
+        "inference": inference_executor.stats(),
+        "jobs": job_queue.stats()
     }
 
 def detect_language(text: str) -> str:
     """Simple language detection based on script"""
-    # Check for Devanagari script (Hindi)
-    if re.search(r'[\u0900-\u097F]', text):
-        return "hi"
-    # Check for Telugu script
-    elif re.search(r'[\u0C00-\u0C7F]', text):
-        return "te"
-    # Check for Tamil script
-    elif re.search(r'[\u0B80-\u0BFF]', text):
-        return "ta"
-    # Check for Bengali script
-    elif re.search(r'[\u0980-\u09FF]', text):
-        return "bn"
+    languages = detect_scripts(text)
     # Default to English
-    else:
-        return "en"
+    return languages[0] if languages else "en"
 
-def extract_features(text: str, project_data: Dict) -> Dict[str, float]:
-    """Extract numerical features for ML models"""
-    features = {}
-    
-    # Text features
-    features['word_count'] = len(text.split())
-    features['sentence_count'] = len(re.split(r'[.!?]+', text))
-    features['avg_word_length'] = np.mean([len(word) for word in text.split()])
-    features['technical_terms'] = len(re.findall(r'\b(budget|timeline|resource|risk|compliance|deadline|milestone)\b', text.lower()))
-    
-    # Project features (with defaults)
-    features['budget_size'] = project_data.get('budget', 100000)
-    features['timeline_days'] = project_data.get('timeline_days', 90)
-    features['team_size'] = project_data.get('team_size', 5)
-    features['complexity_score'] = project_data.get('complexity', 3)
-    
-    # Derived features
-    features['budget_per_day'] = features['budget_size'] / max(features['timeline_days'], 1)
-    features['words_per_sentence'] = features['word_count'] / max(features['sentence_count'], 1)
-    
-    return features
+def calculate_risk_scores(features: List[Dict[str, float]], issue_types: List[str]) -> List[float]:
+    """Risk scores for many DPRs; a trained risk model scores them all in one call"""
+    risk_model = model_manager.risk_model
+    if risk_model is None:
+        return [calculate_risk_score(item, issue_type) for item, issue_type in zip(features, issue_types)]
+    return risk_model.predict(risk_feature_rows(features, issue_types)).tolist()
 
 def calculate_risk_score(features: Dict[str, float], issue_type: str) -> float:
     """Calculate risk score based on features and issue type"""
-    base_risk = 0.3
-    
-    # Issue type weights
-    issue_weights = {
-        'Budget Mismatch': 0.4,
-        'Unrealistic Schedule': 0.35,
-        'Resource Allocation': 0.25,
-        'Compliance Issue': 0.3,
-        'Technical Risk': 0.35
-    }
+    risk_model = model_manager.risk_model
+    if risk_model is not None:
+        return float(risk_model.predict(risk_feature_rows([features], [issue_type]))[0])
     
-    issue_risk = issue_weights.get(issue_type, 0.3)
+    base_risk = BASE_RISK
+    
+    # Issue type weights; portfolio.risk_scores applies the same rules to whole tables
+    issue_risk = ISSUE_RISK_WEIGHTS.get(issue_type, DEFAULT_ISSUE_RISK)
     
     # Feature-based adjustments
     if features['budget_size'] > 1000000:
@@ -262,7 +527,27 @@ def generate_recommendations(issue_type: str, risk_score: float) -> List[str]:
     return recommendations
 
 def predict_delay(features: Dict[str, float], issue_type: str) -> Dict[str, Any]:
-    """Predict project delay using survival analysis concepts"""
+    """Predict project delay with the trained survival model, or the rule tables without one"""
+    risk_factors = [
+        f"Timeline pressure: {features['timeline_days']} days",
+        f"Budget scale: ${features['budget_size']:,.0f}",
+        f"Issue type: {issue_type}"
+    ]
+    delay_model = model_manager.delay_model
+    if delay_model is not None:
+        predicted = delay_model.predict(delay_covariates(
+            [issue_type], [features['budget_size']], [features['timeline_days']],
+            [features['complexity_score']], [features['technical_terms']]
+        ))
+        return {
+            'expected_delay_days': float(predicted['expected_delay_days'][0]),
+            'median_delay_days': int(predicted['median_delay_days'][0]),
+            'p90_delay_days': int(predicted['p90_delay_days'][0]),
+            'delay_probability': float(predicted['delay_probability'][0]),
+            'confidence': delay_model.confidence,
+            'model_version': delay_model.version,
+            'risk_factors': risk_factors
+        }
     
     # Simple delay prediction based on features
     base_delay = 0
@@ -274,150 +559,1116 @@ def predict_delay(features: Dict[str, float], issue_type: str) -> Dict[str, Any]
     if features['complexity_score'] > 7:
         base_delay += 7
     
-    issue_delays = {
-        'Budget Mismatch': 15,
-        'Unrealistic Schedule': 20,
-        'Resource Allocation': 12,
-        'Compliance Issue': 8,
-        'Technical Risk': 18
-    }
-    
-    total_delay = base_delay + issue_delays.get(issue_type, 10)
+    # portfolio.delay_predictions applies the same rules to whole tables
+    total_delay = base_delay + ISSUE_DELAY_DAYS.get(issue_type, DEFAULT_ISSUE_DELAY_DAYS)
     probability = min(0.1 + (total_delay / 100), 0.9)
     
     return {
         'expected_delay_days': total_delay,
         'delay_probability': probability,
-        'confidence': 0.75,
-        'risk_factors': [
-            f"Timeline pressure: {features['timeline_days']} days",
-            f"Budget scale: ${features['budget_size']:,.0f}",
-            f"Issue type: {issue_type}"
+        'confidence': DELAY_CONFIDENCE,
+        'risk_factors': risk_factors
+    }
+
+def signed_sentiment(sentiment_result: Dict[str, Any]) -> float:
+    """Map a sentiment pipeline result to a signed score"""
+    return sentiment_result['score'] if sentiment_result['label'] in ['POSITIVE', 'POS'] else -sentiment_result['score']
+
+def window_models(stages: Collection[str]) -> Tuple[str, ...]:
+    """The windowed models the stages use; both when only the document coverage is wanted"""
+    return tuple(name for name in ('sentiment', 'ner') if name in stages) or ('sentiment', 'ner')
+
+def plan_model_windows(text: str, models: Tuple[str, ...] = ('sentiment', 'ner')) -> Dict[str, Any]:
+    """Split a whole document into token windows for the sentiment and NER models (those in `models`)"""
+    plan = {}
+    coverages = {}
+    for name in models:
+        plan[name], coverages[name] = split_into_windows(text, model_registry.get(name).tokenizer)
+    # Token counts are reported for the first model's tokenizer
+    coverage = coverages[models[0]]
+    plan['coverage'] = {
+        **{f'{name}_windows': coverages[name]['windows'] for name in models},
+        'total_tokens': coverage['total_tokens'],
+        'analyzed_tokens': coverage['analyzed_tokens'],
+        'truncated': any(coverages[name]['truncated'] for name in models)
+    }
+    return plan
+
+async def run_sentiment_windows(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Sentiment over every planned window, merged into one document result"""
+    with metrics.time_stage("sentiment"), span("sentiment"):
+        results = await batchers['sentiment'].submit_many([window.text for window in plan['sentiment']])
+    return merge_sentiment(plan['sentiment'], results, signed_sentiment)
+
+async def run_ner_windows(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """NER over every planned window, merged into document-level entities"""
+    with metrics.time_stage("ner"), span("ner"):
+        results = await batchers['ner'].submit_many([window.text for window in plan['ner']])
+    return merge_entities(plan['ner'], results)
+
+async def skipped_stage() -> None:
+    return None
+
+async def run_windowed_models(
+    text: str, stages: Collection[str] = ALL_STAGES
+) -> Tuple[Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]:
+    """Run sentiment and NER (those in `stages`) over every window of a document and merge the results"""
+    if 'windows' not in stages:
+        return None, None, None
+    with span("window_planning"):
+        plan = await inference_executor.run(plan_model_windows, text, window_models(stages))
+    sentiment_result, entities = await asyncio.gather(
+        run_sentiment_windows(plan) if 'sentiment' in stages else skipped_stage(),
+        run_ner_windows(plan) if 'ner' in stages else skipped_stage()
+    )
+    return sentiment_result, entities, plan['coverage']
+
+def document_paragraphs(text: str) -> List[Paragraph]:
+    """Paragraph units of a document, or [] when it is analyzed as a whole (a single paragraph, or the cache is off)"""
+    if not paragraph_cache.enabled:
+        return []
+    paragraphs = split_paragraphs(text)
+    return paragraphs if len(paragraphs) > 1 else []
+
+def plan_paragraph_windows(
+    texts: List[str], cached_tokens: List[Dict[str, int]], models: Tuple[str, ...]
+) -> List[Dict[str, Any]]:
+    """Windows of the paragraphs whose model outputs are not cached, within each model's document token budget
+
+    Paragraphs use up the budget in document order; a cached paragraph costs its stored token count.
+    Per paragraph and model the plan is 'cached', 'skipped' (budget used up) or (windows, coverage).
+    """
+    plans = [{} for _ in texts]
+    for name in models:
+        tokenizer = model_registry.get(name).tokenizer
+        remaining = TOKEN_BUDGET
+        for text, cached, plan in zip(texts, cached_tokens, plans):
+            tokens = cached.get(name)
+            if remaining <= 0:
+                plan[name] = 'skipped'
+            elif tokens is not None and tokens <= remaining:
+                plan[name] = 'cached'
+                remaining -= tokens
+            else:
+                plan[name] = split_into_windows(text, tokenizer, token_budget=remaining)
+                remaining -= plan[name][1]['analyzed_tokens']
+    return plans
+
+def paragraph_entry(name: str, windows: List[TextWindow], coverage: Dict[str, Any], results: Optional[List[Any]]) -> Dict[str, Any]:
+    """Cacheable outputs of one model over one paragraph; offsets are relative to the paragraph"""
+    entry = {key: coverage[key] for key in ('total_tokens', 'analyzed_tokens', 'truncated')}
+    entry['windows'] = len(windows)
+    if results is not None and name == 'sentiment':
+        entry.update(weights=[max(window.new_token_count, 1) for window in windows], results=results)
+    elif results is not None:
+        entry['entities'] = merge_entities(windows, results)
+    return entry
+
+async def run_paragraph_models(
+    paragraphs: List[Paragraph], stages: Collection[str] = ALL_STAGES, reuse: bool = True
+) -> Tuple[Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]:
+    """run_windowed_models for a multi-paragraph document; only paragraphs missing from the paragraph cache are run"""
+    models = window_models(stages)
+    run_models = [name for name in models if name in stages]
+    version = model_manager.model_version
+    with span("paragraph_lookup"):
+        entries = [{
+            name: paragraph_cache.get(paragraph_cache_key(paragraph, name, version)) if reuse and name in run_models else None
+            for name in models
+        } for paragraph in paragraphs]
+    with span("window_planning"):
+        plans = await inference_executor.run(
+            plan_paragraph_windows,
+            [paragraph.text for paragraph in paragraphs],
+            [{name: entry['total_tokens'] for name, entry in cached.items() if entry is not None} for cached in entries],
+            models
+        )
+    
+    async def run_model(name: str):
+        # Fresh windows of every paragraph go to the batcher together
+        pending = [(index, plan[name]) for index, plan in enumerate(plans) if isinstance(plan[name], tuple)]
+        with metrics.time_stage(name), span(name):
+            results = await batchers[name].submit_many([window.text for _, (windows, _) in pending for window in windows])
+        for index, (windows, coverage) in pending:
+            entries[index][name] = paragraph_entry(name, windows, coverage, results[:len(windows)])
+            results = results[len(windows):]
+            if not coverage['truncated']:
+                paragraph_cache.set(paragraph_cache_key(paragraphs[index], name, version), entries[index][name])
+    
+    await asyncio.gather(*(run_model(name) for name in run_models))
+    
+    # Models that only report coverage still need token counts from their plans
+    for plan, paragraph_entries in zip(plans, entries):
+        for name in models:
+            if isinstance(plan[name], tuple) and paragraph_entries[name] is None:
+                paragraph_entries[name] = paragraph_entry(name, plan[name][0], plan[name][1], None)
+    
+    analyzed = {name: [(paragraph, cached[name]) for paragraph, cached, plan in zip(paragraphs, entries, plans)
+                       if plan[name] != 'skipped'] for name in models}
+    sentiment_result = entities = None
+    if 'sentiment' in run_models:
+        weights = [weight for _, entry in analyzed['sentiment'] for weight in entry['weights']]
+        sentiment_result = merge_sentiment(
+            [TextWindow(text="", char_start=0, char_end=0, token_count=weight, new_token_count=weight) for weight in weights],
+            [result for _, entry in analyzed['sentiment'] for result in entry['results']],
+            signed_sentiment
+        )
+    if 'ner' in run_models:
+        entities = [
+            {**entity, 'start': entity['start'] + paragraph.start, 'end': entity['end'] + paragraph.start}
+            if entity.get('start') is not None else entity
+            for paragraph, entry in analyzed['ner'] for entity in entry['entities']
         ]
+    
+    # Token counts are reported for the first model's tokenizer, as for whole documents
+    first = analyzed[models[0]]
+    coverage = {
+        **{f'{name}_windows': sum(entry['windows'] for _, entry in analyzed[name]) for name in models},
+        'total_tokens': sum(entry['total_tokens'] for _, entry in first),
+        'analyzed_tokens': sum(entry['analyzed_tokens'] for _, entry in first),
+        'truncated': any(plan[name] == 'skipped' or entry[name]['truncated'] for plan, entry in zip(plans, entries) for name in models),
+        'paragraphs': len(paragraphs),
+        'paragraphs_reused': sum(all(plan[name] == 'cached' for name in run_models) for plan in plans) if run_models else 0
     }
+    return sentiment_result, entities, coverage
 
-@app.post("/analyze", response_model=DPRAnalysisResponse)
-async def analyze_dpr(request: DPRAnalysisRequest):
-    """Main DPR analysis endpoint"""
-    start_time = datetime.now()
+def scan_paragraphs(texts: List[str]) -> List[Dict[str, Any]]:
+    """Text statistics of paragraphs; they add up to those of the whole document"""
+    scans = []
+    for text in texts:
+        scan = feature_scanner.scan(text)
+        scans.append({
+            'languages': scan.languages,
+            'word_count': scan.word_count,
+            'word_length_total': scan.word_length_total,
+            'terminator_runs': scan.terminator_runs,
+            'technical_terms': scan.technical_terms
+        })
+    return scans
+
+async def score_paragraphs(
+    paragraphs: List[Paragraph], project_data: Dict, issue_type: str, stages: Collection[str] = ALL_STAGES, reuse: bool = True
+) -> Dict[str, Any]:
+    """compute_features_and_risk from per-paragraph text statistics, scanning only uncached paragraphs"""
+    if 'features' not in stages:
+        return {'stage_seconds': {}}
+    timer = StageTimer()
+    with timer("features"):
+        keys = [paragraph_cache_key(paragraph, 'scan', model_manager.model_version) for paragraph in paragraphs]
+        scans = [paragraph_cache.get(key) if reuse else None for key in keys]
+        missing = [index for index, scan in enumerate(scans) if scan is None]
+        if missing:
+            fresh = await inference_executor.run(scan_paragraphs, [paragraphs[index].text for index in missing])
+            for index, scan in zip(missing, fresh):
+                scans[index] = scan
+                paragraph_cache.set(keys[index], scan)
+        word_count = sum(scan['word_count'] for scan in scans)
+        scored = {'features': build_features(
+            word_count,
+            sum(scan['terminator_runs'] for scan in scans) + 1,
+            sum(scan['word_length_total'] for scan in scans) / word_count if word_count else np.nan,
+            sum(scan['technical_terms'] for scan in scans),
+            project_data
+        )}
+    if 'risk' in stages:
+        with timer("risk"):
+            scored['risk_score'] = calculate_risk_score(scored['features'], issue_type)
+    scored['stage_seconds'] = timer.seconds
+    return scored
+
+# Stages whose outputs are worth reusing for a near-identical text. NER always runs on the new text,
+# since entity spans name the exact dates, amounts and names of the text they came from
+REUSABLE_STAGES = ('windows', 'sentiment')
+
+async def run_model_stages(
+    text: str, stages: Collection[str] = ALL_STAGES, reuse: bool = True, paragraphs: Optional[List[Paragraph]] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """run_windowed_models, reusing sentiment and coverage of a recently analyzed near-identical text
+
+    The fourth value describes the reuse (similarity, reused stages, when the source was analyzed)
+    and is None after a fresh run. Entities, features and risk are always computed from the new text.
+    With `paragraphs`, the models only re-run on paragraphs missing from the paragraph cache
+    (on all of them, refreshing the cache, when `reuse` is False).
+    """
+    if 'windows' not in stages:
+        return None, None, None, None
+    reusable = [stage for stage in REUSABLE_STAGES if stage in stages]
+    signature = None
+    if near_duplicates.enabled:
+        with span("near_duplicate_lookup"):
+            signature = await inference_executor.run(minhash_signature, text)
+            match = near_duplicates.find(signature, reusable) if reuse else None
+        if match is not None:
+            outputs = match['outputs']
+            entities = None
+            if 'ner' in stages:
+                ner_stages = [stage for stage in stages if stage != 'sentiment']
+                if paragraphs:
+                    _, entities, _ = await run_paragraph_models(paragraphs, ner_stages, reuse)
+                else:
+                    _, entities, _ = await run_windowed_models(text, ner_stages)
+            return outputs['sentiment'], entities, outputs['coverage'], {
+                'similarity': match['similarity'],
+                'reused_stages': reusable,
+                'source_analyzed_at': datetime.fromtimestamp(match['stored_at']).isoformat()
+            }
+    if paragraphs:
+        sentiment_result, entities, coverage = await run_paragraph_models(paragraphs, stages, reuse)
+    else:
+        sentiment_result, entities, coverage = await run_windowed_models(text, stages)
+    near_duplicates.add(signature, reusable, {'sentiment': sentiment_result, 'coverage': coverage})
+    return sentiment_result, entities, coverage, None
+
+def analyze_text_segment(segment: str, offset: int, sentiment_budget: int, ner_budget: int) -> Dict[str, Any]:
+    """Text statistics and model windows for one segment of an uploaded file; combined by StreamingAnalysis"""
+    scan = feature_scanner.scan(segment)
+    partial = {
+        'languages': scan.languages,
+        'word_count': scan.word_count,
+        'word_length_total': scan.word_length_total,
+        'terminator_runs': scan.terminator_runs,
+        'technical_terms': scan.technical_terms,
+        'sentiment': [],
+        'ner': [],
+        'coverage': []
+    }
+    if not scan.word_count:
+        return partial
     
-    try:
-        # Detect language
-        detected_language = detect_language(request.text)
-        
-        # Sentiment analysis
-        sentiment_result = pipelines['sentiment'](request.text[:512])[0]  # Truncate for model limits
-        sentiment_score = sentiment_result['score'] if sentiment_result['label'] in ['POSITIVE', 'POS'] else -sentiment_result['score']
-        
-        # Named Entity Recognition
-        entities = pipelines['ner'](request.text[:512])
+    # Windows come back in document offsets; each model stops once its token budget is used up
+    for name, budget in (('sentiment', sentiment_budget), ('ner', ner_budget)):
+        if budget <= 0:
+            continue
+        windows, coverage = split_into_windows(segment, model_registry.get(name).tokenizer, token_budget=budget)
+        partial[name] = [
+            window._replace(char_start=window.char_start + offset, char_end=window.char_end + offset)
+            for window in windows
+        ]
+        partial['coverage'].append((name, coverage))
+    return partial
+
+class StreamingAnalysis:
+    """Combines per-segment statistics and model outputs for a streamed upload
+    
+    Segments are cut between sentences or words, so text statistics match a single pass
+    over the full text; the models see the first AI_TOKEN_BUDGET tokens, as for /analyze.
+    """
+    
+    def __init__(self):
+        self.languages = set()
+        self.word_count = 0
+        self.word_length_total = 0
+        self.terminator_runs = 0
+        self.technical_terms = 0
+        self.characters = 0
+        self.windows: Dict[str, List[TextWindow]] = {'sentiment': [], 'ner': []}
+        self.results: Dict[str, List[Any]] = {'sentiment': [], 'ner': []}
+        self.analyzed_tokens = {'sentiment': 0, 'ner': 0}
+        self.total_tokens = 0
+        self.truncated = False
+    
+    def remaining_budget(self, name: str) -> int:
+        return TOKEN_BUDGET - self.analyzed_tokens[name]
+    
+    async def add_segment(self, segment: str):
+        partial = await inference_executor.run(
+            analyze_text_segment, segment, self.characters,
+            self.remaining_budget('sentiment'), self.remaining_budget('ner')
+        )
+        if partial['word_count'] and not partial['coverage']:
+            self.truncated = True  # both budgets were already used up
+        self.characters += len(segment)
+        self.languages.update(partial['languages'])
+        self.word_count += partial['word_count']
+        self.word_length_total += partial['word_length_total']
+        self.terminator_runs += partial['terminator_runs']
+        self.technical_terms += partial['technical_terms']
+        for name, coverage in partial['coverage']:
+            self.analyzed_tokens[name] += coverage['analyzed_tokens']
+            self.truncated = self.truncated or coverage['truncated']
+            if name == 'sentiment':
+                self.total_tokens += coverage['total_tokens']
         
-        # Extract features
-        features = extract_features(request.text, request.project_data)
+        sentiment_results, ner_results = await asyncio.gather(
+            batchers['sentiment'].submit_many([window.text for window in partial['sentiment']]),
+            batchers['ner'].submit_many([window.text for window in partial['ner']])
+        )
+        for name, results in (('sentiment', sentiment_results), ('ner', ner_results)):
+            self.windows[name].extend(partial[name])
+            self.results[name].extend(results)
+    
+    async def finish(self, issue_type: str) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+        """Language, merged sentiment, entities, features/risk and coverage for the whole upload"""
+        for name in ('sentiment', 'ner'):
+            if not self.windows[name]:
+                # Empty text; the pipelines still produce an output, as for /analyze
+                self.windows[name] = [TextWindow(text="", char_start=0, char_end=0, token_count=0, new_token_count=0)]
+                self.results[name] = await batchers[name].submit_many([""])
         
-        # Calculate scores
-        risk_score = calculate_risk_score(features, request.issue_type)
+        languages = [language for language, _ in SCRIPT_PATTERNS if language in self.languages]
+        avg_word_length = self.word_length_total / self.word_count if self.word_count else float('nan')
+        # Splitting on n terminator runs gives n + 1 sentences
+        with metrics.time_stage("features"):
+            features = build_features(self.word_count, self.terminator_runs + 1, avg_word_length, self.technical_terms, {})
+        with metrics.time_stage("risk"):
+            scored = {'features': features, 'risk_score': calculate_risk_score(features, issue_type)}
+        coverage = {
+            'sentiment_windows': len(self.windows['sentiment']),
+            'ner_windows': len(self.windows['ner']),
+            'total_tokens': self.total_tokens,
+            'analyzed_tokens': self.analyzed_tokens['sentiment'],
+            'truncated': self.truncated
+        }
+        return (
+            languages[0] if languages else "en",
+            merge_sentiment(self.windows['sentiment'], self.results['sentiment'], signed_sentiment),
+            merge_entities(self.windows['ner'], self.results['ner']),
+            scored,
+            coverage
+        )
+
+def compute_features_and_risk(text: str, project_data: Dict, issue_type: str, stages: Collection[str] = ALL_STAGES) -> Dict[str, Any]:
+    """Feature extraction and risk scoring (those in `stages`); executed in the inference executor"""
+    timer = StageTimer()
+    scored = {}
+    if 'features' in stages:
+        with timer("features"):
+            scored['features'] = extract_features(text, project_data)
+    if 'risk' in stages:
+        with timer("risk"):
+            scored['risk_score'] = calculate_risk_score(scored['features'], issue_type)
+    scored['stage_seconds'] = timer.seconds
+    return scored
+
+def compute_features_and_risk_batch(items: List[Tuple[str, Dict, str, Collection[str]]]) -> List[Dict[str, Any]]:
+    """Feature extraction for many DPRs, then one risk scoring call for all of them; a failing item gets an error entry"""
+    results = []
+    for text, project_data, issue_type, stages in items:
+        try:
+            results.append(compute_features_and_risk(text, project_data, issue_type, set(stages) - {'risk'}))
+        except Exception as e:
+            results.append({'error': str(e)})
+    
+    scored = [
+        (result, issue_type) for result, (_, _, issue_type, stages) in zip(results, items)
+        if 'risk' in stages and 'features' in result
+    ]
+    if scored:
+        timer = StageTimer()
+        try:
+            with timer("risk"):
+                scores = calculate_risk_scores([result['features'] for result, _ in scored], [issue_type for _, issue_type in scored])
+        except Exception as e:
+            for result, _ in scored:
+                result.clear()
+                result['error'] = str(e)
+        else:
+            # Each item is charged its share of the batched call
+            share = timer.seconds['risk'] / len(scored)
+            for (result, _), score in zip(scored, scores):
+                result['risk_score'] = score
+                result['stage_seconds']['risk'] = share
+    return results
+
+def format_entities(entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """NER pipeline entities in the response format"""
+    return [{
+        'text': ent['word'],
+        'label': ent['entity_group'],
+        'confidence': ent['score']
+    } for ent in entities]
+
+def requested_fields(request: DPRAnalysisRequest) -> FrozenSet[str]:
+    """Response fields to compute: `fields` when given, otherwise all that the include_* flags allow"""
+    if request.fields is not None:
+        return frozenset(request.fields)
+    fields = analysis_graph.fields
+    if not request.include_risk_assessment:
+        fields -= RISK_FIELDS
+    if not request.include_delay_prediction:
+        fields -= {"delay"}
+    return fields
+
+def requested_stages(request: DPRAnalysisRequest) -> List[str]:
+    return analysis_graph.stages_for(requested_fields(request))
+
+def build_analysis_response(
+    request: DPRAnalysisRequest,
+    detected_language: Optional[str],
+    sentiment_result: Optional[Dict[str, Any]],
+    entities: Optional[List[Dict[str, Any]]],
+    scored: Dict[str, Any],
+    coverage: Optional[Dict[str, Any]],
+    start_time: float
+) -> DPRAnalysisResponse:
+    """Turn stage outputs into the analysis response; stages that did not run pass None"""
+    metrics.observe_stages(scored.get('stage_seconds'))
+    add_stages(scored.get('stage_seconds'))
+    fields = requested_fields(request)
+    features = scored.get('features')
+    risk_score = scored.get('risk_score')
+    
+    # Calculate scores
+    sentiment_score = confidence_score = completeness_score = compliance_score = None
+    if sentiment_result is not None:
+        sentiment_score = sentiment_result['signed_score']
         confidence_score = 0.85 + (sentiment_score * 0.1)  # Base confidence adjusted by sentiment
+    if features is not None:
         completeness_score = min(0.5 + (features['word_count'] / 200), 1.0)
+    if risk_score is not None:
         compliance_score = 0.8 - (risk_score * 0.2)
-        
-        # Generate analysis text
+    
+    # Generate analysis text
+    analysis = None
+    if 'analysis' in fields:
         analysis_parts = [
             f"AI analysis of {request.issue_type} issue reveals {sentiment_result['label'].lower()} sentiment.",
             f"Text completeness is {'good' if completeness_score > 0.7 else 'moderate'}.",
-            f"Risk assessment indicates {'high' if risk_score > 0.7 else 'moderate' if risk_score > 0.4 else 'low'} risk level.",
         ]
+        if risk_score is not None:
+            analysis_parts.append(f"Risk assessment indicates {'high' if risk_score > 0.7 else 'moderate' if risk_score > 0.4 else 'low'} risk level.")
         
         if detected_language != 'en':
             analysis_parts.append(f"Content detected in {detected_language} language, processed using multilingual models.")
         
         analysis = " ".join(analysis_parts)
-        
-        # Generate recommendations
+    
+    # Generate recommendations
+    recommendations = None
+    if 'recommendations' in fields:
         recommendations = generate_recommendations(request.issue_type, risk_score)
-        
-        # Risk factors
+    
+    # Risk factors
+    risk_factors = None
+    if 'risk_factors' in fields:
         risk_factors = [
             f"Issue type: {request.issue_type}",
             f"Project scale: ${features['budget_size']:,.0f}",
             f"Timeline: {features['timeline_days']} days",
             f"Complexity level: {features['complexity_score']}/10"
         ]
-        
-        # Delay prediction
-        delay_prediction = None
-        if request.include_delay_prediction:
+    
+    # Delay prediction
+    delay_prediction = None
+    if 'delay' in fields:
+        with metrics.time_stage("delay"), span("delay"):
             delay_prediction = predict_delay(features, request.issue_type)
+    
+    processing_time = elapsed_since(start_time)
+    
+    return DPRAnalysisResponse(
+        analysis=analysis,
+        sentiment_score=sentiment_score if 'sentiment' in fields else None,
+        confidence_score=confidence_score if 'confidence' in fields else None,
+        completeness_score=completeness_score if 'completeness' in fields else None,
+        compliance_score=compliance_score if 'compliance' in fields else None,
+        risk_score=risk_score if 'risk' in fields else None,
+        language_detected=detected_language if 'language' in fields else None,
+        entities=format_entities(entities) if 'entities' in fields else None,
+        recommendations=recommendations,
+        risk_factors=risk_factors,
+        delay_prediction=delay_prediction,
+        document_coverage=coverage if 'document_coverage' in fields else None,
+        processing_time=processing_time
+    )
+
+def format_validation_error(error: ValidationError) -> str:
+    """Compact one-line description of a pydantic validation error"""
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in error.errors())
+
+def analysis_cache_key(request: DPRAnalysisRequest) -> str:
+    """Result cache key for a request under the current models"""
+    return make_cache_key(
+        request.text, request.issue_type, request.project_data, model_manager.analysis_version,
+        fields=sorted(requested_fields(request))
+    )
+
+def get_cached_analysis(request: DPRAnalysisRequest, start_time: float) -> Optional[DPRAnalysisResponse]:
+    """Cached response for a request, or None on a miss"""
+    with span("cache_lookup"):
+        cached = result_cache.get(analysis_cache_key(request))
+    if cached is None:
+        return None
+    cached.update(cached=True, processing_time=elapsed_since(start_time))
+    return DPRAnalysisResponse(**cached)
+
+async def analyze_with_cache(request: DPRAnalysisRequest, bypass_cache: bool = False) -> DPRAnalysisResponse:
+    """Serve from the result cache when possible, otherwise analyze and store the result"""
+    if not bypass_cache:
+        cached = get_cached_analysis(request, time.perf_counter())
+        if cached is not None:
+            return cached
+    
+    async with inference_executor.admit():
+        response = await run_dpr_analysis(request, reuse_cached=not bypass_cache)
+    with span("cache_store"):
+        result_cache.set(analysis_cache_key(request), response.model_dump())
+    return response
+
+@app.post("/analyze", response_model=DPRAnalysisResponse)
+async def analyze_dpr(
+    request: DPRAnalysisRequest,
+    cache_control: Optional[str] = Header(None),
+    x_debug_timing: Optional[str] = Header(None)
+):
+    """Main DPR analysis endpoint"""
+    bypass_cache = not request.use_cache or 'no-cache' in (cache_control or '').lower()
+    with request_timer("/analyze") as timer:
+        response = await analyze_with_cache(request, bypass_cache)
+        if debug_timing_requested(request.debug_timing, x_debug_timing):
+            response.timing = timer.breakdown()
+    return response
+
+@app.post("/analyze/stream")
+async def analyze_dpr_stream(
+    request: DPRAnalysisRequest,
+    accept: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
+    """DPR analysis that streams each stage as it completes (NDJSON, or SSE for `Accept: text/event-stream`)"""
+    bypass_cache = not request.use_cache or 'no-cache' in (cache_control or '').lower()
+    return await admitted_event_stream(inference_executor, analysis_events(request, bypass_cache), accept)
+
+def elapsed_since(start_time: float) -> float:
+    return time.perf_counter() - start_time
+
+async def analysis_events(request: DPRAnalysisRequest, bypass_cache: bool) -> AsyncIterator[StageEvent]:
+    """Stage results for one DPR in completion order, then the full response as `summary`"""
+    start_time = time.perf_counter()
+    if not bypass_cache:
+        cached = get_cached_analysis(request, start_time)
+        if cached is not None:
+            yield "summary", cached.model_dump()
+            return
+    
+    stages = requested_stages(request)
+    detected_language = None
+    if 'language' in stages:
+        with metrics.time_stage("language"):
+            detected_language = detect_language(request.text)
+        yield "language", {"language_detected": detected_language, "elapsed": elapsed_since(start_time)}
+    
+    plan = asyncio.ensure_future(
+        inference_executor.run(plan_model_windows, request.text, window_models(stages))
+        if 'windows' in stages else skipped_stage()
+    )
+    
+    async def after_plan(stage):
+        return await stage(await plan)
+    
+    pending = {}
+    if 'features' in stages:
+        pending[asyncio.ensure_future(inference_executor.run(
+            compute_features_and_risk, request.text, request.project_data, request.issue_type, stages
+        ))] = "features"
+    if 'sentiment' in stages:
+        pending[asyncio.ensure_future(after_plan(run_sentiment_windows))] = "sentiment"
+    if 'ner' in stages:
+        pending[asyncio.ensure_future(after_plan(run_ner_windows))] = "entities"
+    outputs = {}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage = pending.pop(task)
+                outputs[stage] = task.result()
+                if stage == "features":
+                    data = {"risk_score": outputs[stage].get('risk_score'), "features": outputs[stage]['features']}
+                elif stage == "sentiment":
+                    data = {"sentiment_score": outputs[stage]['signed_score'], "label": outputs[stage]['label']}
+                else:
+                    data = {"entities": format_entities(outputs[stage])}
+                yield stage, {**data, "elapsed": elapsed_since(start_time)}
+        # Only document_coverage may still be waiting for the plan
+        coverage = (await plan)['coverage'] if 'windows' in stages else None
+    finally:
+        # The client went away or a stage failed; stop the rest
+        for task in pending:
+            task.cancel()
+        plan.cancel()
+    
+    response = build_analysis_response(
+        request, detected_language, outputs.get("sentiment"), outputs.get("entities"), outputs.get("features", {}),
+        coverage, start_time
+    )
+    result_cache.set(analysis_cache_key(request), response.model_dump())
+    yield "summary", response.model_dump()
+
+async def run_dpr_analysis(request: DPRAnalysisRequest, reuse_cached: bool = True) -> DPRAnalysisResponse:
+    """Analyze one DPR; callers must hold an inference slot. `reuse_cached` False recomputes near-duplicates and paragraphs"""
+    start_time = time.perf_counter()
+    
+    try:
+        stages = requested_stages(request)
         
-        processing_time = (datetime.now() - start_time).total_seconds()
+        # Detect language
+        detected_language = None
+        if 'language' in stages:
+            with metrics.time_stage("language"), span("language"):
+                detected_language = detect_language(request.text)
         
-        return DPRAnalysisResponse(
-            analysis=analysis,
-            sentiment_score=sentiment_score,
-            confidence_score=confidence_score,
-            completeness_score=completeness_score,
-            compliance_score=compliance_score,
-            risk_score=risk_score,
-            language_detected=detected_language,
-            entities=[{
-                'text': ent['word'],
-                'label': ent['entity_group'],
-                'confidence': ent['score']
-            } for ent in entities],
-            recommendations=recommendations,
-            risk_factors=risk_factors,
-            delay_prediction=delay_prediction,
-            processing_time=processing_time
-        )
+        # Sentiment analysis and Named Entity Recognition over token windows of the whole document,
+        # batched with concurrent requests (or reused from a near-duplicate); feature extraction and
+        # risk scoring run alongside. Multi-paragraph documents only re-run uncached paragraphs
+        paragraphs = document_paragraphs(request.text)
+        with span("inference"):
+            (sentiment_result, entities, coverage, near_duplicate), scored = await asyncio.gather(
+                run_model_stages(request.text, stages, reuse_cached, paragraphs),
+                score_paragraphs(paragraphs, request.project_data, request.issue_type, stages, reuse_cached) if paragraphs else
+                inference_executor.run(compute_features_and_risk, request.text, request.project_data, request.issue_type, stages)
+            )
         
+        with span("response"):
+            response = build_analysis_response(request, detected_language, sentiment_result, entities, scored, coverage, start_time)
+            response.near_duplicate = near_duplicate
+            return response
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in DPR analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_dpr_batch(batch: BatchAnalysisRequest):
+    """Analyze many DPRs in one call; results come back in request order"""
+    if len(batch.requests) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(batch.requests)} items, the limit is {MAX_BATCH_ITEMS}")
+    
+    start_time = time.perf_counter()
+    results: List[Optional[BatchItemResult]] = [None] * len(batch.requests)
+    
+    try:
+        # Validate items one by one so a malformed item only fails itself
+        parsed = []
+        for index, item in enumerate(batch.requests):
+            try:
+                parsed.append((index, DPRAnalysisRequest.model_validate(item)))
+            except ValidationError as e:
+                results[index] = BatchItemResult(index=index, error=format_validation_error(e))
+        
+        # Serve cached items directly; only the rest go through the models
+        uncached = []
+        for index, request in parsed:
+            cached = get_cached_analysis(request, start_time) if request.use_cache else None
+            if cached is not None:
+                results[index] = BatchItemResult(index=index, result=cached)
+            else:
+                uncached.append((index, request))
+        parsed = uncached
+        
+        if parsed:
+            stages = [requested_stages(request) for _, request in parsed]
+            async with inference_executor.admit():
+                model_results, scored_results = await asyncio.gather(
+                    asyncio.gather(*(
+                        run_model_stages(request.text, item_stages, request.use_cache, document_paragraphs(request.text))
+                        for (_, request), item_stages in zip(parsed, stages)
+                    ), return_exceptions=True),
+                    inference_executor.run(
+                        compute_features_and_risk_batch,
+                        [(request.text, request.project_data, request.issue_type, item_stages)
+                         for (_, request), item_stages in zip(parsed, stages)]
+                    )
+                )
+            
+            for (index, request), item_stages, model_result, scored in zip(parsed, stages, model_results, scored_results):
+                try:
+                    if isinstance(model_result, Exception):
+                        raise model_result
+                    if 'error' in scored:
+                        raise ValueError(scored['error'])
+                    sentiment_result, entities, coverage, near_duplicate = model_result
+                    detected_language = None
+                    if 'language' in item_stages:
+                        with metrics.time_stage("language"):
+                            detected_language = detect_language(request.text)
+                    response = build_analysis_response(
+                        request, detected_language, sentiment_result, entities, scored, coverage, start_time
+                    )
+                    response.near_duplicate = near_duplicate
+                    result_cache.set(analysis_cache_key(request), response.model_dump())
+                    results[index] = BatchItemResult(index=index, result=response)
+                except Exception as e:
+                    logger.warning(f"Batch item {index} failed: {e}")
+                    results[index] = BatchItemResult(index=index, error=str(e))
+        
+        failed = sum(1 for result in results if result.error is not None)
+        return BatchAnalysisResponse(
+            results=results,
+            succeeded=len(results) - failed,
+            failed=failed,
+            processing_time=elapsed_since(start_time)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch DPR analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def file_analysis(request: FileAnalysisRequest) -> Dict[str, Any]:
+    """Analysis of file content sent as JSON; served by /analyze-files and its jobs"""
+    # Simple file content analysis
+    analysis_result = await analyze_with_cache(DPRAnalysisRequest(
+        text=request.file_content,
+        issue_type=request.issue_type,
+        language=request.language,
+        include_delay_prediction=False,
+        fields=request.fields if request.fields is not None else FILE_ANALYSIS_FIELDS
+    ), bypass_cache=not request.use_cache)
+    
+    return {
+        "file_analysis": f"Processed {request.file_type} file with {len(request.file_content)} characters",
+        "extracted_insights": analysis_result.analysis,
+        "confidence": analysis_result.confidence_score,
+        "recommendations": analysis_result.recommendations[:3] if analysis_result.recommendations is not None else None  # Top 3 recommendations
+    }
+
 @app.post("/analyze-files")
-async def analyze_files(request: FileAnalysisRequest):
+async def analyze_files(request: FileAnalysisRequest, x_debug_timing: Optional[str] = Header(None)):
     """Analyze uploaded files"""
     try:
-        # Simple file content analysis
-        analysis_result = await analyze_dpr(DPRAnalysisRequest(
-            text=request.file_content,
-            issue_type=request.issue_type,
-            language=request.language,
-            include_delay_prediction=False
-        ))
+        with request_timer("/analyze-files") as timer:
+            result = await file_analysis(request)
+            if debug_timing_requested(request.debug_timing, x_debug_timing):
+                result["timing"] = timer.breakdown()
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in file analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def upload_options(upload) -> Dict[str, str]:
+    """`issue_type`, `file_type` and `encoding` of an upload, with the encoding checked"""
+    options = {
+        'issue_type': upload_field(upload, 'issue_type', required=True),
+        'file_type': upload_field(upload, 'file_type', upload.content_type or 'text/plain'),
+        'encoding': upload_field(upload, 'encoding', 'utf-8')
+    }
+    try:
+        codecs.lookup(options['encoding'])
+    except LookupError:
+        raise HTTPException(status_code=400, detail=f"Unknown encoding '{options['encoding']}'")
+    return options
+
+async def upload_analysis(file: BinaryIO, size: int, issue_type: str, file_type: str, encoding: str) -> Dict[str, Any]:
+    """Analysis of an uploaded file read segment by segment; served by /analyze-files/upload and its jobs"""
+    start_time = time.perf_counter()
+    analysis = StreamingAnalysis()
+    async with inference_executor.admit():
+        async for segment in iter_text_segments(file, encoding):
+            await analysis.add_segment(segment)
+        detected_language, sentiment_result, entities, scored, coverage = await analysis.finish(issue_type)
+    
+    # The text was streamed, not kept; the response only needs the request's options
+    analysis_result = build_analysis_response(
+        DPRAnalysisRequest(text="", issue_type=issue_type, include_delay_prediction=False),
+        detected_language, sentiment_result, entities, scored, coverage, start_time
+    )
+    return {
+        "file_analysis": f"Processed {file_type} file with {analysis.characters} characters",
+        "extracted_insights": analysis_result.analysis,
+        "confidence": analysis_result.confidence_score,
+        "recommendations": analysis_result.recommendations[:3],
+        "document_coverage": coverage,
+        "bytes_received": size
+    }
+
+@app.post("/analyze-files/upload")
+async def analyze_file_upload(request: Request):
+    """Analyze a multipart (`file` part) or raw-body upload without holding the file in memory
+    
+    `issue_type`, `file_type` and `encoding` come from form fields, or query parameters for raw bodies.
+    """
+    try:
+        upload = await receive_upload(request)
+        try:
+            return await upload_analysis(upload.file, upload.size, **upload_options(upload))
+        finally:
+            upload.file.close()
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in file upload analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def run_file_analysis_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await file_analysis(FileAnalysisRequest(**payload))
+
+async def run_file_upload_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    with open(payload['file_path'], 'rb') as file:
+        return await upload_analysis(file, payload['size'], payload['issue_type'], payload['file_type'], payload['encoding'])
+
+job_queue.register("analyze-files", run_file_analysis_job)
+job_queue.register("analyze-files-upload", run_file_upload_job)
+
+@app.post("/jobs/analyze-files", status_code=202)
+async def submit_file_analysis_job(request: FileAnalysisJobRequest):
+    """Queue a file analysis; poll GET /jobs/{job_id}, then fetch GET /jobs/{job_id}/result"""
+    return job_queue.submit("analyze-files", request.model_dump(exclude={'priority', 'debug_timing'}), request.priority)
+
+@app.post("/jobs/analyze-files/upload", status_code=202)
+async def submit_file_upload_job(request: Request):
+    """Queue the analysis of an upload; takes the fields of /analyze-files/upload plus `priority`"""
+    upload = await receive_upload(request)
+    try:
+        options = upload_options(upload)
+        try:
+            priority = int(upload_field(upload, 'priority', '0'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="`priority` must be an integer")
+        file_path = await job_queue.store_upload(upload.file)
+    finally:
+        upload.file.close()
+    return job_queue.submit("analyze-files-upload", {**options, 'size': upload.size}, priority, file_path)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status; `queue_position` counts the jobs that run before a queued one"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """The job's result once it succeeded; 202 with the status while it is pending, 409 if it failed or was cancelled"""
+    job = job_queue.get(job_id)
+    result = job_queue.result(job_id) if job is not None and job['status'] == 'succeeded' else None
+    if result is not None:
+        return result
+    if job is None or job['status'] == 'succeeded':
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    if job['status'] in ('queued', 'running'):
+        return JSONResponse(status_code=202, content=job)
+    raise HTTPException(status_code=409, detail=job)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; finished jobs are left as they are"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job
+
+def plan_embedding_windows(text: str) -> Tuple[List[TextWindow], Dict[str, Any]]:
+    """Split a whole document into windows that fit BERT"""
+    return split_into_windows(text, model_registry.get('bert')['tokenizer'], max_tokens=EMBEDDING_WINDOW_TOKENS)
+
+async def embed_document(text: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Unit-length document embedding: window embeddings averaged by token count"""
+    windows, coverage = await inference_executor.run(plan_embedding_windows, text)
+    with metrics.time_stage("embedding"), span("embedding"):
+        vectors = await batchers['embedding'].submit_many([window.text for window in windows])
+    weights = np.array([max(window.token_count, 1) for window in windows], dtype=np.float32)
+    return normalize(np.average(np.stack(vectors), axis=0, weights=weights)), coverage
+
+async def run_index_task(function, *args):
+    """Index reads and writes touch the memory-mapped files; keep them off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+def check_embed_items(count: int):
+    if not count:
+        raise HTTPException(status_code=400, detail="Nothing to embed")
+    if count > MAX_EMBED_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_EMBED_ITEMS} texts per request")
+
+@app.post("/embed")
+async def embed_texts(request: EmbedRequest):
+    """Document embeddings (mean-pooled BERT, unit length) for a list of texts"""
+    try:
+        check_embed_items(len(request.texts))
+        start_time = time.perf_counter()
+        async with inference_executor.admit():
+            embedded = await asyncio.gather(*(embed_document(text) for text in request.texts))
         return {
-            "file_analysis": f"Processed {request.file_type} file with {len(request.file_content)} characters",
-            "extracted_insights": analysis_result.analysis,
-            "confidence": analysis_result.confidence_score,
-            "recommendations": analysis_result.recommendations[:3]  # Top 3 recommendations
+            "model": BERT_MODEL,
+            "embeddings": [vector.round(6).tolist() for vector, _ in embedded],
+            "document_coverage": [coverage for _, coverage in embedded],
+            "processing_time": elapsed_since(start_time)
         }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error embedding texts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/embeddings/index")
+async def index_reports(request: EmbeddingIndexRequest):
+    """Embed reports and add them to the similarity index; an id already indexed is replaced"""
+    try:
+        check_embed_items(len(request.items))
+        start_time = time.perf_counter()
+        async with inference_executor.admit():
+            embedded = await asyncio.gather(*(embed_document(item.text) for item in request.items))
+        live = await run_index_task(embedding_index.add, [
+            (item.id, vector, item.metadata) for item, (vector, _) in zip(request.items, embedded)
+        ])
+        return {"indexed": len(request.items), "live": live, "processing_time": elapsed_since(start_time)}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error indexing reports: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/embeddings/{doc_id}")
+async def remove_indexed_report(doc_id: str):
+    """Drop a report from the similarity index; its row is reclaimed by compaction"""
+    if not await run_index_task(embedding_index.delete, [doc_id]):
+        raise HTTPException(status_code=404, detail=f"Report {doc_id} is not indexed")
+    return {"deleted": doc_id}
+
+@app.post("/embeddings/compact")
+async def compact_embedding_index():
+    """Rewrite the index without deleted and replaced rows, retraining the IVF lists"""
+    return await run_index_task(embedding_index.compact)
+
+@app.get("/embeddings/stats")
+async def get_embedding_stats():
+    """Index size, dead rows and the search mode in use"""
+    return await run_index_task(embedding_index.stats)
+
+@app.post("/similar")
+async def find_similar_reports(request: SimilarRequest):
+    """Top-k indexed reports by cosine similarity to a text or to an indexed report"""
+    try:
+        start_time = time.perf_counter()
+        if request.id is not None:
+            query = await run_index_task(embedding_index.vector, request.id)
+            if query is None:
+                raise HTTPException(status_code=404, detail=f"Report {request.id} is not indexed")
+        else:
+            async with inference_executor.admit():
+                query, _ = await embed_document(request.text)
+        with metrics.time_stage("similarity_search"):
+            found = await run_index_task(embedding_index.search, query, request.top_k, request.id)
+        return {**found, "processing_time": elapsed_since(start_time)}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in similarity search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def portfolio_csv(pieces: Iterator[str], first: str, file: BinaryIO) -> Iterator[str]:
+    """Rest of a scored CSV; runs in the threadpool and closes the upload when done or abandoned"""
+    try:
+        yield first
+        yield from pieces
+    except Exception as e:
+        logger.error(f"Error while streaming portfolio scores: {e}")
+        raise
+    finally:
+        file.close()
+
+@app.post("/portfolio/score")
+async def score_portfolio(request: Request):
+    """Rule-based risk and delay scores for a CSV or Parquet table of projects, read in chunks
+    
+    Columns used: `issue_type`, `budget`, `timeline_days`, `complexity` and `technical_terms`;
+    missing values take the /analyze defaults. Fields (form fields, or query parameters for raw
+    bodies): `format` (csv or parquet, else from the file name or content type), `output` (csv
+    streams one scored row per project, summary returns portfolio totals), `keep` (comma-separated
+    columns copied to the CSV output) and `chunk_rows`. Delays come from the trained delay model
+    when one is loaded, with its median and 90th percentile delay days as extra columns.
+    """
+    upload = await receive_upload(request, max_bytes=PORTFOLIO_MAX_BYTES)
+    streaming = False
+    try:
+        fmt = table_format(upload.filename, upload.content_type, upload_field(upload, 'format'))
+        output = upload_field(upload, 'output', 'csv')
+        if output not in ('csv', 'summary'):
+            raise HTTPException(status_code=400, detail="`output` must be csv or summary")
+        try:
+            chunk_rows = int(upload_field(upload, 'chunk_rows', PORTFOLIO_CHUNK_ROWS))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="`chunk_rows` must be an integer")
+        loop = asyncio.get_running_loop()
+        
+        if output == 'summary':
+            with metrics.time_stage("portfolio_scoring"):
+                summary = await loop.run_in_executor(
+                    None, summarize_table, upload.file, fmt, chunk_rows, model_manager.delay_model
+                )
+            return {**summary, "bytes_received": upload.size}
         
+        pieces = csv_pieces(score_table(
+            upload.file, fmt, keep_columns(upload_field(upload, 'keep')), chunk_rows, model_manager.delay_model
+        ))
+        # The first chunk is scored before responding, so unreadable tables still get a 400
+        first = await loop.run_in_executor(None, next, pieces, '')
+        streaming = True
+        return StreamingResponse(portfolio_csv(pieces, first, upload.file), media_type='text/csv')
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not read the project table: {e}")
     except Exception as e:
-        logger.error(f"Error in file analysis: {e}")
+        logger.error(f"Error in portfolio scoring: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if not streaming:
+            upload.file.close()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Result cache and near-duplicate index counters"""
+    return {
+        **result_cache.stats(),
+        "near_duplicates": near_duplicates.stats(),
+        "paragraphs": paragraph_cache.stats(),
+        "model_version": model_manager.model_version
+    }
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop every cached analysis result and the stored near-duplicate outputs"""
+    result_cache.clear()
+    near_duplicates.clear()
+    paragraph_cache.clear()
+    return {"cleared": True}
 
 @app.get("/models/status")
 async def get_models_status():
     """Get status of all loaded models"""
     return {
         "nlp_models": {
-            "bert_multilingual": "bert_model" in models,
-            "indic_bert": "indic_model" in models,
-            "sentiment_pipeline": "sentiment" in pipelines,
-            "ner_pipeline": "ner" in pipelines
+            "bert_multilingual": model_registry.is_loaded('bert'),
+            "indic_bert": model_registry.is_loaded('indic_bert'),
+            "sentiment_pipeline": model_registry.is_loaded('sentiment'),
+            "ner_pipeline": model_registry.is_loaded('ner')
         },
+        "registry": model_registry.status(),
         "ml_models": {
-            "random_forest": "random_forest" in models,
-            "xgboost": "xgboost" in models,
-            "lightgbm": "lightgbm" in models,
-            "scaler": "scaler" in models
+            "xgboost": model_manager.risk_model_info.get('library') == 'xgboost',
+            "lightgbm": model_manager.risk_model_info.get('library') == 'lightgbm'
         },
-        "device": str(model_manager.device),
-        "total_models": len(models) + len(pipelines)
+        "risk_model": model_manager.risk_model_info,
+        "delay_model": model_manager.delay_model_info,
+        "device": str(model_manager.device or "not initialized"),
+        "inference_backend": INFERENCE_BACKEND,
+        "total_models": len(model_registry.names())
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: request and stage latency histograms, executor, cache and memory gauges"""
+    return Response(metrics.render(service_samples(inference_executor, result_cache)), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/startup")
+async def get_startup_report():
+    """Time spent on imports, model loading and warmup before the service became ready"""
+    return startup_report.summary()
+
 if __name__ == "__main__":
+    # Development server; production runs `python serve.py`
     uvicorn.run(
         "ai_service:app",
         host="0.0.0.0",
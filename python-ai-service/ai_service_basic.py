@@ -1,25 +1,41 @@
 # Simplified AI Service for DPR System
 # Basic version for testing without heavy ML dependencies
 
+# Start the startup clock before anything heavy is imported
+from startup_report import WARMUP_ENABLED, startup_report
+
 import os
 import json
+import time
+import codecs
 import asyncio
-from fastapi import FastAPI, HTTPException
+from collections import Counter
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ValidationError, field_validator
+from typing import AsyncIterator, BinaryIO, Collection, FrozenSet, List, Dict, Optional, Any, Tuple
 import uvicorn
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-import re
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 
+from event_stream import StageEvent, admitted_event_stream
+from features import build_feature_row, detect_language, extract_feature_row as extract_features, lexicon, lexicon_counts
+from inference_executor import InferenceExecutor
+from job_queue import JobQueue
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, MetricsRegistry, StageTimer, service_samples, timed_call
+from risk_artifact import RISK_MODEL_PATH, load_risk_artifact
+from streaming_upload import iter_text_segments, receive_upload, upload_field
+from text_scanner import ENTITY_PATTERNS, SCAN_PARTS, SCRIPT_PATTERNS, TextScanner, untimed
+from request_timing import add_stages, debug_timing_requested, request_timer, span
+from result_cache import ResultCache, make_cache_key
+from stage_graph import StageGraph
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+startup_report.mark("imports")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -37,6 +53,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts and latencies per route, and per-stage latencies, served at /metrics
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# Stages of the rule-based analysis and the stages each response field is computed from;
+# a request that names `fields` only runs the stages those fields need
+analysis_graph = StageGraph(
+    dependencies={
+        "language": [],
+        "lexicon": [],
+        "ner": [],
+        "sentiment": ["language", "lexicon"],
+        "features": ["language", "lexicon"],
+        "risk": ["features"],
+        "delay": ["features"],
+    },
+    outputs={
+        # The analysis text also describes risk and entities when those stages ran
+        "analysis": ["language", "sentiment", "features"],
+        "sentiment": ["sentiment"],
+        "confidence": ["sentiment"],
+        "completeness": ["features"],
+        "compliance": ["risk"],
+        "risk": ["risk"],
+        "language": ["language"],
+        "entities": ["ner"],
+        "recommendations": ["risk"],
+        "risk_factors": ["risk", "sentiment", "features"],
+        "delay": ["delay"],
+    }
+)
+ALL_STAGES = frozenset(analysis_graph.order)
+
+# Left out when a request sets include_risk_assessment=False
+RISK_FIELDS = frozenset({"risk", "compliance", "recommendations", "risk_factors"})
+
+# What /analyze-files returns, unless the request names its own fields
+FILE_ANALYSIS_FIELDS = ["analysis", "confidence", "recommendations", "entities", "sentiment"]
+
 # Pydantic models for request/response
 class DPRAnalysisRequest(BaseModel):
     text: str
@@ -45,50 +100,116 @@ class DPRAnalysisRequest(BaseModel):
     language: str = "en"
     include_risk_assessment: bool = True
     include_delay_prediction: bool = True
+    use_cache: bool = True  # False forces a fresh analysis (the result still refreshes the cache)
+    debug_timing: bool = False  # True (or an X-Debug-Timing header) adds a per-span `timing` breakdown
+    fields: Optional[List[str]] = None  # response fields to compute (analysis_graph outputs); None means all
+    
+    @field_validator('fields')
+    @classmethod
+    def check_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        return fields if fields is None else analysis_graph.validate_fields(fields)
 
+# Fields a request did not ask for are None
 class DPRAnalysisResponse(BaseModel):
-    analysis: str
-    sentiment_score: float
-    confidence_score: float
-    completeness_score: float
-    compliance_score: float
-    risk_score: float
-    language_detected: str
-    entities: List[Dict[str, Any]]
-    recommendations: List[str]
-    risk_factors: List[str]
+    analysis: Optional[str] = None
+    sentiment_score: Optional[float] = None
+    confidence_score: Optional[float] = None
+    completeness_score: Optional[float] = None
+    compliance_score: Optional[float] = None
+    risk_score: Optional[float] = None
+    language_detected: Optional[str] = None
+    entities: Optional[List[Dict[str, Any]]] = None
+    recommendations: Optional[List[str]] = None
+    risk_factors: Optional[List[str]] = None
     delay_prediction: Optional[Dict[str, Any]] = None
     processing_time: float
+    cached: bool = False
+    timing: Optional[Dict[str, Any]] = None
 
 class FileAnalysisRequest(BaseModel):
     file_content: str
     file_type: str
     issue_type: str
     language: str = "en"
+    use_cache: bool = True
+    debug_timing: bool = False
+    fields: Optional[List[str]] = None  # defaults to FILE_ANALYSIS_FIELDS
+    
+    @field_validator('fields')
+    @classmethod
+    def check_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        return fields if fields is None else analysis_graph.validate_fields(fields)
+
+class FileAnalysisJobRequest(FileAnalysisRequest):
+    priority: int = 0  # higher priorities run first
+
+class BatchAnalysisRequest(BaseModel):
+    # Each item is a DPRAnalysisRequest, validated individually so a malformed item only fails itself
+    requests: List[Any]
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[DPRAnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+    processing_time: float
+
+MAX_BATCH_ITEMS = int(os.getenv("AI_MAX_BATCH_ITEMS", "1000"))
+UPLOAD_MAX_ENTITIES = int(os.getenv("AI_UPLOAD_MAX_ENTITIES", "1000"))
 
 # Global variables for models
 models = {}
 
+# Short DPR scored once after loading so the first request does not pay for lazy initialization
+WARMUP_TEXT = "Project timeline and budget are under review."
+
 class AIModelManager:
     def __init__(self):
         logger.info("Initializing AI Model Manager")
+        self.model_version = "1.0.0-basic"
+        self.risk_model_info: Dict[str, Any] = {"source": None, "version": None}
+        self.loading: Optional[asyncio.Future] = None
         
     async def load_models(self):
-        """Load basic models"""
+        """Load basic models in the background; the service accepts requests meanwhile"""
+        self.loading = asyncio.get_running_loop().run_in_executor(None, self.load_in_background)
+
+    async def wait_until_loaded(self):
+        """Wait for background loading so results and cache keys use the fitted models"""
+        if self.loading is not None:
+            await asyncio.shield(self.loading)
+
+    def load_in_background(self):
+        try:
+            # Workers forked by serve.py inherit the models loaded in its master process
+            if not models:
+                self.load_models_sync()
+            if WARMUP_ENABLED:
+                with startup_report.phase("warmup"):
+                    run_basic_inference(WARMUP_TEXT, {}, 'Technical Risk')
+            startup_report.models_ready()
+        except Exception:
+            # Risk scoring falls back to per-issue defaults without the models
+            logger.error("Basic models unavailable, using fallback risk scores")
+
+    def load_models_sync(self):
+        """Load basic models (blocking, also used by process-pool workers)"""
         try:
             logger.info("Loading basic AI models...")
             
-            # Initialize basic ML models
-            models['random_forest'] = RandomForestClassifier(n_estimators=50, random_state=42)
-            models['scaler'] = StandardScaler()
-            
-            # Create dummy training data for the models
-            X_dummy = np.random.rand(100, 5)  # 5 features
-            y_dummy = np.random.randint(0, 2, 100)  # Binary classification
-            
-            # Fit the models with dummy data
-            X_scaled = models['scaler'].fit_transform(X_dummy)
-            models['random_forest'].fit(X_scaled, y_dummy)
+            with startup_report.phase("model_loading"):
+                if os.path.exists(RISK_MODEL_PATH):
+                    self.load_artifact()
+                else:
+                    logger.warning(
+                        f"No risk model artifact at {RISK_MODEL_PATH}; using rule-based risk scores "
+                        "(train one with train_risk_model.py)"
+                    )
+                    self.risk_model_info = {"source": "rules", "version": None}
             
             logger.info("Basic models loaded successfully!")
             
@@ -96,12 +217,46 @@ class AIModelManager:
             logger.error(f"Error loading models: {e}")
             raise e
 
+    def load_artifact(self):
+        """Load the trained scaler and model; under serve.py this happens once, before the workers fork"""
+        artifact = load_risk_artifact(RISK_MODEL_PATH)
+        metadata = artifact['metadata']
+        models['scaler'] = artifact['scaler']
+        models['random_forest'] = artifact['model']
+        self.model_version = f"1.0.0-basic+{metadata['version']}"
+        self.risk_model_info = {
+            "source": "artifact",
+            "version": metadata['version'],
+            "trained_at": metadata.get('trained_at'),
+            "rows": metadata.get('rows'),
+            "path": RISK_MODEL_PATH
+        }
+        logger.info(f"Loaded risk model {metadata['version']} from {RISK_MODEL_PATH}")
+
 model_manager = AIModelManager()
 
+def init_inference_worker():
+    """Make sure models exist in a process-pool worker"""
+    if not models:
+        model_manager.load_models_sync()
+
+inference_executor = InferenceExecutor(initializer=init_inference_worker)
+result_cache = ResultCache()
+job_queue = JobQueue()
+
 @app.on_event("startup")
 async def startup_event():
     """Load models when the service starts"""
     await model_manager.load_models()
+    await job_queue.start()
+    startup_report.ready()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the job workers and the inference executor, then commit queued cache writes"""
+    await job_queue.stop()
+    inference_executor.shutdown()
+    result_cache.close_disk()
 
 @app.get("/")
 async def root():
@@ -123,108 +278,67 @@ async def health_check():
             "basic_nlp": True,
             "sentiment_analysis": True
         },
+        "inference": inference_executor.stats(),
+        "jobs": job_queue.stats(),
         "service_type": "basic"
     }
 
-def detect_language(text: str) -> str:
-    """Simple language detection based on script"""
-    # Check for Devanagari script (Hindi)
-    if re.search(r'[\u0900-\u097F]', text):
-        return "hi"
-    # Check for Telugu script
-    elif re.search(r'[\u0C00-\u0C7F]', text):
-        return "te"
-    # Check for Tamil script
-    elif re.search(r'[\u0B80-\u0BFF]', text):
-        return "ta"
-    # Check for Bengali script
-    elif re.search(r'[\u0980-\u09FF]', text):
-        return "bn"
-    # Default to English
-    else:
-        return "en"
+# The stage functions below and those in features.py are the reference definitions; request
+# paths get the same results from a single TextScanner pass (text_scanner.py)
 
 def basic_sentiment_analysis(text: str) -> float:
-    """Basic sentiment analysis using keyword matching"""
-    positive_words = ['good', 'excellent', 'great', 'positive', 'success', 'achieve', 'complete', 'satisfied']
-    negative_words = ['bad', 'poor', 'terrible', 'negative', 'fail', 'problem', 'issue', 'delay', 'risk', 'concern']
-    
-    text_lower = text.lower()
-    positive_count = sum(1 for word in positive_words if word in text_lower)
-    negative_count = sum(1 for word in negative_words if word in text_lower)
-    
+    """Basic sentiment analysis from positive and negative lexicon term occurrences"""
+    counts = lexicon_counts(text)
+    return sentiment_from_counts(counts['positive'], counts['negative'])
+
+def sentiment_from_counts(positive_count: int, negative_count: int) -> float:
     if positive_count + negative_count == 0:
         return 0.0
     
     return (positive_count - negative_count) / (positive_count + negative_count)
 
 def extract_basic_entities(text: str) -> List[Dict[str, Any]]:
-    """Basic entity extraction using regex patterns"""
+    """Basic entity extraction using regex patterns (dates, monetary amounts, percentages)"""
     entities = []
-    
-    # Extract dates
-    date_pattern = r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b'
-    dates = re.findall(date_pattern, text)
-    for date in dates:
-        entities.append({"text": date, "label": "DATE", "confidence": 0.9})
-    
-    # Extract monetary amounts
-    money_pattern = r'\$[\d,]+(?:\.\d{2})?|\b\d+(?:,\d{3})*(?:\.\d{2})?\s*(?:dollars?|USD|INR|rupees?)\b'
-    amounts = re.findall(money_pattern, text, re.IGNORECASE)
-    for amount in amounts:
-        entities.append({"text": amount, "label": "MONEY", "confidence": 0.85})
-    
-    # Extract percentages
-    percent_pattern = r'\b\d+(?:\.\d+)?%'
-    percentages = re.findall(percent_pattern, text)
-    for percent in percentages:
-        entities.append({"text": percent, "label": "PERCENT", "confidence": 0.9})
-    
+    for label, pattern, confidence in ENTITY_PATTERNS:
+        for value in pattern.findall(text):
+            entities.append({"text": value, "label": label, "confidence": confidence})
     return entities
 
-def extract_features(text: str, project_data: Dict) -> np.ndarray:
-    """Extract numerical features for ML models"""
-    features = []
-    
-    # Text features
-    features.append(len(text.split()))  # word count
-    features.append(len(re.split(r'[.!?]+', text)))  # sentence count
-    features.append(len(re.findall(r'\b(budget|timeline|resource|risk|compliance)\b', text.lower())))  # technical terms
-    
-    # Project features (with defaults)
-    features.append(project_data.get('budget', 100000) / 100000)  # normalized budget
-    features.append(project_data.get('timeline_days', 90) / 365)  # normalized timeline
-    
-    return np.array(features).reshape(1, -1)
+# Risk multipliers per issue type, and fallback risks used without a trained model or when it fails
+ISSUE_RISK_MULTIPLIERS = {
+    'Budget Mismatch': 1.2,
+    'Unrealistic Schedule': 1.1,
+    'Resource Allocation': 0.9,
+    'Compliance Issue': 1.0,
+    'Technical Risk': 1.15
+}
+FALLBACK_ISSUE_RISK = {'Budget Mismatch': 0.7, 'Unrealistic Schedule': 0.6, 'Resource Allocation': 0.5}
 
 def calculate_risk_score(features: np.ndarray, issue_type: str) -> float:
     """Calculate risk score using ML model"""
+    return float(calculate_risk_scores(features, [issue_type])[0])
+
+def calculate_risk_scores(features: np.ndarray, issue_types: List[str]) -> np.ndarray:
+    """Calculate risk scores for a feature matrix with a single model call"""
+    if 'random_forest' not in models:
+        # No trained model: per-issue rule scores
+        return np.array([FALLBACK_ISSUE_RISK.get(issue_type, 0.5) for issue_type in issue_types])
     try:
         # Scale features
         features_scaled = models['scaler'].transform(features)
         
         # Get prediction probability
-        risk_prob = models['random_forest'].predict_proba(features_scaled)[0][1]
+        risk_probs = models['random_forest'].predict_proba(features_scaled)[:, 1]
         
         # Adjust based on issue type
-        issue_multipliers = {
-            'Budget Mismatch': 1.2,
-            'Unrealistic Schedule': 1.1,
-            'Resource Allocation': 0.9,
-            'Compliance Issue': 1.0,
-            'Technical Risk': 1.15
-        }
-        
-        multiplier = issue_multipliers.get(issue_type, 1.0)
-        adjusted_risk = min(risk_prob * multiplier, 1.0)
-        
-        return adjusted_risk
+        multipliers = np.array([ISSUE_RISK_MULTIPLIERS.get(issue_type, 1.0) for issue_type in issue_types])
+        return np.minimum(risk_probs * multipliers, 1.0)
         
     except Exception as e:
         logger.warning(f"ML risk calculation failed: {e}, using fallback")
         # Fallback risk calculation
-        base_risk = {'Budget Mismatch': 0.7, 'Unrealistic Schedule': 0.6, 'Resource Allocation': 0.5}.get(issue_type, 0.5)
-        return base_risk
+        return np.array([FALLBACK_ISSUE_RISK.get(issue_type, 0.5) for issue_type in issue_types])
 
 def generate_recommendations(issue_type: str, risk_score: float) -> List[str]:
     """Generate recommendations based on issue type and risk score"""
@@ -313,108 +427,568 @@ def predict_delay(features: np.ndarray, issue_type: str, project_data: Dict) ->
         ]
     }
 
-@app.post("/analyze", response_model=DPRAnalysisResponse)
-async def analyze_dpr(request: DPRAnalysisRequest):
-    """Main DPR analysis endpoint"""
-    start_time = datetime.now()
+text_scanner = TextScanner(lexicon=lexicon)
+
+def scan_stages(text: str, project_data: Dict, timer=untimed, stages: Collection[str] = ALL_STAGES) -> Dict[str, Any]:
+    """Language, sentiment, entities and features (those in `stages`) from one text scan; same values as the stage functions"""
+    scan = text_scanner.scan(text, timer, SCAN_PARTS.intersection(stages))
+    inference = {}
+    if 'language' in stages:
+        inference['language'] = scan.language
+    if 'ner' in stages:
+        inference['entities'] = scan.entities
+    if 'lexicon' in stages:
+        with timer("sentiment"):
+            counts = lexicon.category_counts(scan.term_counts, scan.language)
+            if 'sentiment' in stages:
+                inference['sentiment_score'] = sentiment_from_counts(counts['positive'], counts['negative'])
+    if 'features' in stages:
+        with timer("features"):
+            inference['features'] = build_feature_row(scan.word_count, scan.sentence_count, counts['technical'], project_data)
+    return inference
+
+def run_basic_inference(text: str, project_data: Dict, issue_type: str, stages: Collection[str] = ALL_STAGES) -> Dict[str, Any]:
+    """Run the CPU-bound analysis stages in `stages`; executed in the inference executor"""
+    timer = StageTimer()
+    inference = scan_stages(text, project_data, timer, stages)
+    if 'risk' in stages:
+        with timer("risk"):
+            inference['risk_score'] = calculate_risk_score(inference['features'], issue_type)
+    inference['stage_seconds'] = timer.seconds
+    return inference
+
+def run_basic_inference_batch(items: List[Tuple[str, Dict, str, Collection[str]]]) -> List[Dict[str, Any]]:
+    """Run the analysis stages for many DPRs, scoring risk for all of them with one model call"""
+    inferences = []
+    feature_rows = []
+    scored_indices = []
     
-    try:
-        # Detect language
-        detected_language = detect_language(request.text)
-        
-        # Basic sentiment analysis
-        sentiment_score = basic_sentiment_analysis(request.text)
-        
-        # Extract entities
-        entities = extract_basic_entities(request.text)
-        
-        # Extract features for ML
-        features = extract_features(request.text, request.project_data)
-        
-        # Calculate scores
-        risk_score = calculate_risk_score(features, request.issue_type)
+    for text, project_data, issue_type, stages in items:
+        try:
+            timer = StageTimer()
+            inference = scan_stages(text, project_data, timer, stages)
+            inference['stage_seconds'] = timer.seconds
+            inferences.append(inference)
+            if 'risk' in stages:
+                feature_rows.append(inference['features'])
+                scored_indices.append(len(inferences) - 1)
+        except Exception as e:
+            inferences.append({'error': str(e)})
+    
+    if feature_rows:
+        timer = StageTimer()
+        with timer("risk"):
+            risk_scores = calculate_risk_scores(np.vstack(feature_rows), [items[i][2] for i in scored_indices])
+        # One model call scores the whole batch; each document is charged an equal share
+        risk_seconds = timer.seconds["risk"] / len(scored_indices)
+        for i, risk_score in zip(scored_indices, risk_scores):
+            inferences[i]['risk_score'] = float(risk_score)
+            inferences[i]['stage_seconds']['risk'] = risk_seconds
+    
+    return inferences
+
+def analyze_text_segment(segment: str) -> Dict[str, Any]:
+    """Partial analysis of one segment of an uploaded file; combined by StreamingAnalysis"""
+    timer = StageTimer()
+    scan = text_scanner.scan(segment, timer)
+    return {
+        'languages': scan.languages,
+        'terms': scan.term_counts,
+        'entities': scan.entities,
+        'word_count': scan.word_count,
+        'terminator_runs': scan.terminator_runs,
+        'stage_seconds': timer.seconds
+    }
+
+class StreamingAnalysis:
+    """Combines per-segment results into the inference dict run_basic_inference returns for the whole text
+    
+    Segments are cut between sentences or words, so the counts match a single pass over
+    the full text (a lexicon phrase split by a mid-sentence cut is missed); only the first
+    UPLOAD_MAX_ENTITIES entities are kept.
+    """
+    
+    def __init__(self, max_entities: int = UPLOAD_MAX_ENTITIES):
+        self.max_entities = max_entities
+        self.languages = set()
+        self.terms = Counter()
+        self.entities: List[Dict[str, Any]] = []
+        self.entity_count = 0
+        self.word_count = 0
+        self.terminator_runs = 0
+        self.characters = 0
+        self.stage_seconds = Counter()
+    
+    def add(self, segment: str, partial: Dict[str, Any]):
+        self.characters += len(segment)
+        self.languages.update(partial['languages'])
+        self.terms.update(partial['terms'])
+        self.entity_count += len(partial['entities'])
+        self.entities.extend(partial['entities'][:self.max_entities - len(self.entities)])
+        self.word_count += partial['word_count']
+        self.terminator_runs += partial['terminator_runs']
+        self.stage_seconds.update(partial['stage_seconds'])
+    
+    def inference(self, project_data: Dict, issue_type: str) -> Dict[str, Any]:
+        timer = StageTimer()
+        languages = [language for language, _ in SCRIPT_PATTERNS if language in self.languages]
+        language = languages[0] if languages else "en"
+        with timer("sentiment"):
+            counts = lexicon.category_counts(self.terms, language)
+            sentiment_score = sentiment_from_counts(counts['positive'], counts['negative'])
+        with timer("features"):
+            # Splitting on n terminator runs gives n + 1 sentences
+            features = build_feature_row(self.word_count, self.terminator_runs + 1, counts['technical'], project_data)
+        with timer("risk"):
+            risk_score = calculate_risk_score(features, issue_type)
+        stage_seconds = Counter(self.stage_seconds)
+        stage_seconds.update(timer.seconds)
+        return {
+            'language': language,
+            'sentiment_score': sentiment_score,
+            'entities': self.entities,
+            'entity_count': self.entity_count,
+            'features': features,
+            'risk_score': risk_score,
+            'stage_seconds': dict(stage_seconds)
+        }
+
+def requested_fields(request: DPRAnalysisRequest) -> FrozenSet[str]:
+    """Response fields to compute: `fields` when given, otherwise all that the include_* flags allow"""
+    if request.fields is not None:
+        return frozenset(request.fields)
+    fields = analysis_graph.fields
+    if not request.include_risk_assessment:
+        fields -= RISK_FIELDS
+    if not request.include_delay_prediction:
+        fields -= {"delay"}
+    return fields
+
+def requested_stages(request: DPRAnalysisRequest) -> List[str]:
+    return analysis_graph.stages_for(requested_fields(request))
+
+def build_analysis_response(request: DPRAnalysisRequest, inference: Dict[str, Any], start_time: float) -> DPRAnalysisResponse:
+    """Turn stage outputs into the analysis response; `start_time` is a perf_counter reading"""
+    metrics.observe_stages(inference.get('stage_seconds'))
+    add_stages(inference.get('stage_seconds'))
+    fields = requested_fields(request)
+    detected_language = inference.get('language')
+    sentiment_score = inference.get('sentiment_score')
+    entities = inference.get('entities')
+    features = inference.get('features')
+    risk_score = inference.get('risk_score')
+    
+    # Calculate scores
+    confidence_score = completeness_score = compliance_score = None
+    if sentiment_score is not None:
         confidence_score = 0.8 + abs(sentiment_score) * 0.15  # Higher confidence for clear sentiment
-        completeness_score = min(0.5 + (len(request.text.split()) / 200), 1.0)
-        compliance_score = max(0.9 - risk_score * 0.3, 0.4)
-        
-        # Generate analysis text
         sentiment_label = "positive" if sentiment_score > 0.1 else "negative" if sentiment_score < -0.1 else "neutral"
+    if features is not None:
+        completeness_score = min(0.5 + (features[0][0] / 200), 1.0)  # features start with the word count
+    if risk_score is not None:
+        compliance_score = max(0.9 - risk_score * 0.3, 0.4)
         risk_level = "high" if risk_score > 0.7 else "moderate" if risk_score > 0.4 else "low"
-        
+    
+    # Generate analysis text
+    analysis = None
+    if 'analysis' in fields:
         analysis_parts = [
             f"AI analysis of {request.issue_type} reveals {sentiment_label} sentiment (score: {sentiment_score:.2f}).",
-            f"Text completeness is {'good' if completeness_score > 0.7 else 'moderate' if completeness_score > 0.5 else 'limited'}.",
-            f"Risk assessment indicates {risk_level} risk level (score: {risk_score:.2f}).",
-            f"Extracted {len(entities)} key entities from the text."
+            f"Text completeness is {'good' if completeness_score > 0.7 else 'moderate' if completeness_score > 0.5 else 'limited'}."
         ]
+        if risk_score is not None:
+            analysis_parts.append(f"Risk assessment indicates {risk_level} risk level (score: {risk_score:.2f}).")
+        if entities is not None:
+            analysis_parts.append(f"Extracted {inference.get('entity_count', len(entities))} key entities from the text.")
         
         if detected_language != 'en':
             analysis_parts.append(f"Content detected in {detected_language} language.")
         
         analysis = " ".join(analysis_parts)
-        
-        # Generate recommendations
+    
+    # Generate recommendations
+    recommendations = None
+    if 'recommendations' in fields:
         recommendations = generate_recommendations(request.issue_type, risk_score)
-        
-        # Risk factors
+    
+    # Risk factors
+    risk_factors = None
+    if 'risk_factors' in fields:
         risk_factors = [
             f"Issue type: {request.issue_type}",
             f"Risk level: {risk_level}",
             f"Sentiment: {sentiment_label}",
             f"Text completeness: {completeness_score:.1%}"
         ]
-        
-        # Delay prediction
-        delay_prediction = None
-        if request.include_delay_prediction:
+    
+    # Delay prediction
+    delay_prediction = None
+    if 'delay' in fields:
+        with metrics.time_stage("delay"), span("delay"):
             delay_prediction = predict_delay(features, request.issue_type, request.project_data)
+    
+    processing_time = elapsed_since(start_time)
+    
+    return DPRAnalysisResponse(
+        analysis=analysis,
+        sentiment_score=sentiment_score if 'sentiment' in fields else None,
+        confidence_score=confidence_score if 'confidence' in fields else None,
+        completeness_score=completeness_score if 'completeness' in fields else None,
+        compliance_score=compliance_score if 'compliance' in fields else None,
+        risk_score=risk_score if 'risk' in fields else None,
+        language_detected=detected_language if 'language' in fields else None,
+        entities=entities if 'entities' in fields else None,
+        recommendations=recommendations,
+        risk_factors=risk_factors,
+        delay_prediction=delay_prediction,
+        processing_time=processing_time
+    )
+
+def format_validation_error(error: ValidationError) -> str:
+    """Compact one-line description of a pydantic validation error"""
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in error.errors())
+
+def analysis_cache_key(request: DPRAnalysisRequest) -> str:
+    """Result cache key for a request under the current models"""
+    return make_cache_key(
+        request.text, request.issue_type, request.project_data, model_manager.model_version,
+        fields=sorted(requested_fields(request)), lexicon_version=lexicon.version
+    )
+
+def get_cached_analysis(request: DPRAnalysisRequest, start_time: float) -> Optional[DPRAnalysisResponse]:
+    """Cached response for a request, or None on a miss"""
+    with span("cache_lookup"):
+        cached = result_cache.get(analysis_cache_key(request))
+    if cached is None:
+        return None
+    cached.update(cached=True, processing_time=elapsed_since(start_time))
+    return DPRAnalysisResponse(**cached)
+
+async def analyze_with_cache(request: DPRAnalysisRequest, bypass_cache: bool = False) -> DPRAnalysisResponse:
+    """Serve from the result cache when possible, otherwise analyze and store the result"""
+    with span("wait_for_models"):
+        await model_manager.wait_until_loaded()
+    if not bypass_cache:
+        cached = get_cached_analysis(request, time.perf_counter())
+        if cached is not None:
+            return cached
+    
+    async with inference_executor.admit():
+        response = await run_dpr_analysis(request)
+    with span("cache_store"):
+        result_cache.set(analysis_cache_key(request), response.model_dump())
+    return response
+
+@app.post("/analyze", response_model=DPRAnalysisResponse)
+async def analyze_dpr(
+    request: DPRAnalysisRequest,
+    cache_control: Optional[str] = Header(None),
+    x_debug_timing: Optional[str] = Header(None)
+):
+    """Main DPR analysis endpoint"""
+    bypass_cache = not request.use_cache or 'no-cache' in (cache_control or '').lower()
+    with request_timer("/analyze") as timer:
+        response = await analyze_with_cache(request, bypass_cache)
+        if debug_timing_requested(request.debug_timing, x_debug_timing):
+            response.timing = timer.breakdown()
+    return response
+
+@app.post("/analyze/stream")
+async def analyze_dpr_stream(
+    request: DPRAnalysisRequest,
+    accept: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
+    """DPR analysis that streams each stage as it completes (NDJSON, or SSE for `Accept: text/event-stream`)"""
+    bypass_cache = not request.use_cache or 'no-cache' in (cache_control or '').lower()
+    await model_manager.wait_until_loaded()
+    return await admitted_event_stream(inference_executor, analysis_events(request, bypass_cache), accept)
+
+def elapsed_since(start_time: float) -> float:
+    return time.perf_counter() - start_time
+
+async def run_stage(stage: str, fn, *args) -> Any:
+    """Run one stage function in the executor and record how long it computed"""
+    result, stage_seconds = await inference_executor.run(timed_call, stage, fn, *args)
+    metrics.observe_stages(stage_seconds)
+    return result
+
+async def analysis_events(request: DPRAnalysisRequest, bypass_cache: bool) -> AsyncIterator[StageEvent]:
+    """Stage results for one DPR, cheapest first, then the full response as `summary`"""
+    start_time = time.perf_counter()
+    if not bypass_cache:
+        cached = get_cached_analysis(request, start_time)
+        if cached is not None:
+            yield "summary", cached.model_dump()
+            return
+    
+    stages = requested_stages(request)
+    inference = {}
+    if 'language' in stages:
+        inference['language'] = await run_stage("language", detect_language, request.text)
+        yield "language", {"language_detected": inference['language'], "elapsed": elapsed_since(start_time)}
+    
+    if 'sentiment' in stages:
+        inference['sentiment_score'] = await run_stage("sentiment", basic_sentiment_analysis, request.text)
+        yield "sentiment", {"sentiment_score": inference['sentiment_score'], "elapsed": elapsed_since(start_time)}
+    
+    if 'ner' in stages:
+        inference['entities'] = await run_stage("ner", extract_basic_entities, request.text)
+        yield "entities", {"entities": inference['entities'], "elapsed": elapsed_since(start_time)}
+    
+    if 'features' in stages:
+        features = inference['features'] = await run_stage("features", extract_features, request.text, request.project_data)
+        if 'risk' in stages:
+            inference['risk_score'] = await run_stage("risk", calculate_risk_score, features, request.issue_type)
+        yield "features", {"risk_score": inference.get('risk_score'), "features": features[0], "elapsed": elapsed_since(start_time)}
+    
+    response = build_analysis_response(request, inference, start_time)
+    result_cache.set(analysis_cache_key(request), response.model_dump())
+    yield "summary", response.model_dump()
+
+async def run_dpr_analysis(request: DPRAnalysisRequest) -> DPRAnalysisResponse:
+    """Analyze one DPR; callers must hold an inference slot"""
+    start_time = time.perf_counter()
+    
+    try:
+        # Language, sentiment, entities, features and ML risk run off the event loop
+        with span("inference"):
+            inference = await inference_executor.run(
+                run_basic_inference, request.text, request.project_data, request.issue_type, requested_stages(request)
+            )
+        with span("response"):
+            return build_analysis_response(request, inference, start_time)
         
-        processing_time = (datetime.now() - start_time).total_seconds()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in DPR analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_dpr_batch(batch: BatchAnalysisRequest):
+    """Analyze many DPRs in one call; results come back in request order"""
+    if len(batch.requests) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(batch.requests)} items, the limit is {MAX_BATCH_ITEMS}")
+    
+    start_time = time.perf_counter()
+    results: List[Optional[BatchItemResult]] = [None] * len(batch.requests)
+    
+    try:
+        await model_manager.wait_until_loaded()
+        
+        # Validate items one by one so a malformed item only fails itself
+        parsed = []
+        for index, item in enumerate(batch.requests):
+            try:
+                parsed.append((index, DPRAnalysisRequest.model_validate(item)))
+            except ValidationError as e:
+                results[index] = BatchItemResult(index=index, error=format_validation_error(e))
         
-        return DPRAnalysisResponse(
-            analysis=analysis,
-            sentiment_score=sentiment_score,
-            confidence_score=confidence_score,
-            completeness_score=completeness_score,
-            compliance_score=compliance_score,
-            risk_score=risk_score,
-            language_detected=detected_language,
-            entities=entities,
-            recommendations=recommendations,
-            risk_factors=risk_factors,
-            delay_prediction=delay_prediction,
-            processing_time=processing_time
+        # Serve cached items directly; only the rest go through the models
+        uncached = []
+        for index, request in parsed:
+            cached = get_cached_analysis(request, start_time) if request.use_cache else None
+            if cached is not None:
+                results[index] = BatchItemResult(index=index, result=cached)
+            else:
+                uncached.append((index, request))
+        parsed = uncached
+        
+        if parsed:
+            async with inference_executor.admit():
+                inferences = await inference_executor.run(
+                    run_basic_inference_batch,
+                    [(request.text, request.project_data, request.issue_type, requested_stages(request)) for _, request in parsed]
+                )
+            
+            for (index, request), inference in zip(parsed, inferences):
+                try:
+                    if 'error' in inference:
+                        raise ValueError(inference['error'])
+                    response = build_analysis_response(request, inference, start_time)
+                    result_cache.set(analysis_cache_key(request), response.model_dump())
+                    results[index] = BatchItemResult(index=index, result=response)
+                except Exception as e:
+                    logger.warning(f"Batch item {index} failed: {e}")
+                    results[index] = BatchItemResult(index=index, error=str(e))
+        
+        failed = sum(1 for result in results if result.error is not None)
+        return BatchAnalysisResponse(
+            results=results,
+            succeeded=len(results) - failed,
+            failed=failed,
+            processing_time=elapsed_since(start_time)
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in DPR analysis: {e}")
+        logger.error(f"Error in batch DPR analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def file_analysis(request: FileAnalysisRequest) -> Dict[str, Any]:
+    """Analysis of file content sent as JSON; served by /analyze-files and its jobs"""
+    # Simple file content analysis
+    analysis_result = await analyze_with_cache(DPRAnalysisRequest(
+        text=request.file_content,
+        issue_type=request.issue_type,
+        language=request.language,
+        include_delay_prediction=False,
+        fields=request.fields if request.fields is not None else FILE_ANALYSIS_FIELDS
+    ), bypass_cache=not request.use_cache)
+    
+    return {
+        "file_analysis": f"Processed {request.file_type} file with {len(request.file_content)} characters",
+        "extracted_insights": analysis_result.analysis,
+        "confidence": analysis_result.confidence_score,
+        "recommendations": analysis_result.recommendations[:3] if analysis_result.recommendations is not None else None,
+        "entities": analysis_result.entities,
+        "sentiment_score": analysis_result.sentiment_score
+    }
+
 @app.post("/analyze-files")
-async def analyze_files(request: FileAnalysisRequest):
+async def analyze_files(request: FileAnalysisRequest, x_debug_timing: Optional[str] = Header(None)):
     """Analyze uploaded files"""
     try:
-        # Simple file content analysis
-        analysis_result = await analyze_dpr(DPRAnalysisRequest(
-            text=request.file_content,
-            issue_type=request.issue_type,
-            language=request.language,
-            include_delay_prediction=False
-        ))
-        
-        return {
-            "file_analysis": f"Processed {request.file_type} file with {len(request.file_content)} characters",
-            "extracted_insights": analysis_result.analysis,
-            "confidence": analysis_result.confidence_score,
-            "recommendations": analysis_result.recommendations[:3],
-            "entities": analysis_result.entities,
-            "sentiment_score": analysis_result.sentiment_score
-        }
+        with request_timer("/analyze-files") as timer:
+            result = await file_analysis(request)
+            if debug_timing_requested(request.debug_timing, x_debug_timing):
+                result["timing"] = timer.breakdown()
+        return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in file analysis: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def upload_options(upload) -> Dict[str, str]:
+    """`issue_type`, `file_type` and `encoding` of an upload, with the encoding checked"""
+    options = {
+        'issue_type': upload_field(upload, 'issue_type', required=True),
+        'file_type': upload_field(upload, 'file_type', upload.content_type or 'text/plain'),
+        'encoding': upload_field(upload, 'encoding', 'utf-8')
+    }
+    try:
+        codecs.lookup(options['encoding'])
+    except LookupError:
+        raise HTTPException(status_code=400, detail=f"Unknown encoding '{options['encoding']}'")
+    return options
+
+async def upload_analysis(file: BinaryIO, size: int, issue_type: str, file_type: str, encoding: str) -> Dict[str, Any]:
+    """Analysis of an uploaded file read segment by segment; served by /analyze-files/upload and its jobs"""
+    start_time = time.perf_counter()
+    await model_manager.wait_until_loaded()
+    analysis = StreamingAnalysis()
+    async with inference_executor.admit():
+        async for segment in iter_text_segments(file, encoding):
+            analysis.add(segment, await inference_executor.run(analyze_text_segment, segment))
+        inference = await inference_executor.run(analysis.inference, {}, issue_type)
+    
+    # The text was streamed, not kept; the response only needs the request's options
+    analysis_result = build_analysis_response(
+        DPRAnalysisRequest(text="", issue_type=issue_type, fields=FILE_ANALYSIS_FIELDS), inference, start_time
+    )
+    return {
+        "file_analysis": f"Processed {file_type} file with {analysis.characters} characters",
+        "extracted_insights": analysis_result.analysis,
+        "confidence": analysis_result.confidence_score,
+        "recommendations": analysis_result.recommendations[:3],
+        "entities": analysis_result.entities,
+        "sentiment_score": analysis_result.sentiment_score,
+        "bytes_received": size
+    }
+
+@app.post("/analyze-files/upload")
+async def analyze_file_upload(request: Request):
+    """Analyze a multipart (`file` part) or raw-body upload without holding the file in memory
+    
+    `issue_type`, `file_type` and `encoding` come from form fields, or query parameters for raw bodies.
+    """
+    try:
+        upload = await receive_upload(request)
+        try:
+            return await upload_analysis(upload.file, upload.size, **upload_options(upload))
+        finally:
+            upload.file.close()
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in file upload analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def run_file_analysis_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await file_analysis(FileAnalysisRequest(**payload))
+
+async def run_file_upload_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    with open(payload['file_path'], 'rb') as file:
+        return await upload_analysis(file, payload['size'], payload['issue_type'], payload['file_type'], payload['encoding'])
+
+job_queue.register("analyze-files", run_file_analysis_job)
+job_queue.register("analyze-files-upload", run_file_upload_job)
+
+@app.post("/jobs/analyze-files", status_code=202)
+async def submit_file_analysis_job(request: FileAnalysisJobRequest):
+    """Queue a file analysis; poll GET /jobs/{job_id}, then fetch GET /jobs/{job_id}/result"""
+    return job_queue.submit("analyze-files", request.model_dump(exclude={'priority', 'debug_timing'}), request.priority)
+
+@app.post("/jobs/analyze-files/upload", status_code=202)
+async def submit_file_upload_job(request: Request):
+    """Queue the analysis of an upload; takes the fields of /analyze-files/upload plus `priority`"""
+    upload = await receive_upload(request)
+    try:
+        options = upload_options(upload)
+        try:
+            priority = int(upload_field(upload, 'priority', '0'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="`priority` must be an integer")
+        file_path = await job_queue.store_upload(upload.file)
+    finally:
+        upload.file.close()
+    return job_queue.submit("analyze-files-upload", {**options, 'size': upload.size}, priority, file_path)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status; `queue_position` counts the jobs that run before a queued one"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """The job's result once it succeeded; 202 with the status while it is pending, 409 if it failed or was cancelled"""
+    job = job_queue.get(job_id)
+    result = job_queue.result(job_id) if job is not None and job['status'] == 'succeeded' else None
+    if result is not None:
+        return result
+    if job is None or job['status'] == 'succeeded':
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    if job['status'] in ('queued', 'running'):
+        return JSONResponse(status_code=202, content=job)
+    raise HTTPException(status_code=409, detail=job)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; finished jobs are left as they are"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Result cache counters"""
+    return {**result_cache.stats(), "model_version": model_manager.model_version}
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop every cached analysis result"""
+    result_cache.clear()
+    return {"cleared": True}
+
 @app.get("/models/status")
 async def get_models_status():
     """Get status of all loaded models"""
@@ -432,15 +1006,29 @@ async def get_models_status():
             "transformers_pipeline": False,
             "note": "Advanced models can be enabled by installing transformers library"
         },
+        "risk_model": model_manager.risk_model_info,
+        "lexicons": lexicon.stats(),
+        "model_version": model_manager.model_version,
         "total_models": len(models),
         "service_type": "basic"
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: request and stage latency histograms, executor, cache and memory gauges"""
+    return Response(metrics.render(service_samples(inference_executor, result_cache)), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/startup")
+async def get_startup_report():
+    """Time spent on imports, model loading and warmup; basic models load after the service is ready"""
+    return startup_report.summary()
+
 if __name__ == "__main__":
     print("🚀 Starting AI DPR Service (Basic Version)")
     print("📊 Models: Random Forest, Basic NLP, Sentiment Analysis")
     print("🔗 To upgrade: pip install transformers torch")
     
+    # Development server; production runs `python serve.py --service ai_service_basic`
     uvicorn.run(
         "ai_service_basic:app",
         host="0.0.0.0",
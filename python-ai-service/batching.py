@@ -0,0 +1,129 @@
+# Micro-batching for transformer pipelines
+# Collects concurrent requests for a few milliseconds and runs each pipeline once per batch
+
+import os
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("AI_BATCH_MAX_SIZE", "16"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("AI_BATCH_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Groups single-item calls into batched calls of `batch_fn`
+
+    `batch_fn` receives a list of inputs and must return a list of results in the
+    same order. It is blocking, so it runs in `executor` (the loop default if None).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        executor: Optional[Any] = None,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.executor = executor
+        self.batches_run = 0
+        self.items_processed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one input and wait for its result"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def submit_many(self, items: List[Any], return_exceptions: bool = False) -> List[Any]:
+        """Queue several inputs at once; they are batched together where possible"""
+        return await asyncio.gather(*(self.submit(item) for item in items), return_exceptions=return_exceptions)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return [(item, future) for item, future in batch if not future.cancelled()]
+
+    async def _execute(self, items: List[Any]) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+        if len(results) != len(items):
+            raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} inputs")
+        return results
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = await self._execute(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    if not batch[0][1].done():
+                        batch[0][1].set_exception(e)
+                    continue
+                # Retry one by one so a single bad input only fails its own caller
+                logger.warning(f"{self.name} batch of {len(batch)} failed ({e}), retrying items individually")
+                for item, future in batch:
+                    try:
+                        result = (await self._execute([item]))[0]
+                    except Exception as item_error:
+                        if not future.done():
+                            future.set_exception(item_error)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                continue
+
+            self.batches_run += 1
+            self.items_processed += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
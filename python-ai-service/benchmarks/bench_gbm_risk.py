@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark gradient-boosted risk scoring
+Times single-request and batch predictions of the native booster and the compiled forest, checks that they agree,
+and fails when single-request p99 latency is above the target
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from gbm_risk import COMPILED_TOLERANCE, GBM_PREDICTORS, GBM_RISK_MODEL_PATH, GBMRiskModel
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BATCH_SIZES = [1, 8, 64, 1_000, 10_000]
+
+
+def benchmark_rows(model: GBMRiskModel, count: int, seed: int) -> np.ndarray:
+    """Rows around the artifact's sample rows: scaled values, some missing, issue indicators kept 0/1"""
+    rng = np.random.default_rng(seed)
+    sample = model.sample_rows
+    rows = sample[rng.integers(0, len(sample), count)] * rng.uniform(0.5, 1.5, (count, sample.shape[1]))
+    indicators = [index for index, name in enumerate(model.metadata['feature_names']) if name.startswith('issue:')]
+    rows[:, indicators] = sample[rng.integers(0, len(sample), count)][:, indicators]
+    rows[rng.random(rows.shape) < 0.05] = np.nan
+    return rows
+
+
+def percentile_ms(samples: list, percentile: float) -> float:
+    return round(float(np.percentile(samples, percentile)) * 1000, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark native and compiled gradient-boosted risk prediction")
+    parser.add_argument("--model", default=GBM_RISK_MODEL_PATH, help=f"Artifact metadata path (default: {GBM_RISK_MODEL_PATH})")
+    parser.add_argument("--threads", type=int, default=1, help="Booster threads")
+    parser.add_argument("--iterations", type=int, default=5000, help="Single-row calls per predictor")
+    parser.add_argument("--batch-sizes", type=int, nargs='+', default=BATCH_SIZES)
+    parser.add_argument("--target-p99-ms", type=float, default=1.0, help="Fail when single-row p99 is above this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    models = {}
+    for predictor in GBM_PREDICTORS:
+        started = time.perf_counter()
+        models[predictor] = GBMRiskModel.load(args.model, predictor=predictor, threads=args.threads)
+        models[predictor].warmup()
+        logger.info(f"{predictor:>8}: loaded and warmed up in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    rows = benchmark_rows(models['native'], max(args.iterations, max(args.batch_sizes)), args.seed)
+    # Compare the forest itself, not the booster fallback used for large batches
+    difference = float(np.max(np.abs(models['native'].predict(rows) - models['compiled'].compiled.predict(rows))))
+    logger.info(f"Largest native/compiled difference over {len(rows)} rows: {difference:.2e}")
+
+    results = {'library': models['native'].library, 'threads': args.threads, 'max_difference': difference, 'predictors': {}}
+    slow = []
+    for predictor, model in models.items():
+        samples = []
+        for index in range(args.iterations):
+            row = rows[index:index + 1]
+            start = time.perf_counter()
+            model.predict(row)
+            samples.append(time.perf_counter() - start)
+        single = {'p50_ms': percentile_ms(samples, 50), 'p99_ms': percentile_ms(samples, 99), 'max_ms': percentile_ms(samples, 100)}
+        batches = {}
+        for size in args.batch_sizes:
+            start = time.perf_counter()
+            model.predict(rows[:size])
+            elapsed = time.perf_counter() - start
+            batches[str(size)] = {'ms': round(elapsed * 1000, 3), 'rows_per_second': round(size / elapsed)}
+        results['predictors'][predictor] = {'single_row': single, 'batches': batches}
+        logger.info(
+            f"{predictor:>8}: single row p50 {single['p50_ms']:.3f} ms, p99 {single['p99_ms']:.3f} ms; "
+            + ", ".join(f"{size} rows {batch['ms']:.2f} ms" for size, batch in batches.items())
+        )
+        if single['p99_ms'] > args.target_p99_ms:
+            slow.append(predictor)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if difference > COMPILED_TOLERANCE:
+        logger.error(f"❌ Compiled predictions differ from the booster by {difference:.2e}")
+        sys.exit(1)
+    if slow:
+        logger.error(f"❌ Single-row p99 above {args.target_p99_ms} ms for: {', '.join(slow)}")
+        sys.exit(1)
+    logger.info(f"✅ Predictors agree and single-row p99 is under {args.target_p99_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
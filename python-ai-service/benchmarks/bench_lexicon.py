@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark lexicon matching as the vocabulary grows
+Times the automaton against one substring search per keyword for lexicons of 10 to 10,000 terms, and checks that
+the shipped lexicons match every corpus word the original keyword search caught at the start of a word
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import logging
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import LANGUAGES, generate_text
+from lexicon import BASE_LANGUAGE, WORD, Lexicon, load_lexicons
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TERM_COUNTS = [10, 100, 1_000, 10_000]
+SEED_TERMS = ["budget*", "delay*", "risk*", "complete", "good", "cost overrun*", "behind schedule"]
+
+# Keywords of the service before the lexicons: sentiment used substring search, technical terms whole words
+ORIGINAL_KEYWORDS = {
+    'positive': ['good', 'excellent', 'great', 'positive', 'success', 'achieve', 'complete', 'satisfied'],
+    'negative': ['bad', 'poor', 'terrible', 'negative', 'fail', 'problem', 'issue', 'delay', 'risk', 'concern'],
+    'technical': ['budget', 'timeline', 'resource', 'risk', 'compliance']
+}
+# Listed as whole words with their inflections, since a stem would also catch badge, goods, greater or issued
+WHOLE_WORD_KEYWORDS = {'bad', 'good', 'great', 'issue'}
+
+
+def synthetic_terms(size: int, seed: int = 0) -> list:
+    """`size` distinct terms: the benchmark text's own words and stems first, then random words and two-word phrases"""
+    rng = random.Random(seed)
+    terms = SEED_TERMS[:size]
+    stems = tuple(term.split(' ')[-1].rstrip('*') for term in SEED_TERMS if term.endswith('*'))
+    seen = set(terms)
+    while len(terms) < size:
+        word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        if word.startswith(stems):
+            continue
+        term = word if rng.random() < 0.8 else f"{word} {rng.choice(terms).split(' ')[0]}"
+        if term not in seen:
+            seen.add(term)
+            terms.append(term)
+    return terms
+
+
+def substring_hits(text: str, terms: list) -> int:
+    lowered = text.lower()
+    return sum(1 for term in terms if term in lowered)
+
+
+def missed_original_matches(lexicon: Lexicon, text: str) -> list:
+    """(category, word) pairs the original keywords caught at the start of a word that the lexicon does not count
+
+    Keywords inside a word ("incomplete", "unsuccessful") are left out on purpose, since the lexicon only matches
+    from the start of a word, as are the WHOLE_WORD_KEYWORDS.
+    """
+    missed = []
+    for word in sorted(set(WORD.findall(text.lower()))):
+        counts = lexicon.category_counts(lexicon.count(word), BASE_LANGUAGE)
+        for category, keywords in ORIGINAL_KEYWORDS.items():
+            stems = [keyword for keyword in keywords if keyword not in WHOLE_WORD_KEYWORDS]
+            if any(word.startswith(keyword) for keyword in stems) and not counts[category]:
+                missed.append((category, word))
+    return missed
+
+
+def best_time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lexicon matching time against lexicon size")
+    parser.add_argument("--text-size", type=int, default=1_000_000, help="Benchmark text size in characters")
+    parser.add_argument("--terms", type=int, nargs='+', default=TERM_COUNTS, help="Lexicon sizes to time")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the best time is reported")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    text = generate_text(args.text_size)
+    tokens = text.split()
+    vocabulary = Counter(tokens)
+    lowered = ' '.join(vocabulary).lower().split(' ')
+
+    results = []
+    mismatches = 0
+    for size in args.terms:
+        terms = synthetic_terms(size)
+        lexicon = Lexicon({"en": {"terms": terms}})
+        if lexicon.count_tokens(tokens, vocabulary, lowered) != lexicon.count(text):
+            logger.error(f"❌ Token-level counts differ from a full pass for {size} terms")
+            mismatches += 1
+        automaton = best_time(lambda: lexicon.count_tokens(tokens, vocabulary, lowered), args.repeat)
+        substring = best_time(lambda: substring_hits(text, terms), args.repeat)
+        results.append({
+            'terms': size,
+            'automaton_ms': round(automaton * 1000, 3),
+            'substring_ms': round(substring * 1000, 3)
+        })
+        logger.info(f"{size:>6} terms: automaton {automaton * 1000:9.2f} ms, substring search {substring * 1000:9.2f} ms")
+
+    shipped = load_lexicons()
+    missed = missed_original_matches(shipped, ' '.join(generate_text(100_000, language) for language in LANGUAGES))
+    for category, word in missed:
+        logger.error(f"❌ '{word}' matched a {category} keyword before the lexicons but is not counted now")
+    mismatches += len(missed)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'text_size': args.text_size, 'results': results, 'missed_original_matches': missed}, f, indent=2)
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
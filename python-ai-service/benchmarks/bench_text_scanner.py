@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the single-pass text scanner against the per-stage functions
+Checks that both give identical results and reports timings for texts from 1 KB to 10 MB
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from ai_service_basic import (
+    basic_sentiment_analysis, detect_language, extract_basic_entities, extract_features, scan_stages
+)
+from corpus import EDGE_CASES, LANGUAGES, generate_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def reference_stages(text: str, project_data: dict) -> dict:
+    return {
+        'language': detect_language(text),
+        'sentiment_score': basic_sentiment_analysis(text),
+        'entities': extract_basic_entities(text),
+        'features': extract_features(text, project_data)
+    }
+
+
+def same_result(expected: dict, actual: dict) -> bool:
+    return (
+        expected['language'] == actual['language']
+        and expected['sentiment_score'] == actual['sentiment_score']
+        and expected['entities'] == actual['entities']
+        and np.array_equal(expected['features'], actual['features'])
+    )
+
+
+def best_time(func, text: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text, {})
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the text scanner with the per-stage functions")
+    parser.add_argument("--sizes", type=int, nargs='+', default=SIZES, help="Text sizes in characters")
+    parser.add_argument("--languages", nargs='+', default=['en'], choices=LANGUAGES, help="Text languages")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the best time is reported")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    mismatches = [text for text in EDGE_CASES if not same_result(reference_stages(text, {}), scan_stages(text, {}))]
+    for text in mismatches:
+        logger.error(f"❌ Scanner result differs for {text!r}")
+
+    results = []
+    for language in args.languages:
+        for size in args.sizes:
+            text = generate_text(size, language)
+            if not same_result(reference_stages(text, {}), scan_stages(text, {})):
+                logger.error(f"❌ Scanner result differs for the {size} character {language} text")
+                mismatches.append(size)
+                continue
+            reference = best_time(reference_stages, text, args.repeat)
+            scanner = best_time(scan_stages, text, args.repeat)
+            results.append({
+                'language': language,
+                'size': size,
+                'reference_ms': round(reference * 1000, 3),
+                'scanner_ms': round(scanner * 1000, 3),
+                'speedup': round(reference / scanner, 2)
+            })
+            logger.info(
+                f"{language} {size:>10} chars: {reference * 1000:9.2f} ms -> {scanner * 1000:9.2f} ms "
+                f"({reference / scanner:.1f}x)"
+            )
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'results': results, 'mismatches': len(mismatches)}, f, indent=2)
+
+    if mismatches:
+        sys.exit(1)
+    logger.info("✅ Scanner results match the per-stage functions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Synthetic DPR corpus
+# Deterministic report texts for benchmarks, covering sizes, languages and issue types
+
+import random
+from typing import Any, Dict, Iterator, Sequence
+
+ISSUE_TYPES = ['Budget Mismatch', 'Unrealistic Schedule', 'Resource Allocation', 'Compliance Issue', 'Technical Risk']
+
+LANGUAGES = ['en', 'hi', 'te', 'ta', 'bn']
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# Report vocabulary per language: filler words plus sentiment and technical terms
+WORDS = {
+    'en': (
+        "the project budget timeline resource risk compliance delay issue good complete team site road "
+        "bridge contractor payment approved pending review report quarter phase concern problem success "
+        "budgets timelines resources risks delays delayed issues failed completed concerns successful"
+    ).split(),
+    'hi': (
+        "परियोजना कार्य सड़क पुल ठेकेदार भुगतान रिपोर्ट चरण स्वीकृत लंबित समीक्षा और की में है "
+        "बजट समयसीमा संसाधन जोखिम अनुपालन देरी समस्या सफल पूर्ण चिंता"
+    ).split(),
+    'te': (
+        "ప్రాజెక్ట్ పని రహదారి వంతెన కాంట్రాక్టర్ చెల్లింపు నివేదిక దశ ఆమోదం పెండింగ్ సమీక్ష మరియు "
+        "బడ్జెట్ కాలపరిమితి వనరులు ప్రమాదం సమ్మతి ఆలస్యం సమస్య విజయం పూర్తి ఆందోళన"
+    ).split(),
+    'ta': (
+        "திட்டம் பணி சாலை பாலம் ஒப்பந்ததாரர் கட்டணம் அறிக்கை கட்டம் ஒப்புதல் நிலுவையில் மதிப்பாய்வு மற்றும் "
+        "பட்ஜெட் காலக்கெடு வளங்கள் அபாயம் இணக்கம் தாமதம் சிக்கல் வெற்றி முழுமையான கவலை"
+    ).split(),
+    'bn': (
+        "প্রকল্প কাজ রাস্তা সেতু ঠিকাদার অর্থপ্রদান প্রতিবেদন পর্যায় অনুমোদিত বিচারাধীন পর্যালোচনা এবং "
+        "বাজেট সময়সীমা সম্পদ ঝুঁকি সম্মতি বিলম্ব সমস্যা সফল সম্পূর্ণ উদ্বেগ"
+    ).split(),
+}
+
+# Inputs that exercise the edge cases of the text scanner and lexicon
+EDGE_CASES = [
+    "",
+    "   \n\t ",
+    "No terminators here",
+    "Wait... what?! Really.",
+    "Paid $ then $,000 and $1,250.50, plus 100 rupees and 2,500.00 USD and 7 dollars.",
+    "Dates 1/2/23, 12-31-2023, 123/4/2023 and A1/2/2023 or _5/6/2023.",
+    "Progress 45%, 12.5% and x50% with 3.%",
+    "badelay riskbudget budget-timeline Risk, RISK! compliance_ KELVIN: Kelvin İstanbul",
+    "Behind schedule. Behind. Schedule, over-budget — on  track and cost overrun",
+    "The project faces delays and several issues; risks remain and the audit failed. Incomplete, unsuccessful.",
+    "परियोजना में देरी और समस्याएं हैं; ప్రాజెక్టు ఆలస్యంగా ఉంది",
+    "कार्य १२/१२/२०२३ को पूरा हुआ। बजट 50%",
+    "తెలుగు தமிழ் বাংলা mixed with हिन्दी text",
+    "१२% only native digits",
+    "a० mixed digit",
+]
+
+
+def generate_text(size: int, language: str = 'en', seed: int = 0) -> str:
+    """Deterministic DPR-like text of `size` characters with dates, amounts and percentages"""
+    rng = random.Random(f"{language}:{seed}")
+    words = WORDS[language]
+    parts = []
+    length = 0
+    while length < size:
+        sentence = ' '.join(rng.choice(words) for _ in range(rng.randint(5, 15)))
+        roll = rng.random()
+        if roll < 0.1:
+            sentence += f" on {rng.randint(1, 28)}/{rng.randint(1, 12)}/2023"
+        elif roll < 0.2:
+            sentence += f" costing ${rng.randint(1, 999)},000"
+        elif roll < 0.25:
+            sentence += f" about {rng.randint(1, 99)}.5%"
+        elif roll < 0.3:
+            sentence += f" worth {rng.randint(1, 99)} lakh rupees"
+        elif roll < 0.32:
+            sentence += " " + rng.choice(EDGE_CASES)
+        sentence = sentence.capitalize() + rng.choice(['.', '.', '.', '!', '?', '...'])
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return ' '.join(parts)[:size]
+
+
+def generate_dpr(size: int, language: str = 'en', issue_type: str = ISSUE_TYPES[0], seed: int = 0) -> Dict[str, Any]:
+    """One /analyze request body with a generated text and project data"""
+    rng = random.Random(f"{language}:{issue_type}:{seed}")
+    return {
+        'text': generate_text(size, language, seed),
+        'issue_type': issue_type,
+        'project_data': {
+            'budget': rng.choice([50_000, 250_000, 750_000, 2_500_000]),
+            'timeline_days': rng.choice([20, 45, 90, 365])
+        }
+    }
+
+
+def generate_corpus(
+    sizes: Sequence[int] = SIZES,
+    languages: Sequence[str] = LANGUAGES,
+    issue_types: Sequence[str] = ISSUE_TYPES,
+    seed: int = 0,
+) -> Iterator[Dict[str, Any]]:
+    """Every size/language pair once, cycling through the issue types"""
+    index = 0
+    for size in sizes:
+        for language in languages:
+            yield {
+                'size': size,
+                'language': language,
+                **generate_dpr(size, language, issue_types[index % len(issue_types)], seed)
+            }
+            index += 1
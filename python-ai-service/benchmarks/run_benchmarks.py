@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the basic AI service
+Times the analysis stages and in-process /analyze and /analyze-files requests on a synthetic DPR corpus,
+saves the results as JSON and fails when a benchmark is slower than a saved baseline by more than a threshold
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import platform
+import argparse
+import logging
+import statistics
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import ai_service_basic as service
+from corpus import ISSUE_TYPES, LANGUAGES, SIZES, generate_corpus, generate_dpr
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RESULTS_FORMAT = 1
+QUICK_SIZES = [1_000, 10_000]
+QUICK_LANGUAGES = ['en', 'hi']
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    return {
+        'iterations': len(ordered),
+        'median_ms': round(statistics.median(ordered) * 1000, 4),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 4),
+        'min_ms': round(ordered[0] * 1000, 4)
+    }
+
+
+def measure(func: Callable[[], Any], min_time: float, min_iterations: int) -> Dict[str, Any]:
+    """Call `func` until both `min_time` seconds and `min_iterations` calls have passed"""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_iterations or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def measure_async(func: Callable[[], Awaitable[Any]], min_time: float, min_iterations: int) -> Dict[str, Any]:
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_iterations or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def run_micro(corpus: List[Dict[str, Any]], args) -> Dict[str, Dict[str, Any]]:
+    """Per-stage timings; text stages per corpus item, scoring stages per issue type"""
+    results = {}
+    for item in corpus:
+        text, project_data = item['text'], item['project_data']
+        name = f"{item['language']}-{item['size']}"
+        results[f"micro/detect_language/{name}"] = measure(
+            lambda: service.detect_language(text), args.min_time, args.min_iterations
+        )
+        results[f"micro/extract_features/{name}"] = measure(
+            lambda: service.extract_features(text, project_data), args.min_time, args.min_iterations
+        )
+        results[f"micro/extract_basic_entities/{name}"] = measure(
+            lambda: service.extract_basic_entities(text), args.min_time, args.min_iterations
+        )
+
+    for issue_type in ISSUE_TYPES:
+        dpr = generate_dpr(1_000, 'en', issue_type)
+        features = service.extract_features(dpr['text'], dpr['project_data'])
+        name = issue_type.lower().replace(' ', '_')
+        results[f"micro/calculate_risk_score/{name}"] = measure(
+            lambda: service.calculate_risk_score(features, issue_type), args.min_time, args.min_iterations
+        )
+        results[f"micro/predict_delay/{name}"] = measure(
+            lambda: service.predict_delay(features, issue_type, dpr['project_data']), args.min_time, args.min_iterations
+        )
+    return results
+
+
+async def run_e2e(client: httpx.AsyncClient, corpus: List[Dict[str, Any]], args) -> Dict[str, Dict[str, Any]]:
+    """Full requests through the ASGI app, with the result cache bypassed"""
+    results = {}
+    for item in corpus:
+        name = f"{item['language']}-{item['size']}"
+        requests = {
+            f"e2e/analyze/{name}": ('/analyze', {
+                'text': item['text'],
+                'issue_type': item['issue_type'],
+                'project_data': item['project_data'],
+                'use_cache': False
+            }),
+            f"e2e/analyze-files/{name}": ('/analyze-files', {
+                'file_content': item['text'],
+                'file_type': 'text/plain',
+                'issue_type': item['issue_type'],
+                'use_cache': False
+            })
+        }
+        for benchmark, (path, payload) in requests.items():
+            async def post():
+                response = await client.post(path, json=payload)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+            results[benchmark] = await measure_async(post, args.min_time, args.min_iterations)
+    return results
+
+
+async def run_suite(args) -> Dict[str, Any]:
+    sizes = QUICK_SIZES if args.quick else args.sizes
+    languages = QUICK_LANGUAGES if args.quick else args.languages
+    corpus = list(generate_corpus(sizes, languages, seed=args.seed))
+    logger.info(f"Generated {len(corpus)} DPRs ({', '.join(languages)} x {', '.join(map(str, sizes))} chars)")
+
+    # httpx does not send lifespan events, so start the app the way uvicorn would
+    await service.app.router.startup()
+    await service.model_manager.wait_until_loaded()
+    try:
+        results = {}
+        if args.suite in ('all', 'micro'):
+            results.update(run_micro(corpus, args))
+        if args.suite in ('all', 'e2e'):
+            transport = httpx.ASGITransport(app=service.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                results.update(await run_e2e(client, corpus, args))
+    finally:
+        await service.app.router.shutdown()
+
+    return {
+        'format': RESULTS_FORMAT,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'model_version': service.model_manager.model_version,
+            'lexicon_version': service.lexicon.version
+        },
+        'config': {'sizes': sizes, 'languages': languages, 'seed': args.seed},
+        'results': results
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, noise_floor_ms: float) -> List[str]:
+    """Names of benchmarks whose median is more than `threshold` (and `noise_floor_ms`) above the baseline"""
+    regressions = []
+    for name, current in sorted(results['results'].items()):
+        previous = baseline['results'].get(name)
+        if previous is None:
+            logger.info(f"  new        {name}: {current['median_ms']:.3f} ms")
+            continue
+        change = current['median_ms'] / previous['median_ms'] - 1 if previous['median_ms'] else 0.0
+        slower = current['median_ms'] - previous['median_ms']
+        if change > threshold and slower > noise_floor_ms:
+            regressions.append(name)
+            logger.warning(f"  ❌ slower   {name}: {previous['median_ms']:.3f} -> {current['median_ms']:.3f} ms ({change:+.0%})")
+        elif change < -threshold:
+            logger.info(f"  faster     {name}: {previous['median_ms']:.3f} -> {current['median_ms']:.3f} ms ({change:+.0%})")
+    return regressions
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('format') != RESULTS_FORMAT:
+        raise ValueError(f"{path} is not a format {RESULTS_FORMAT} benchmark file")
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the basic AI service and check for regressions")
+    parser.add_argument("--suite", choices=['all', 'micro', 'e2e'], default='all')
+    parser.add_argument("--sizes", type=int, nargs='+', default=SIZES, help="Text sizes in characters")
+    parser.add_argument("--languages", nargs='+', default=LANGUAGES, choices=LANGUAGES)
+    parser.add_argument("--quick", action="store_true", help=f"Only {QUICK_SIZES} chars in {QUICK_LANGUAGES}")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds spent on each benchmark")
+    parser.add_argument("--min-iterations", type=int, default=5, help="Calls per benchmark, at least")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--save-baseline", help="Write the results to this file as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--noise-floor-ms", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = load_results(args.baseline)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Could not read baseline: {e}")
+            sys.exit(2)
+
+    results = asyncio.run(run_suite(args))
+    for name, result in sorted(results['results'].items()):
+        logger.info(f"{name:<45} median {result['median_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms  ({result['iterations']} runs)")
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote {path}")
+
+    if baseline is not None:
+        logger.info(f"Comparing with {args.baseline} (threshold {args.threshold:.0%})")
+        regressions = compare(results, baseline, args.threshold, args.noise_floor_ms)
+        if regressions:
+            logger.error(f"❌ {len(regressions)} benchmark(s) regressed")
+            sys.exit(1)
+        logger.info("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Token-aware sliding-window chunking for transformer pipelines
+# Splits whole documents into overlapping windows and merges per-window model outputs
+
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+WINDOW_TOKENS = int(os.getenv("AI_WINDOW_TOKENS", "384"))
+WINDOW_OVERLAP_TOKENS = int(os.getenv("AI_WINDOW_OVERLAP_TOKENS", "64"))
+TOKEN_BUDGET = int(os.getenv("AI_TOKEN_BUDGET", "16384"))
+
+# Upper bound on characters per token, used to avoid tokenizing text far beyond the budget
+MAX_CHARS_PER_TOKEN = 32
+
+
+class TextWindow(NamedTuple):
+    text: str
+    char_start: int
+    char_end: int
+    token_count: int      # tokens in the window
+    new_token_count: int  # tokens not already covered by the previous window
+
+
+def split_into_windows(
+    text: str,
+    tokenizer: Any,
+    max_tokens: int = WINDOW_TOKENS,
+    overlap: int = WINDOW_OVERLAP_TOKENS,
+    token_budget: int = TOKEN_BUDGET,
+) -> Tuple[List[TextWindow], Dict[str, Any]]:
+    """Split text into overlapping windows of at most `max_tokens` tokens
+
+    Only the first `token_budget` tokens are windowed. Returns the windows and a
+    coverage summary (tokens seen, tokens analyzed, whether the text was truncated).
+    """
+    max_tokens = max(1, max_tokens)
+    overlap = min(max(0, overlap), max_tokens - 1)
+    step = max_tokens - overlap
+
+    scanned_text = text[:token_budget * MAX_CHARS_PER_TOKEN]
+    encoding = tokenizer(scanned_text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = [span for span in encoding['offset_mapping'] if span[1] > span[0]]
+
+    total_tokens = len(offsets)
+    analyzed_tokens = min(total_tokens, token_budget)
+    truncated = total_tokens > token_budget or len(scanned_text) < len(text)
+
+    windows = []
+    start = 0
+    previous_end = 0
+    while start < analyzed_tokens:
+        end = min(start + max_tokens, analyzed_tokens)
+        char_start, char_end = offsets[start][0], offsets[end - 1][1]
+        windows.append(TextWindow(
+            text=scanned_text[char_start:char_end],
+            char_start=char_start,
+            char_end=char_end,
+            token_count=end - start,
+            new_token_count=end - max(start, previous_end)
+        ))
+        previous_end = end
+        if end == analyzed_tokens:
+            break
+        start += step
+
+    if not windows:
+        # No tokens at all; keep a single window so the pipelines still produce an output
+        windows.append(TextWindow(text=text, char_start=0, char_end=len(text), token_count=0, new_token_count=0))
+
+    coverage = {
+        'windows': len(windows),
+        'total_tokens': total_tokens,
+        'analyzed_tokens': analyzed_tokens,
+        'truncated': truncated
+    }
+    return windows, coverage
+
+
+def merge_sentiment(
+    windows: List[TextWindow],
+    results: List[Dict[str, Any]],
+    signed_score: Callable[[Dict[str, Any]], float],
+) -> Dict[str, Any]:
+    """Combine per-window sentiment into one length-weighted result
+
+    Each window is weighted by the tokens it adds beyond the previous window, so
+    overlapping text is not counted twice. The label is the one covering the most tokens.
+    """
+    if len(results) == 1:
+        return {**results[0], 'signed_score': signed_score(results[0])}
+
+    weights = [max(window.new_token_count, 1) for window in windows]
+    total_weight = sum(weights)
+
+    label_weights: Dict[str, float] = {}
+    label_scores: Dict[str, float] = {}
+    weighted_signed = 0.0
+    for weight, result in zip(weights, results):
+        label_weights[result['label']] = label_weights.get(result['label'], 0) + weight
+        label_scores[result['label']] = label_scores.get(result['label'], 0.0) + result['score'] * weight
+        weighted_signed += signed_score(result) * weight
+
+    label = max(label_weights, key=label_weights.get)
+    return {
+        'label': label,
+        'score': label_scores[label] / label_weights[label],
+        'signed_score': weighted_signed / total_weight
+    }
+
+
+def merge_entities(windows: List[TextWindow], results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Shift per-window entities to document offsets and drop duplicates from window overlaps
+
+    Overlapping spans with the same label are treated as one entity; the longer span
+    wins (entities cut at a window edge are shorter), then the higher score.
+    """
+    candidates = []
+    for window, entities in zip(windows, results):
+        for entity in entities:
+            if entity.get('start') is not None:
+                entity = {**entity, 'start': entity['start'] + window.char_start, 'end': entity['end'] + window.char_start}
+            candidates.append(entity)
+
+    if len(windows) == 1 or any(entity.get('start') is None for entity in candidates):
+        return candidates
+
+    candidates.sort(key=lambda ent: (ent['start'], -(ent['end'] - ent['start'])))
+    merged: List[Dict[str, Any]] = []
+    last_by_label: Dict[str, int] = {}
+    for entity in candidates:
+        label = entity['entity_group']
+        index = last_by_label.get(label)
+        if index is None or merged[index]['end'] <= entity['start']:
+            last_by_label[label] = len(merged)
+            merged.append(entity)
+            continue
+
+        kept = merged[index]
+        if (entity['end'] - entity['start'], entity['score']) > (kept['end'] - kept['start'], kept['score']):
+            merged[index] = entity
+
+    return merged
@@ -0,0 +1,142 @@
+# Survival-analysis delay model
+# Cox proportional hazards model trained offline by train_delay_model.py; serving multiplies a cached daily baseline hazard, so a batch of projects is one matrix operation
+
+import os
+import json
+import logging
+from typing import Any, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from portfolio import ISSUE_DELAY_DAYS
+
+logger = logging.getLogger(__name__)
+
+DELAY_MODEL_PATH = os.getenv(
+    "AI_DELAY_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "delay_model.npz")
+)
+# Rows per survival matrix (rows x horizon days of float64); larger batches are predicted in slices
+DELAY_PREDICT_BATCH_ROWS = int(os.getenv("AI_DELAY_PREDICT_BATCH_ROWS", "4096"))
+
+ARTIFACT_FORMAT = 1
+
+ISSUE_TYPES = list(ISSUE_DELAY_DAYS)
+COVARIATE_NAMES = ['log_budget', 'timeline_days', 'complexity', 'technical_terms'] + [f"issue:{name}" for name in ISSUE_TYPES]
+
+
+def delay_covariates(
+    issue_types: Sequence[Any], budget: Sequence[float], timeline_days: Sequence[float],
+    complexity: Sequence[float], technical_terms: Sequence[float]
+) -> np.ndarray:
+    """Covariate matrix (rows x COVARIATE_NAMES) for projects; unknown issue types get no indicator"""
+    issues = pd.Series(issue_types, dtype=object)
+    columns = [
+        np.log1p(np.maximum(np.asarray(budget, dtype=np.float64), 0)),
+        np.asarray(timeline_days, dtype=np.float64),
+        np.asarray(complexity, dtype=np.float64),
+        np.asarray(technical_terms, dtype=np.float64)
+    ]
+    columns.extend(issues.isin([name]).to_numpy(dtype=np.float64) for name in ISSUE_TYPES)
+    return np.column_stack(columns)
+
+
+class DelayModel:
+    """Cox PH model stored as coefficients over standardized covariates and a daily baseline cumulative hazard
+
+    `baseline_hazard[d]` is the cumulative hazard at day `d` (0..horizon) for covariates at the
+    training means. A project's survival curve, the probability that its delay exceeds `d` days,
+    is exp(-baseline_hazard[d] * exp(((x - means) / scales) . coefficients)).
+    """
+
+    def __init__(
+        self, coefficients: np.ndarray, means: np.ndarray, scales: np.ndarray,
+        baseline_hazard: np.ndarray, metadata: Dict[str, Any]
+    ):
+        self.coefficients = coefficients
+        self.means = means
+        self.scales = scales
+        self.baseline_hazard = baseline_hazard
+        self.metadata = metadata
+
+    @property
+    def horizon_days(self) -> int:
+        return len(self.baseline_hazard) - 1
+
+    @property
+    def version(self) -> str:
+        return self.metadata['version']
+
+    @property
+    def confidence(self) -> float:
+        """Holdout concordance index, when the model was evaluated"""
+        evaluation = self.metadata.get('evaluation') or {}
+        return round(evaluation.get('concordance') or self.metadata.get('train_concordance', 0.5), 3)
+
+    def hazard_ratios(self, covariates: np.ndarray) -> np.ndarray:
+        # Elementwise products summed per row, so a row gets the same value alone or in any batch
+        return np.exp((((covariates - self.means) / self.scales) * self.coefficients).sum(axis=1))
+
+    def survival(self, covariates: np.ndarray) -> np.ndarray:
+        """P(delay > d days) for d in 0..horizon, one row per project"""
+        return np.exp(-np.outer(self.hazard_ratios(covariates), self.baseline_hazard))
+
+    def predict(self, covariates: np.ndarray, batch_rows: int = DELAY_PREDICT_BATCH_ROWS) -> Dict[str, np.ndarray]:
+        """Delay distribution summaries per row: expected (restricted to the horizon), median and 90th percentile days, and P(delay > 0)"""
+        covariates = np.atleast_2d(covariates)
+        horizon = self.horizon_days
+        predicted = {
+            'expected_delay_days': np.empty(len(covariates)),
+            'median_delay_days': np.empty(len(covariates), dtype=np.int64),
+            'p90_delay_days': np.empty(len(covariates), dtype=np.int64),
+            'delay_probability': np.empty(len(covariates))
+        }
+        for start in range(0, len(covariates), max(1, batch_rows)):
+            survival = self.survival(covariates[start:start + batch_rows])
+            rows = slice(start, start + len(survival))
+            # Delays are whole days, so the mean of min(delay, horizon) is the sum of P(delay > d) for d < horizon
+            predicted['expected_delay_days'][rows] = survival[:, :horizon].sum(axis=1)
+            predicted['median_delay_days'][rows] = self.quantile_days(survival, 0.5)
+            predicted['p90_delay_days'][rows] = self.quantile_days(survival, 0.9)
+            predicted['delay_probability'][rows] = survival[:, 0]
+        return predicted
+
+    def predict_projects(
+        self, issue_types: Sequence[Any], budget: Sequence[float], timeline_days: Sequence[float],
+        complexity: Sequence[float], technical_terms: Sequence[float]
+    ) -> Dict[str, np.ndarray]:
+        return self.predict(delay_covariates(issue_types, budget, timeline_days, complexity, technical_terms))
+
+    def quantile_days(self, survival: np.ndarray, quantile: float) -> np.ndarray:
+        """First day by which `quantile` of delays have ended; the horizon when the curve never gets there"""
+        ended = survival <= 1 - quantile
+        return np.where(ended.any(axis=1), ended.argmax(axis=1), self.horizon_days)
+
+    def save(self, path: str):
+        """Write the artifact atomically as plain arrays, so loading needs no unpickling"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as file:
+            np.savez(
+                file,
+                format=np.array(ARTIFACT_FORMAT),
+                metadata=np.array(json.dumps({**self.metadata, 'covariate_names': COVARIATE_NAMES})),
+                coefficients=self.coefficients,
+                means=self.means,
+                scales=self.scales,
+                baseline_hazard=self.baseline_hazard
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DELAY_MODEL_PATH) -> "DelayModel":
+        with np.load(path, allow_pickle=False) as artifact:
+            if 'format' not in artifact or int(artifact['format']) != ARTIFACT_FORMAT:
+                raise ValueError(f"{path} is not a format {ARTIFACT_FORMAT} delay model artifact")
+            metadata = json.loads(str(artifact['metadata']))
+            if metadata.get('covariate_names') != COVARIATE_NAMES:
+                raise ValueError(f"{path} was trained on covariates {metadata.get('covariate_names')}, the service builds {COVARIATE_NAMES}")
+            return cls(
+                artifact['coefficients'], artifact['means'], artifact['scales'], artifact['baseline_hazard'], metadata
+            )
@@ -0,0 +1,485 @@
+# Similar-report search index
+# Document embeddings in a memory-mapped float32 matrix with an ID map, searched exactly or through an IVF index
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIR = os.getenv("AI_EMBEDDING_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embeddings"))
+EXACT_SEARCH_MAX_ROWS = int(os.getenv("AI_EMBEDDING_EXACT_MAX_ROWS", "20000"))
+IVF_NPROBE = int(os.getenv("AI_EMBEDDING_NPROBE", "8"))
+
+# Rows scored per matrix product in exact search and assignment, to bound temporary memory
+SCAN_CHUNK_ROWS = 65536
+# K-means iterations, list count cap and training sample size per list
+IVF_TRAIN_ITERATIONS = 10
+IVF_MAX_LISTS = 1024
+IVF_SAMPLES_PER_LIST = 40
+# Rows appended after the lists were built are scored exactly until there are this many (or 10% of the index)
+IVF_TAIL_ROWS = 4096
+INITIAL_CAPACITY = 1024
+
+FILE_SUFFIXES = {"vectors": ".f32", "rows": ".jsonl", "ivf": ".npz"}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length, so a dot product is the cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def train_centroids(sample: np.ndarray, lists: int, seed: int = 42) -> np.ndarray:
+    """Spherical k-means over unit vectors; returns unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(IVF_TRAIN_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=lists)
+        filled = counts > 0
+        sums = np.empty_like(centroids)
+        sums[filled] = np.add.reduceat(sample[order], (np.cumsum(counts) - counts)[filled])
+        # Empty lists restart from random rows instead of staying dead
+        sums[~filled] = sample[rng.choice(len(sample), int((~filled).sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class EmbeddingIndex:
+    """Append-only embedding store with upserts, deletes, compaction and top-k cosine search
+
+    Files, in `directory`: `meta.json` names the current generation and the embedding model;
+    `vectors-<gen>.f32` is the row-major float32 matrix (memory-mapped, grown by doubling);
+    `rows-<gen>.jsonl` logs every add (id, row, metadata) and delete; `ivf-<gen>.npz` holds the
+    IVF centroids and row assignments once the index outgrows exact search. Writers take an
+    exclusive file lock and readers replay new log lines before searching, so several service
+    processes (serve.py workers) can share one index. Compaction writes the next generation
+    and switches to it by replacing `meta.json`.
+    """
+
+    def __init__(
+        self,
+        directory: str = EMBEDDING_DIR,
+        model: str = "",
+        exact_max_rows: int = EXACT_SEARCH_MAX_ROWS,
+        nprobe: int = IVF_NPROBE,
+    ):
+        self.directory = directory
+        self.model = model
+        self.exact_max_rows = exact_max_rows
+        self.nprobe = max(1, nprobe)
+        self.generation = -1
+        self.dim: Optional[int] = None
+        self.count = 0                      # rows written, live or not
+        self.ids: Dict[str, int] = {}       # id -> live row
+        self.row_ids: List[Optional[str]] = []
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.vectors: Optional[np.memmap] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.assignment = np.zeros(0, dtype=np.int32)
+        self.trained_rows = 0               # live rows when the centroids were trained
+        self.list_rows: List[np.ndarray] = []
+        self.listed_rows = 0                # rows covered by list_rows
+        self.ivf_version: Optional[Tuple[int, int]] = None
+        self.meta_version: Optional[Tuple[int, int]] = None
+        self.log_offset = 0
+        self._lock = threading.RLock()
+
+    # Files
+
+    def path(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"{name}-{generation}{FILE_SUFFIXES[name]}")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return FileLock(os.path.join(self.directory, "index.lock"))
+
+    def read_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self.meta_path) as meta_file:
+                return json.load(meta_file)
+        except FileNotFoundError:
+            return {"generation": 0, "dim": None, "model": self.model}
+
+    def write_meta(self, meta: Dict[str, Any]):
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as meta_file:
+            json.dump(meta, meta_file)
+            meta_file.flush()
+            os.fsync(meta_file.fileno())
+        os.replace(temp_path, self.meta_path)
+
+    def capacity(self) -> int:
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def map_vectors(self, min_rows: int = 0):
+        """(Re)map the matrix file, growing it to at least `min_rows` rows when writing"""
+        path = self.path("vectors")
+        row_bytes = self.dim * 4
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if min_rows * row_bytes > size:
+            rows = max(INITIAL_CAPACITY, self.capacity())
+            while rows < min_rows:
+                rows *= 2
+            with open(path, "ab") as vectors_file:
+                vectors_file.truncate(rows * row_bytes)
+            size = rows * row_bytes
+        if size // row_bytes != self.capacity():
+            self.vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(size // row_bytes, self.dim)) if size else None
+
+    # Loading and refreshing
+
+    @staticmethod
+    def file_version(path: str) -> Optional[Tuple[int, int]]:
+        """Changes whenever the file is replaced or rewritten"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self):
+        """Pick up rows, deletes, IVF rebuilds and compactions written by other processes"""
+        with self._lock:
+            meta_version = self.file_version(self.meta_path)
+            if meta_version != self.meta_version or self.generation < 0:
+                self.load(meta_version)
+            else:
+                self.replay_log()
+            self.load_ivf()
+
+    def load(self, meta_version: Optional[Tuple[int, int]]):
+        meta = self.read_meta()
+        if meta.get("model") and self.model and meta["model"] != self.model:
+            raise ValueError(
+                f"Embedding index in {self.directory} was built with {meta['model']}, not {self.model}; "
+                f"move it aside to rebuild it"
+            )
+        self.generation = meta["generation"]
+        self.dim = meta.get("dim")
+        self.meta_version = meta_version
+        self.count = 0
+        self.ids, self.row_ids, self.metadata = {}, [], {}
+        self.live = np.zeros(0, dtype=bool)
+        self.vectors = None
+        self.centroids, self.assignment, self.trained_rows = None, np.zeros(0, dtype=np.int32), 0
+        self.list_rows, self.listed_rows = [], 0
+        self.ivf_version = None
+        self.log_offset = 0
+        if self.dim:
+            self.map_vectors()
+        self.replay_log()
+        logger.info(f"Embedding index generation {self.generation}: {len(self.ids)} live of {self.count} rows")
+
+    def replay_log(self):
+        path = self.path("rows")
+        if not os.path.exists(path) or os.path.getsize(path) == self.log_offset:
+            return
+        with open(path, "rb") as log_file:
+            log_file.seek(self.log_offset)
+            for line in log_file:
+                if not line.endswith(b"\n"):
+                    break  # a writer is mid-append; read it next time
+                self.log_offset += len(line)
+                self.apply(json.loads(line))
+        if self.dim and self.count > self.capacity():
+            self.map_vectors()
+
+    def apply(self, entry: Dict[str, Any]):
+        doc_id = entry["id"]
+        previous = self.ids.pop(doc_id, None)
+        if previous is not None:
+            self.live[previous] = False
+        self.metadata.pop(doc_id, None)
+        if entry.get("op") == "delete":
+            return
+        row = entry["row"]
+        if row >= len(self.live):
+            grown = np.zeros(max(INITIAL_CAPACITY, 2 * len(self.live), row + 1), dtype=bool)
+            grown[:len(self.live)] = self.live
+            self.live = grown
+        self.live[row] = True
+        self.row_ids.extend([None] * (row + 1 - len(self.row_ids)))
+        self.row_ids[row] = doc_id
+        self.ids[doc_id] = row
+        self.metadata[doc_id] = entry.get("metadata") or {}
+        self.count = max(self.count, row + 1)
+
+    def load_ivf(self):
+        path = self.path("ivf")
+        version = self.file_version(path)
+        if version is None or version == self.ivf_version:
+            return
+        with np.load(path) as ivf:
+            self.centroids = ivf["centroids"]
+            self.assignment = ivf["assignment"]
+            self.trained_rows = int(ivf["trained_rows"])
+        self.ivf_version = version
+        self.build_lists()
+
+    # IVF
+
+    def build_lists(self):
+        """Group the assigned rows by list; rows past the assignment are scored exactly"""
+        assigned = min(len(self.assignment), self.count)
+        order = np.argsort(self.assignment[:assigned], kind="stable")
+        bounds = np.searchsorted(self.assignment[:assigned][order], np.arange(len(self.centroids) + 1))
+        self.list_rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        self.listed_rows = assigned
+
+    def assign(self, start: int, end: int) -> np.ndarray:
+        parts = [np.argmax(self.vectors[i:min(i + SCAN_CHUNK_ROWS, end)] @ self.centroids.T, axis=1)
+                 for i in range(start, end, SCAN_CHUNK_ROWS)]
+        return np.concatenate(parts).astype(np.int32) if parts else np.zeros(0, dtype=np.int32)
+
+    def train_ivf(self):
+        """Train centroids on a sample of the live rows and assign every row; caller holds the file lock"""
+        live_rows = np.flatnonzero(self.live[:self.count])
+        lists = min(IVF_MAX_LISTS, max(1, int(4 * np.sqrt(len(live_rows)))))
+        rng = np.random.default_rng(42)
+        sample_rows = np.sort(rng.choice(live_rows, min(len(live_rows), lists * IVF_SAMPLES_PER_LIST), replace=False))
+        started = time.perf_counter()
+        self.centroids = train_centroids(np.asarray(self.vectors[sample_rows]), lists)
+        self.assignment = self.assign(0, self.count)
+        self.trained_rows = len(live_rows)
+        self.save_ivf()
+        logger.info(f"Trained IVF index with {lists} lists on {len(sample_rows)} rows in {time.perf_counter() - started:.1f}s")
+
+    def extend_ivf(self):
+        """Assign rows appended since the last build; caller holds the file lock"""
+        self.assignment = np.concatenate([self.assignment, self.assign(len(self.assignment), self.count)])
+        self.save_ivf()
+
+    def save_ivf(self):
+        path = self.path("ivf")
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, centroids=self.centroids, assignment=self.assignment, trained_rows=self.trained_rows)
+        os.replace(temp_path, path)
+        self.ivf_version = self.file_version(path)
+        self.build_lists()
+
+    def maintain_ivf(self):
+        """Build the IVF index once exact search gets too slow, and keep new rows assigned"""
+        live_count = len(self.ids)
+        if live_count <= self.exact_max_rows:
+            return
+        if self.centroids is None or live_count > 4 * self.trained_rows:
+            # Lists were sized for a quarter of the rows or fewer; retrain for the current size
+            self.train_ivf()
+        elif self.count - len(self.assignment) > max(IVF_TAIL_ROWS, len(self.assignment) // 10):
+            self.extend_ivf()
+
+    # Writes
+
+    def add(self, items: List[Tuple[str, np.ndarray, Dict[str, Any]]]) -> int:
+        """Append (id, vector, metadata) rows; an existing id is replaced. Returns the live row count"""
+        if not items:
+            return len(self.ids)
+        vectors = normalize(np.stack([vector for _, vector, _ in items]))
+        with self._lock, self.file_lock():
+            self.refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self.write_meta({"generation": self.generation, "dim": self.dim, "model": self.model})
+                self.meta_version = self.file_version(self.meta_path)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+            start = self.count
+            self.map_vectors(start + len(items))
+            self.vectors[start:start + len(items)] = vectors
+            self.vectors.flush()
+            # The log line is the commit point: rows not logged yet are overwritten by the next append
+            entries = [{"op": "add", "id": doc_id, "row": start + i, "metadata": metadata or {}}
+                       for i, (doc_id, _, metadata) in enumerate(items)]
+            self.append_log(entries)
+            self.maintain_ivf()
+            return len(self.ids)
+
+    def delete(self, doc_ids: List[str]) -> int:
+        """Delete ids; their rows stay in the files until compaction. Returns how many existed"""
+        with self._lock, self.file_lock():
+            self.refresh()
+            entries = [{"op": "delete", "id": doc_id} for doc_id in dict.fromkeys(doc_ids) if doc_id in self.ids]
+            self.append_log(entries)
+            return len(entries)
+
+    def append_log(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        with open(self.path("rows"), "ab") as log_file:
+            log_file.write("".join(json.dumps(entry) + "\n" for entry in entries).encode())
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        self.replay_log()
+
+    def compact(self) -> Dict[str, Any]:
+        """Rewrite the live rows into a new generation, dropping deleted and replaced rows"""
+        with self._lock, self.file_lock():
+            self.refresh()
+            started = time.perf_counter()
+            before = self.count
+            old_generation = self.generation
+            generation = old_generation + 1
+            live_rows = np.flatnonzero(self.live[:self.count])
+            if self.dim:
+                with open(self.path("vectors", generation), "wb") as vectors_file:
+                    for i in range(0, len(live_rows), SCAN_CHUNK_ROWS):
+                        vectors_file.write(np.ascontiguousarray(self.vectors[live_rows[i:i + SCAN_CHUNK_ROWS]]).tobytes())
+                    vectors_file.flush()
+                    os.fsync(vectors_file.fileno())
+            with open(self.path("rows", generation), "w") as log_file:
+                for new_row, row in enumerate(live_rows):
+                    doc_id = self.row_ids[row]
+                    log_file.write(json.dumps({"op": "add", "id": doc_id, "row": new_row, "metadata": self.metadata[doc_id]}) + "\n")
+                log_file.flush()
+                os.fsync(log_file.fileno())
+            self.write_meta({"generation": generation, "dim": self.dim, "model": self.model})
+            self.vectors = None
+            self.load(self.file_version(self.meta_path))
+            if len(self.ids) > self.exact_max_rows:
+                self.train_ivf()
+            for name in ("vectors", "rows", "ivf"):
+                try:
+                    os.remove(self.path(name, old_generation))
+                except FileNotFoundError:
+                    pass
+            summary = {
+                "generation": generation,
+                "rows_before": before,
+                "rows_after": self.count,
+                "seconds": round(time.perf_counter() - started, 3)
+            }
+            logger.info(f"Compacted embedding index: {summary}")
+            return summary
+
+    # Reads
+
+    def vector(self, doc_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            self.refresh()
+            row = self.ids.get(doc_id)
+            return None if row is None else np.array(self.vectors[row])
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Optional[str] = None) -> Dict[str, Any]:
+        """Top-k rows by cosine similarity; exact below `exact_max_rows` live rows, IVF above"""
+        query = normalize(query)
+        with self._lock:
+            self.refresh()
+            if not self.ids:
+                return {"mode": "exact", "scanned": 0, "results": []}
+            if query.shape[-1] != self.dim:
+                raise ValueError(f"Expected a {self.dim}-dimensional query, got {query.shape[-1]}")
+            wanted = k + (exclude in self.ids)
+            if self.centroids is None or len(self.ids) <= self.exact_max_rows:
+                mode = "exact"
+                rows, scores = self.search_exact(query, wanted)
+                scanned = self.count
+            else:
+                mode = "ivf"
+                rows, scores, scanned = self.search_ivf(query, wanted)
+            results = []
+            for row, score in zip(rows, scores):
+                doc_id = self.row_ids[row]
+                if doc_id != exclude and len(results) < k:
+                    results.append({"id": doc_id, "score": round(float(score), 6), "metadata": self.metadata[doc_id]})
+            return {"mode": mode, "scanned": int(scanned), "results": results}
+
+    def search_exact(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_rows, best_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        for start in range(0, self.count, SCAN_CHUNK_ROWS):
+            end = min(start + SCAN_CHUNK_ROWS, self.count)
+            scores = self.vectors[start:end] @ query
+            scores[~self.live[start:end]] = -np.inf
+            best_rows = np.concatenate([best_rows, np.arange(start, end)])
+            best_scores = np.concatenate([best_scores, scores])
+            keep = top_k(best_scores, k)
+            best_rows, best_scores = best_rows[keep], best_scores[keep]
+        live = np.isfinite(best_scores)
+        return best_rows[live], best_scores[live]
+
+    def search_ivf(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        probes = top_k(self.centroids @ query, self.nprobe)
+        tail = np.arange(self.listed_rows, self.count)
+        rows = np.concatenate([*(self.list_rows[i] for i in probes), tail])
+        rows = np.sort(rows[self.live[rows]])
+        scores = self.vectors[rows] @ query
+        keep = top_k(scores, k)
+        return rows[keep], scores[keep], len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self.refresh()
+            live_count = len(self.ids)
+            return {
+                "live": live_count,
+                "rows": self.count,
+                "dead": self.count - live_count,
+                "dimensions": self.dim,
+                "model": self.model,
+                "generation": self.generation,
+                "search_mode": "ivf" if self.centroids is not None and live_count > self.exact_max_rows else "exact",
+                "ivf_lists": 0 if self.centroids is None else len(self.centroids),
+                "nprobe": self.nprobe,
+                "exact_max_rows": self.exact_max_rows,
+                "matrix_mb": round(self.capacity() * (self.dim or 0) * 4 / (1024 * 1024), 2)
+            }
+
+
+class FileLock:
+    """Exclusive lock on a file, so one process writes the index at a time (flock, or msvcrt on Windows)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, "a")
+        if os.name == "nt":
+            # Locks the first byte; LK_LOCK gives up after about 10 seconds, so keep waiting
+            self.handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if os.name == "nt":
+            self.handle.seek(0)
+            msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+        self.handle = None
@@ -0,0 +1,91 @@
+# Progressive analysis responses
+# Sends stage results as NDJSON lines or server-sent events while holding the request's inference slot
+
+import json
+import logging
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from inference_executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+StageEvent = Tuple[str, Dict[str, Any]]
+
+
+def wants_sse(accept: Optional[str]) -> bool:
+    return SSE_MEDIA_TYPE in (accept or "").lower()
+
+
+def json_default(value: Any) -> Any:
+    # numpy scalars and arrays expose .item() / .tolist()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def encode_event(event: str, data: Dict[str, Any], sse: bool) -> bytes:
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n".encode('utf-8')
+    return (json.dumps({"event": event, "data": data}, default=json_default) + "\n").encode('utf-8')
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse that runs `release` once the response is over, whether or not its body was sent"""
+
+    def __init__(self, content: AsyncIterator[bytes], release: Callable[[], Awaitable[None]], **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release()
+
+
+async def admitted_event_stream(
+    executor: InferenceExecutor,
+    events: AsyncGenerator[StageEvent, None],
+    accept: Optional[str],
+) -> StreamingResponse:
+    """Stream `events` to the client; the in-flight slot is taken now and released when the response ends
+
+    Overload is rejected with a normal 429/503 before any bytes are sent. Failures after
+    that are reported as an `error` event, since the status line has already gone out.
+    The slot is released by the response itself, so a client that disconnects before the
+    body starts does not keep it.
+    """
+    sse = wants_sse(accept)
+    slot = executor.admit()
+    await slot.__aenter__()
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async for event, data in events:
+                yield encode_event(event, data, sse)
+        except HTTPException as e:
+            yield encode_event("error", {"status_code": e.status_code, "detail": e.detail}, sse)
+        except Exception as e:
+            logger.error(f"Error in streamed analysis: {e}")
+            yield encode_event("error", {"status_code": 500, "detail": str(e)}, sse)
+
+    async def release():
+        try:
+            await events.aclose()
+        finally:
+            await slot.__aexit__(None, None, None)
+
+    return AdmittedStreamingResponse(
+        body(),
+        release,
+        media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Offline export of the sentiment and NER models for faster CPU inference
+Exports ONNX Runtime graphs (optionally int8-quantized) and checks any backend against fp32 PyTorch
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, List
+
+from inference_backend import (
+    INFERENCE_BACKENDS, NER_MODEL, ONNX_MODEL_DIR, SENTIMENT_MODEL, TASK_MODEL_CLASSES, build_pipeline, onnx_model_path
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Pipelines covered by the export, with the arguments the service uses
+MODELS = {
+    'sentiment': ("sentiment-analysis", SENTIMENT_MODEL, {}),
+    'ner': ("ner", NER_MODEL, {'aggregation_strategy': "simple"}),
+}
+
+# DPR-style sentences used when no --texts-file is given
+PARITY_TEXTS = [
+    "The project budget of Rs 45 crore was approved by the Ministry of Road Transport in March 2023.",
+    "Construction on the Hyderabad metro extension is running six months behind schedule due to land acquisition delays.",
+    "Cost overruns on the Pune water treatment plant have raised serious concerns among stakeholders.",
+    "The contractor Larsen & Toubro completed the foundation work ahead of the planned milestone.",
+    "Resource allocation for the Chennai flood mitigation project is inadequate and staff shortages persist.",
+    "Environmental clearance from the Central Pollution Control Board is still pending.",
+    "Excellent progress was reported by the site engineer, and quality audits found no major issues.",
+    "The timeline assumes monsoon-free working months, which is unrealistic for the Kerala coastal highway.",
+]
+
+
+def export_onnx(name: str, quantize: bool) -> str:
+    """Export one model to ONNX (plus a dynamic int8 copy) under AI_ONNX_MODEL_DIR"""
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    import optimum.onnxruntime as ort
+    from transformers import AutoTokenizer
+
+    task, model_name, _ = MODELS[name]
+    path = onnx_model_path(model_name)
+    logger.info(f"Exporting {model_name} to {path}...")
+
+    model = getattr(ort, TASK_MODEL_CLASSES[task][1]).from_pretrained(model_name, export=True)
+    model.save_pretrained(path)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(path)
+
+    if quantize:
+        # Dynamic quantization computes activation ranges at run time, so no calibration data is needed
+        logger.info(f"Quantizing {model_name} to int8...")
+        quantizer = ORTQuantizer.from_pretrained(model)
+        quantizer.quantize(
+            save_dir=path,
+            quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        )
+
+    logger.info(f"✅ Exported {model_name}")
+    return path
+
+
+def timed_run(pipe: Any, texts: List[str], repeats: int, **kwargs: Any) -> Dict[str, Any]:
+    """Outputs for `texts` and the mean latency per text over `repeats` runs"""
+    outputs = pipe(texts, **kwargs)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        pipe(texts, **kwargs)
+    latency = (time.perf_counter() - started) / (repeats * len(texts)) if repeats else None
+    return {'outputs': outputs, 'latency_ms': latency * 1000 if latency is not None else None}
+
+
+def compare_sentiment(reference: List[Dict], candidate: List[Dict], tolerance: float) -> List[str]:
+    problems = []
+    for i, (ref, cand) in enumerate(zip(reference, candidate)):
+        if ref['label'] != cand['label']:
+            problems.append(f"text {i}: label {cand['label']} != {ref['label']}")
+        elif abs(ref['score'] - cand['score']) > tolerance:
+            problems.append(f"text {i}: score {cand['score']:.4f} vs {ref['score']:.4f}")
+    return problems
+
+
+def compare_entities(reference: List[List[Dict]], candidate: List[List[Dict]], tolerance: float) -> List[str]:
+    problems = []
+    for i, (ref, cand) in enumerate(zip(reference, candidate)):
+        ref_by_key = {(ent['entity_group'], ent['word']): ent['score'] for ent in ref}
+        cand_by_key = {(ent['entity_group'], ent['word']): ent['score'] for ent in cand}
+        for key in ref_by_key.keys() - cand_by_key.keys():
+            problems.append(f"text {i}: missing entity {key}")
+        for key in cand_by_key.keys() - ref_by_key.keys():
+            problems.append(f"text {i}: extra entity {key}")
+        for key in ref_by_key.keys() & cand_by_key.keys():
+            if abs(ref_by_key[key] - cand_by_key[key]) > tolerance:
+                problems.append(f"text {i}: {key} score {cand_by_key[key]:.4f} vs {ref_by_key[key]:.4f}")
+    return problems
+
+
+def check_parity(name: str, backend: str, texts: List[str], tolerance: float, repeats: int) -> Dict[str, Any]:
+    """Run fp32 PyTorch and `backend` on the same texts and compare labels, scores and latency"""
+    task, model_name, pipeline_kwargs = MODELS[name]
+    call_kwargs = {'truncation': True} if name == 'sentiment' else {}
+
+    reference = timed_run(build_pipeline(task, model_name, backend="torch", **pipeline_kwargs), texts, repeats, **call_kwargs)
+    candidate = timed_run(build_pipeline(task, model_name, backend=backend, **pipeline_kwargs), texts, repeats, **call_kwargs)
+
+    # A single text comes back unwrapped from the NER pipeline
+    if name == 'ner' and len(texts) == 1:
+        reference['outputs'], candidate['outputs'] = [reference['outputs']], [candidate['outputs']]
+
+    compare = compare_sentiment if name == 'sentiment' else compare_entities
+    problems = compare(reference['outputs'], candidate['outputs'], tolerance)
+    speedup = None
+    if reference['latency_ms'] and candidate['latency_ms']:
+        speedup = reference['latency_ms'] / candidate['latency_ms']
+
+    result = {
+        'model': model_name,
+        'backend': backend,
+        'passed': not problems,
+        'problems': problems,
+        'fp32_latency_ms': reference['latency_ms'],
+        'backend_latency_ms': candidate['latency_ms'],
+        'speedup': speedup
+    }
+    status = "✅" if result['passed'] else "❌"
+    speedup_text = f", {speedup:.2f}x faster" if speedup else ""
+    logger.info(f"{status} {name} on {backend}: {len(problems)} mismatches{speedup_text}")
+    for problem in problems:
+        logger.warning(f"   {problem}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export models to ONNX Runtime and check backend parity with fp32")
+    parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument("--backend", choices=[b for b in INFERENCE_BACKENDS if b != "torch"], default="onnx",
+                        help="Backend to check against fp32 PyTorch (default: onnx)")
+    parser.add_argument("--check-only", action="store_true", help="Skip the export and only run the parity check")
+    parser.add_argument("--no-quantize", action="store_true", help="Export fp32 ONNX graphs without the int8 copy")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Largest allowed score difference")
+    parser.add_argument("--texts-file", help="File with one parity text per line")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per backend")
+    parser.add_argument("--report", help="Write the parity report as JSON to this path")
+    args = parser.parse_args()
+
+    texts = PARITY_TEXTS
+    if args.texts_file:
+        with open(args.texts_file, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    if args.backend == "onnx" and not args.check_only:
+        for name in args.models:
+            export_onnx(name, quantize=not args.no_quantize)
+        logger.info(f"ONNX models written to {ONNX_MODEL_DIR}")
+
+    results = [check_parity(name, args.backend, texts, args.tolerance, args.repeats) for name in args.models]
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({'tolerance': args.tolerance, 'texts': len(texts), 'results': results}, f, indent=2)
+
+    if not all(result['passed'] for result in results):
+        logger.error(f"❌ {args.backend} outputs differ from fp32 beyond tolerance {args.tolerance}")
+        sys.exit(1)
+
+    logger.info(f"✅ {args.backend} matches fp32 within tolerance {args.tolerance}; "
+                f"start the service with AI_INFERENCE_BACKEND={args.backend}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Feature extraction for the risk models
+# Shared by the services and the training scripts; imports only the text scanner and the lexicons, not a service
+
+import re
+from typing import Dict
+
+import numpy as np
+
+from lexicon import load_lexicons
+from text_scanner import SCRIPT_PATTERNS, SENTENCE_TERMINATORS, TextScanner
+
+# Positive, negative and technical terms for every supported language (lexicons/*.json)
+lexicon = load_lexicons()
+
+def detect_language(text: str) -> str:
+    """Simple language detection based on script"""
+    for language, pattern in SCRIPT_PATTERNS:
+        if pattern.search(text):
+            return language
+    # Default to English
+    return "en"
+
+def lexicon_counts(text: str) -> Dict[str, int]:
+    """Lexicon term occurrences per category, using the lexicon of the text's language"""
+    return lexicon.category_counts(lexicon.count(text), detect_language(text))
+
+# Basic service: the random forest's feature row (risk_artifact.FEATURE_NAMES)
+
+def extract_feature_row(text: str, project_data: Dict) -> np.ndarray:
+    """Extract numerical features for ML models"""
+    return build_feature_row(
+        len(text.split()),  # word count
+        len(SENTENCE_TERMINATORS.split(text)),  # sentence count
+        lexicon_counts(text)['technical'],  # technical terms
+        project_data
+    )
+
+def build_feature_row(word_count: int, sentence_count: int, technical_terms: int, project_data: Dict) -> np.ndarray:
+    """Feature row from text counts and project data"""
+    features = [word_count, sentence_count, technical_terms]
+
+    # Project features (with defaults)
+    features.append(project_data.get('budget', 100000) / 100000)  # normalized budget
+    features.append(project_data.get('timeline_days', 90) / 365)  # normalized timeline
+
+    return np.array(features).reshape(1, -1)
+
+# Full service: the gradient-boosted model's feature dict (gbm_risk.TEXT_PROJECT_FEATURES)
+
+TECHNICAL_TERMS = re.compile(r'\b(budget|timeline|resource|risk|compliance|deadline|milestone)\b')
+
+# Word, sentence and technical term counts from one lowercase and split of the text
+feature_scanner = TextScanner(TECHNICAL_TERMS, entities=False)
+
+def extract_features(text: str, project_data: Dict) -> Dict[str, float]:
+    """Extract numerical features for ML models"""
+    scan = feature_scanner.scan(text)
+    return build_features(
+        scan.word_count,
+        scan.sentence_count,
+        scan.word_length_total / scan.word_count if scan.word_count else np.nan,
+        scan.technical_terms,
+        project_data
+    )
+
+def build_features(word_count: int, sentence_count: int, avg_word_length: float, technical_terms: int, project_data: Dict) -> Dict[str, float]:
+    """Feature dict from text statistics and project data"""
+    features = {}
+
+    # Text features
+    features['word_count'] = word_count
+    features['sentence_count'] = sentence_count
+    features['avg_word_length'] = avg_word_length
+    features['technical_terms'] = technical_terms
+
+    # Project features (with defaults)
+    features['budget_size'] = project_data.get('budget', 100000)
+    features['timeline_days'] = project_data.get('timeline_days', 90)
+    features['team_size'] = project_data.get('team_size', 5)
+    features['complexity_score'] = project_data.get('complexity', 3)
+
+    # Derived features
+    features['budget_per_day'] = features['budget_size'] / max(features['timeline_days'], 1)
+    features['words_per_sentence'] = features['word_count'] / max(features['sentence_count'], 1)
+
+    return features
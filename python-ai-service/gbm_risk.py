@@ -0,0 +1,278 @@
+# Gradient-boosted risk models
+# XGBoost/LightGBM boosters trained by train_gbm_risk_model.py, served natively or compiled into flat node arrays evaluated for all rows at once
+
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from portfolio import ISSUE_RISK_WEIGHTS
+from startup_report import timed_import
+
+logger = logging.getLogger(__name__)
+
+GBM_RISK_MODEL_PATH = os.getenv(
+    "AI_GBM_RISK_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "risk_gbm.json")
+)
+GBM_PREDICTOR = os.getenv("AI_GBM_PREDICTOR", "native")  # native | compiled
+GBM_THREADS = int(os.getenv("AI_GBM_THREADS", "1"))  # per worker process; one thread is fastest for single requests
+GBM_WARMUP_CALLS = int(os.getenv("AI_GBM_WARMUP_CALLS", "50"))
+# The compiled forest wins on per-call overhead; larger batches go to the booster, which is faster per row
+GBM_COMPILED_MAX_ROWS = int(os.getenv("AI_GBM_COMPILED_MAX_ROWS", "32"))
+
+ARTIFACT_FORMAT = 1
+GBM_LIBRARIES = ('xgboost', 'lightgbm')
+GBM_PREDICTORS = ('native', 'compiled')
+BOOSTER_SUFFIXES = {'xgboost': 'ubj', 'lightgbm': 'txt'}
+
+# build_features keys, in order, then one indicator per known issue type
+TEXT_PROJECT_FEATURES = [
+    'word_count', 'sentence_count', 'avg_word_length', 'technical_terms', 'budget_size',
+    'timeline_days', 'team_size', 'complexity_score', 'budget_per_day', 'words_per_sentence'
+]
+ISSUE_TYPES = list(ISSUE_RISK_WEIGHTS)
+RISK_FEATURE_NAMES = TEXT_PROJECT_FEATURES + [f"issue:{name}" for name in ISSUE_TYPES]
+
+# Compiled and native probabilities may differ by float rounding only
+COMPILED_TOLERANCE = 1e-5
+# LightGBM treats |x| <= kZeroThreshold as zero
+LIGHTGBM_ZERO_THRESHOLD = 1e-35
+
+
+def risk_feature_rows(features: Sequence[Dict[str, float]], issue_types: Sequence[Optional[str]]) -> np.ndarray:
+    """Model input (rows x RISK_FEATURE_NAMES) from feature dicts; missing text statistics stay NaN"""
+    rows = np.zeros((len(features), len(RISK_FEATURE_NAMES)))
+    for row, (feature_dict, issue_type) in zip(rows, zip(features, issue_types)):
+        row[:len(TEXT_PROJECT_FEATURES)] = [feature_dict[name] for name in TEXT_PROJECT_FEATURES]
+        if issue_type in ISSUE_RISK_WEIGHTS:
+            row[len(TEXT_PROJECT_FEATURES) + ISSUE_TYPES.index(issue_type)] = 1.0
+    return rows
+
+
+def sigmoid(margin: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-margin))
+
+
+class NativeBooster:
+    """A booster loaded with its own library, predicting whole batches in one call with `threads` threads"""
+
+    def __init__(self, library: str, path: str, threads: int = GBM_THREADS):
+        self.library = library
+        self.threads = max(1, threads)
+        if library == 'xgboost':
+            self.booster = timed_import('xgboost').Booster(model_file=path)
+            self.booster.set_param({'nthread': self.threads})
+        else:
+            self.booster = timed_import('lightgbm').Booster(model_file=path)
+
+    def predict_margin(self, rows: np.ndarray) -> np.ndarray:
+        if self.library == 'xgboost':
+            # inplace_predict skips building a DMatrix
+            return np.asarray(self.booster.inplace_predict(rows, predict_type='margin'), dtype=np.float64)
+        return np.asarray(self.booster.predict(rows, raw_score=True, num_threads=self.threads), dtype=np.float64)
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        if self.library == 'xgboost':
+            return np.asarray(self.booster.inplace_predict(rows), dtype=np.float64)
+        return np.asarray(self.booster.predict(rows, num_threads=self.threads), dtype=np.float64)
+
+
+class CompiledForest:
+    """Trees flattened into node arrays; every row walks every tree together, one array step per tree level
+
+    Leaves point to themselves, so after `depth` steps each (row, tree) pair sits on its leaf.
+    There is no per-row or per-tree Python loop, only one per level.
+    """
+
+    def __init__(self, library: str, nodes: Dict[str, List[Any]], roots: List[int], depth: int):
+        self.library = library
+        # XGBoost compares float32 features with float32 split values; LightGBM uses doubles
+        dtype = np.float32 if library == 'xgboost' else np.float64
+        self.dtype = dtype
+        self.feature = np.asarray(nodes['feature'], dtype=np.intp)
+        self.threshold = np.asarray(nodes['threshold'], dtype=dtype)
+        self.left = np.asarray(nodes['left'], dtype=np.intp)
+        self.right = np.asarray(nodes['right'], dtype=np.intp)
+        self.default_left = np.asarray(nodes['default_left'], dtype=bool)
+        self.nan_as_zero = np.asarray(nodes['nan_as_zero'], dtype=bool)
+        self.zero_missing = np.asarray(nodes['zero_missing'], dtype=bool)
+        self.any_zero_missing = bool(self.zero_missing.any())
+        self.value = np.asarray(nodes['value'], dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+        self.bias = 0.0  # the booster's base score, set by calibrate()
+
+    @classmethod
+    def from_xgboost(cls, booster: Any) -> "CompiledForest":
+        model = json.loads(booster.save_raw(raw_format='json'))
+        nodes = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'nan_as_zero', 'zero_missing', 'value')}
+        roots, depth = [], 0
+        for tree in model['learner']['gradient_booster']['model']['trees']:
+            offset = len(nodes['feature'])
+            roots.append(offset)
+            left, right = tree['left_children'], tree['right_children']
+            for node, (left_child, right_child) in enumerate(zip(left, right)):
+                leaf = left_child == -1
+                nodes['feature'].append(0 if leaf else tree['split_indices'][node])
+                nodes['threshold'].append(0.0 if leaf else tree['split_conditions'][node])
+                nodes['left'].append(offset + (node if leaf else left_child))
+                nodes['right'].append(offset + (node if leaf else right_child))
+                nodes['default_left'].append(bool(tree['default_left'][node]))
+                nodes['nan_as_zero'].append(False)
+                nodes['zero_missing'].append(False)
+                # Leaves keep their weight in split_conditions
+                nodes['value'].append(tree['split_conditions'][node] if leaf else 0.0)
+            depth = max(depth, cls.tree_depth(left, right))
+        return cls('xgboost', nodes, roots, depth)
+
+    @classmethod
+    def from_lightgbm(cls, booster: Any) -> "CompiledForest":
+        nodes = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'nan_as_zero', 'zero_missing', 'value')}
+        roots, depth = [], 0
+
+        def add(structure: Dict[str, Any], level: int) -> int:
+            nonlocal depth
+            index = len(nodes['feature'])
+            for values in nodes.values():
+                values.append(None)
+            if 'leaf_value' in structure:
+                depth = max(depth, level)
+                for name, value in (('feature', 0), ('threshold', 0.0), ('left', index), ('right', index),
+                                    ('default_left', True), ('nan_as_zero', False), ('zero_missing', False),
+                                    ('value', structure['leaf_value'])):
+                    nodes[name][index] = value
+                return index
+            if structure.get('decision_type') != '<=':
+                raise ValueError(f"Cannot compile LightGBM split type {structure.get('decision_type')}")
+            missing_type = structure.get('missing_type', 'None')
+            nodes['feature'][index] = structure['split_feature']
+            nodes['threshold'][index] = float(structure['threshold'])
+            nodes['default_left'][index] = bool(structure['default_left'])
+            # As LightGBM's NumericalDecision: NaN counts as 0 unless missing values have their own direction
+            nodes['nan_as_zero'][index] = missing_type != 'NaN'
+            nodes['zero_missing'][index] = missing_type == 'Zero'
+            nodes['value'][index] = 0.0
+            nodes['left'][index] = add(structure['left_child'], level + 1)
+            nodes['right'][index] = add(structure['right_child'], level + 1)
+            return index
+
+        for tree in booster.dump_model()['tree_info']:
+            roots.append(add(tree['tree_structure'], 0))
+        return cls('lightgbm', nodes, roots, depth)
+
+    @staticmethod
+    def tree_depth(left: List[int], right: List[int]) -> int:
+        depth, level = 0, [0]
+        while True:
+            level = [child for node in level for child in (left[node], right[node]) if child != -1]
+            if not level:
+                return depth
+            depth += 1
+
+    def leaf_sums(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=self.dtype)
+        row_index = np.arange(len(rows))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(rows), len(self.roots)))
+        for _ in range(self.depth):
+            values = rows[row_index, self.feature[nodes]]
+            missing = np.isnan(values)
+            if self.library == 'lightgbm':
+                nan_as_zero = self.nan_as_zero[nodes]
+                values = np.where(missing & nan_as_zero, 0.0, values)
+                missing = missing & ~nan_as_zero
+                if self.any_zero_missing:
+                    missing |= self.zero_missing[nodes] & (np.abs(values) <= LIGHTGBM_ZERO_THRESHOLD)
+                go_left = values <= self.threshold[nodes]
+            else:
+                go_left = values < self.threshold[nodes]
+            go_left = np.where(missing, self.default_left[nodes], go_left)
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].sum(axis=1)
+
+    def calibrate(self, native: NativeBooster, rows: np.ndarray):
+        """Take the base score from the native booster and check that both agree on `rows`"""
+        margins = native.predict_margin(rows)
+        self.bias = float(np.mean(margins - self.leaf_sums(rows)))
+        difference = float(np.max(np.abs(sigmoid(margins) - self.predict(rows)))) if len(rows) else 0.0
+        if difference > COMPILED_TOLERANCE:
+            raise ValueError(f"Compiled {self.library} trees differ from the booster by {difference:.2e}")
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        return sigmoid(self.leaf_sums(rows) + self.bias)
+
+
+class GBMRiskModel:
+    """High-risk probability from a trained booster, served by the native library or the compiled forest"""
+
+    def __init__(
+        self, native: NativeBooster, metadata: Dict[str, Any], predictor: str = GBM_PREDICTOR,
+        compiled_max_rows: int = GBM_COMPILED_MAX_ROWS
+    ):
+        if predictor not in GBM_PREDICTORS:
+            raise ValueError(f"Unknown GBM predictor '{predictor}'; use one of {list(GBM_PREDICTORS)}")
+        self.native = native
+        self.metadata = metadata
+        self.predictor = predictor
+        self.compiled_max_rows = compiled_max_rows
+        self.sample_rows = np.asarray(metadata.get('sample_rows') or np.zeros((1, len(RISK_FEATURE_NAMES))), dtype=np.float64)
+        self.compiled: Optional[CompiledForest] = None
+        if predictor == 'compiled':
+            booster = native.booster
+            self.compiled = CompiledForest.from_xgboost(booster) if native.library == 'xgboost' else CompiledForest.from_lightgbm(booster)
+            self.compiled.calibrate(native, self.sample_rows)
+
+    @property
+    def library(self) -> str:
+        return self.native.library
+
+    @property
+    def version(self) -> str:
+        return self.metadata['version']
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        """High-risk probabilities for a batch of feature rows"""
+        rows = np.atleast_2d(rows)
+        if self.compiled is not None and len(rows) <= self.compiled_max_rows:
+            return self.compiled.predict(rows)
+        return self.native.predict(rows)
+
+    def warmup(self, calls: int = GBM_WARMUP_CALLS):
+        """Run single rows and the sample batch through the predictor, so first requests do not pay for lazy setup"""
+        for index in range(calls):
+            self.predict(self.sample_rows[index % len(self.sample_rows)])
+        self.predict(self.sample_rows)
+
+    @classmethod
+    def load(cls, path: str = GBM_RISK_MODEL_PATH, predictor: str = GBM_PREDICTOR, threads: int = GBM_THREADS) -> "GBMRiskModel":
+        with open(path) as f:
+            metadata = json.load(f)
+        if metadata.get('format') != ARTIFACT_FORMAT or metadata.get('library') not in GBM_LIBRARIES:
+            raise ValueError(f"{path} is not a format {ARTIFACT_FORMAT} gradient-boosted risk model artifact")
+        if metadata.get('feature_names') != RISK_FEATURE_NAMES:
+            raise ValueError(f"{path} was trained on features {metadata.get('feature_names')}, the service builds {RISK_FEATURE_NAMES}")
+        booster_path = os.path.join(os.path.dirname(os.path.abspath(path)), metadata['booster_file'])
+        return cls(NativeBooster(metadata['library'], booster_path, threads), metadata, predictor)
+
+
+def save_gbm_artifact(path: str, library: str, booster: Any, metadata: Dict[str, Any]):
+    """Write the native booster file and then the metadata that points to it, each atomically"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    booster_file = f"{stem}-{metadata['version']}.{BOOSTER_SUFFIXES[library]}"
+    temp_path = os.path.join(directory, f"{booster_file}.tmp.{BOOSTER_SUFFIXES[library]}")
+    booster.save_model(temp_path)
+    os.replace(temp_path, os.path.join(directory, booster_file))
+    artifact = {
+        **metadata,
+        'format': ARTIFACT_FORMAT,
+        'library': library,
+        'booster_file': booster_file,
+        'feature_names': RISK_FEATURE_NAMES
+    }
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(artifact, f, indent=2)
+    os.replace(f"{path}.tmp", path)
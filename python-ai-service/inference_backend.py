@@ -0,0 +1,76 @@
+# Inference backends for the transformer pipelines
+# fp32 PyTorch, dynamically quantized int8 PyTorch, or ONNX Runtime graphs exported offline by export_models.py
+
+import os
+import logging
+from typing import Any, Optional
+
+from startup_report import timed_import
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ("torch", "quantized", "onnx")
+INFERENCE_BACKEND = os.getenv("AI_INFERENCE_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("AI_ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models"))
+ORT_THREADS = int(os.getenv("AI_ORT_THREADS", "0"))  # 0 = let ONNX Runtime decide
+
+# Hub models served by the full service's pipelines and exported by export_models.py; part of the result cache key
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+NER_MODEL = "dbmdz/bert-large-cased-finetuned-conll03-english"
+
+# Model head used by each pipeline task
+TASK_MODEL_CLASSES = {
+    "sentiment-analysis": ("AutoModelForSequenceClassification", "ORTModelForSequenceClassification"),
+    "ner": ("AutoModelForTokenClassification", "ORTModelForTokenClassification"),
+}
+
+ONNX_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+
+
+def onnx_model_path(model_name: str, model_dir: str = ONNX_MODEL_DIR) -> str:
+    """Directory holding the exported ONNX graph and tokenizer for a hub model"""
+    return os.path.join(model_dir, model_name.replace("/", "--"))
+
+
+def quantize_dynamic_int8(model: Any) -> Any:
+    """Quantize the Linear layers of a torch model to int8 weights for CPU inference"""
+    torch = timed_import("torch")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def build_pipeline(task: str, model_name: str, device: int = -1, backend: Optional[str] = None, **kwargs: Any) -> Any:
+    """Create a transformers pipeline for `task` on the selected backend"""
+    backend = (backend or INFERENCE_BACKEND).lower()
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(INFERENCE_BACKENDS)}")
+
+    transformers = timed_import("transformers")
+    if backend == "torch":
+        return transformers.pipeline(task, model=model_name, device=device, **kwargs)
+
+    torch_class, ort_class = TASK_MODEL_CLASSES[task]
+    if backend == "quantized":
+        if device != -1:
+            logger.warning("Dynamic int8 quantization is CPU-only; running the quantized model on CPU")
+        tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+        model = getattr(transformers, torch_class).from_pretrained(model_name)
+        model = quantize_dynamic_int8(model.eval())
+        return transformers.pipeline(task, model=model, tokenizer=tokenizer, device=-1, **kwargs)
+
+    model_path = onnx_model_path(model_name)
+    if not os.path.isdir(model_path):
+        raise FileNotFoundError(
+            f"No ONNX export for {model_name} in {model_path}; run `python export_models.py` first"
+        )
+    file_name = ONNX_QUANTIZED_FILE if os.path.exists(os.path.join(model_path, ONNX_QUANTIZED_FILE)) else ONNX_FILE
+    onnxruntime = timed_import("onnxruntime")
+    session_options = onnxruntime.SessionOptions()
+    if ORT_THREADS > 0:
+        session_options.intra_op_num_threads = ORT_THREADS
+    model = getattr(timed_import("optimum.onnxruntime"), ort_class).from_pretrained(
+        model_path, file_name=file_name, session_options=session_options
+    )
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_path)
+    logger.info(f"Using ONNX Runtime graph {os.path.join(model_path, file_name)}")
+    return transformers.pipeline(task, model=model, tokenizer=tokenizer, **kwargs)
@@ -0,0 +1,114 @@
+# Inference executor with bounded concurrency
+# Runs blocking model code off the asyncio event loop and sheds load when too many requests are in flight
+
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODE = os.getenv("AI_EXECUTOR", "thread")
+EXECUTOR_WORKERS = int(os.getenv("AI_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_INFLIGHT = int(os.getenv("AI_MAX_INFLIGHT", "32"))
+OVERLOAD_STATUS = int(os.getenv("AI_OVERLOAD_STATUS", "503"))
+RETRY_AFTER_SECONDS = int(os.getenv("AI_RETRY_AFTER_SECONDS", "1"))
+
+
+class InferenceExecutor:
+    """Thread or process pool for model inference plus an in-flight request limit
+
+    Requests enter through `admit()`; once `max_inflight` requests are being served,
+    new ones are rejected immediately with `overload_status` and a Retry-After header
+    instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        mode: str = EXECUTOR_MODE,
+        max_workers: int = EXECUTOR_WORKERS,
+        max_inflight: int = MAX_INFLIGHT,
+        overload_status: int = OVERLOAD_STATUS,
+        retry_after: int = RETRY_AFTER_SECONDS,
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode '{mode}', expected 'thread' or 'process'")
+        if overload_status not in (429, 503):
+            raise ValueError(f"Overload status must be 429 or 503, got {overload_status}")
+
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.max_inflight = max(1, max_inflight)
+        self.overload_status = overload_status
+        self.retry_after = retry_after
+        self.initializer = initializer
+        self.inflight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.submitted = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        """The underlying pool, created on first use"""
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=self.initializer)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+            logger.info(f"Started {self.mode} inference executor with {self.max_workers} workers")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking function in the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        self.submitted += 1
+        try:
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.submitted -= 1
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls made through run() that are waiting for a free worker"""
+        return max(0, self.submitted - self.max_workers)
+
+    @asynccontextmanager
+    async def admit(self):
+        """Reserve an in-flight slot for one request or reject it with Retry-After"""
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=self.overload_status,
+                detail="AI service is at capacity, please retry later",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "queued": self.queue_depth,
+            "in_flight": self.inflight,
+            "max_in_flight": self.max_inflight,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
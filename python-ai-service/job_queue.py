@@ -0,0 +1,359 @@
+# Persistent job queue
+# Submit/poll/fetch jobs for long analyses; state lives in SQLite so queued and finished jobs survive restarts
+
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("AI_JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs", "jobs.db"))
+JOB_UPLOAD_DIR = os.getenv("AI_JOB_UPLOAD_DIR", os.path.join(os.path.dirname(JOB_DB_PATH), "uploads"))
+JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "2"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("AI_JOB_RESULT_TTL_SECONDS", "86400"))
+JOB_MAX_QUEUED = int(os.getenv("AI_JOB_MAX_QUEUED", "10000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.getenv("AI_JOB_POLL_SECONDS", "1"))
+JOB_STALE_SECONDS = float(os.getenv("AI_JOB_STALE_SECONDS", "60"))
+
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+# Windows process query constants for pid_exists
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+
+# Runs one job: gets the submitted payload (plus `file_path` for jobs with an uploaded file), returns the result
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """False only when the owning process was on this host and is gone"""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    return pid_exists(int(pid))
+
+
+def pid_exists(pid: int) -> bool:
+    """Whether a process with this id is running; signal 0 on POSIX, OpenProcess on Windows (where signal 0 is Ctrl+C)"""
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # Access denied means the process exists but belongs to another user
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """Priority job queue in SQLite, worked by asyncio tasks in the service process
+
+    Jobs are claimed with one atomic UPDATE, so several service processes (serve.py workers)
+    can share a database. Running jobs carry a heartbeat; a job whose process died goes back
+    to the queue, at most `max_attempts` times. Finished jobs and their results are deleted
+    `result_ttl` seconds after they finish.
+    """
+
+    def __init__(
+        self,
+        db_path: str = JOB_DB_PATH,
+        upload_dir: str = JOB_UPLOAD_DIR,
+        workers: int = JOB_WORKERS,
+        result_ttl: float = JOB_RESULT_TTL_SECONDS,
+        max_queued: int = JOB_MAX_QUEUED,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        stale_seconds: float = JOB_STALE_SECONDS,
+    ):
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.max_queued = max_queued
+        self.max_attempts = max(1, max_attempts)
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.handlers: Dict[str, JobHandler] = {}
+        self.owner = ""
+        self.stopping = False
+        self._db: Optional[sqlite3.Connection] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._next_prune = 0.0
+
+    def register(self, kind: str, handler: JobHandler):
+        self.handlers[kind] = handler
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            raise HTTPException(status_code=503, detail="Job queue is not running")
+        return self._db
+
+    def open(self):
+        """Open the database; called in the serving process, since connections do not survive fork"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # Autocommit: every statement below is atomic on its own
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, file_path TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "owner TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL, expires_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at)")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def start(self):
+        self.open()
+        self.stopping = False
+        self._wakeup = asyncio.Event()
+        self.requeue_abandoned()
+        self._tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self.maintain()))
+        logger.info(f"Job queue at {self.db_path} with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers; jobs they were running go back to the queue"""
+        self.stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0, file_path: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a job; higher priorities run first, equal priorities in submission order"""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for job kind '{kind}'")
+        queued = self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= self.max_queued:
+            self.remove_file(file_path)
+            raise HTTPException(status_code=503, detail="Job queue is full, please retry later", headers={"Retry-After": "30"})
+        job_id = uuid.uuid4().hex
+        self.db.execute(
+            "INSERT INTO jobs (id, kind, status, priority, payload, file_path, created_at) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, priority, json.dumps(payload), file_path, time.time())
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self.get(job_id)
+
+    async def store_upload(self, source: BinaryIO) -> str:
+        """Copy an uploaded (spooled) file to the job upload directory and return its path"""
+        path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex}.upload")
+
+        def copy():
+            source.seek(0)
+            with open(path, "wb") as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+
+        await asyncio.get_running_loop().run_in_executor(None, copy)
+        return path
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status without the result, or None for unknown and expired jobs"""
+        row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row["expires_at"] is not None and row["expires_at"] <= time.time()):
+            return None
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "attempts": row["attempts"],
+            "created_at": isoformat(row["created_at"]),
+            "started_at": isoformat(row["started_at"]),
+            "finished_at": isoformat(row["finished_at"]),
+            "expires_at": isoformat(row["expires_at"]),
+            "error": row["error"]
+        }
+        if row["status"] == "queued":
+            job["queue_position"] = self.db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND created_at < ?))",
+                (row["priority"], row["priority"], row["created_at"])
+            ).fetchone()[0]
+        return job
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            "SELECT result FROM jobs WHERE id = ? AND status = 'succeeded' AND expires_at > ?", (job_id, time.time())
+        ).fetchone()
+        return json.loads(row["result"]) if row is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; finished jobs are returned unchanged"""
+        now = time.time()
+        cancelled = self.db.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, expires_at = ? "
+            "WHERE id = ? AND status IN ('queued', 'running') RETURNING file_path",
+            (now, now + self.result_ttl, job_id)
+        ).fetchone()
+        if cancelled is not None:
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+            else:
+                # Queued, or running in another process, which stops it on its next heartbeat
+                self.remove_file(cancelled["file_path"])
+        return self.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ("queued", "running", *FINISHED_STATES)}
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        return self.db.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+            "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1) "
+            "RETURNING id, kind, payload, file_path",
+            (self.owner, now, now)
+        ).fetchone()
+
+    async def work(self):
+        while True:
+            self._wakeup.clear()
+            job = self.claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run(job)
+
+    async def run(self, job: sqlite3.Row):
+        job_id = job["id"]
+        payload = json.loads(job["payload"])
+        if job["file_path"]:
+            payload["file_path"] = job["file_path"]
+        task = asyncio.ensure_future(self.handlers[job["kind"]](payload))
+        self._running[job_id] = task
+        finished = True
+        try:
+            result = await task
+            self.finish(job_id, "succeeded", result=json.dumps(result, default=str))
+        except asyncio.CancelledError:
+            if self.stopping:
+                finished = False
+                self.requeue(job_id)
+                raise
+            # Cancelled through cancel(), which already recorded it
+        except HTTPException as e:
+            if e.status_code in (429, 503):
+                # The service is at capacity; leave the job for a later attempt
+                finished = False
+                self.requeue(job_id)
+                await asyncio.sleep(self.poll_seconds)
+            else:
+                self.finish(job_id, "failed", error=str(e.detail))
+        except Exception as e:
+            logger.warning(f"Job {job_id} failed: {e}")
+            self.finish(job_id, "failed", error=str(e))
+        finally:
+            self._running.pop(job_id, None)
+            if finished:
+                self.remove_file(job["file_path"])
+
+    def finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        now = time.time()
+        # A job cancelled meanwhile keeps its cancelled state
+        self.db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? WHERE id = ? AND status = 'running'",
+            (status, result, error, now, now + self.result_ttl, job_id)
+        )
+
+    def requeue(self, job_id: str):
+        """Put an interrupted job back without counting the attempt"""
+        self.db.execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL, started_at = NULL, attempts = attempts - 1 WHERE id = ? AND status = 'running'",
+            (job_id,)
+        )
+
+    def requeue_abandoned(self):
+        """Return running jobs whose process died to the queue, or fail them after too many attempts"""
+        stale_before = time.time() - self.stale_seconds
+        rows = self.db.execute("SELECT id, owner, attempts, heartbeat_at FROM jobs WHERE status = 'running'").fetchall()
+        for row in rows:
+            if row["id"] in self._running or (row["heartbeat_at"] >= stale_before and owner_alive(row["owner"])):
+                continue
+            if row["attempts"] >= self.max_attempts:
+                logger.warning(f"Job {row['id']} was interrupted {row['attempts']} times, giving up")
+                self.finish(row["id"], "failed", error=f"Interrupted {row['attempts']} times")
+            else:
+                logger.info(f"Requeueing interrupted job {row['id']}")
+                self.db.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ? AND status = 'running'", (row["id"],))
+                self._wakeup.set()
+
+    async def maintain(self):
+        """Heartbeat local jobs, stop jobs cancelled elsewhere, recover abandoned jobs and prune expired ones"""
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                running = list(self._running)
+                if running:
+                    marks = ",".join("?" * len(running))
+                    self.db.execute(f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({marks}) AND status = 'running'", (time.time(), *running))
+                    for row in self.db.execute(f"SELECT id FROM jobs WHERE id IN ({marks}) AND status = 'cancelled'", running).fetchall():
+                        task = self._running.get(row["id"])
+                        if task is not None:
+                            task.cancel()
+                self.requeue_abandoned()
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + 60
+                    self.prune()
+            except sqlite3.Error as e:
+                logger.warning(f"Job queue maintenance failed: {e}")
+
+    def prune(self):
+        expired = self.db.execute(
+            "DELETE FROM jobs WHERE expires_at <= ? RETURNING file_path", (time.time(),)
+        ).fetchall()
+        for row in expired:
+            self.remove_file(row["file_path"])
+        if expired:
+            logger.info(f"Deleted {len(expired)} expired jobs")
+
+    @staticmethod
+    def remove_file(path: Optional[str]):
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
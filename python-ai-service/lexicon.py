@@ -0,0 +1,230 @@
+# Lexicon term matching
+# Word-level Aho-Corasick automaton over the per-language term lists in lexicons/*.json, counting every occurrence
+
+import os
+import re
+import json
+import hashlib
+import logging
+from collections import Counter
+from itertools import compress, count
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from text_scanner import SENTENCE_TERMINATORS
+
+logger = logging.getLogger(__name__)
+
+LEXICON_DIR = os.getenv(
+    "AI_LEXICON_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicons")
+)
+
+# Terms from this lexicon count for every document, since DPRs in other languages mix in English
+BASE_LANGUAGE = "en"
+
+# Word characters plus the vowel signs and viramas of Indic scripts, which `\w` treats as breaks
+# (U+0964/U+0965, the danda marks, are punctuation); ZWNJ/ZWJ also occur inside Indic words
+WORD = re.compile(r'[\w\u0900-\u0963\u0966-\u0DFF\u200c\u200d]+')
+
+# A term word ending in this mark is a stem: `delay*` matches delay, delays, delayed
+STEM_MARK = '*'
+# Distinct text words whose automaton symbol is remembered
+SYMBOL_CACHE_SIZE = 65536
+
+
+def term_key(term: str) -> Tuple[str, ...]:
+    """Words of a term; stems keep their mark"""
+    words = []
+    for piece in term.lower().split():
+        piece_words = WORD.findall(piece)
+        if piece_words and piece.endswith(STEM_MARK):
+            piece_words[-1] += STEM_MARK
+        words.extend(piece_words)
+    return tuple(words)
+
+
+class Lexicon:
+    """Counts occurrences of single- and multi-word terms in one pass over the words of a text
+
+    Terms match whole words, or any word starting with a stem such as `delay*`; phrases
+    match consecutive words within a sentence, and overlapping terms are all counted. Each
+    text word maps to one symbol (itself or the stem it starts with), so lookups stay dict
+    transitions per word and matching time does not grow with the number of terms.
+    """
+
+    def __init__(self, lexicons: Dict[str, Dict[str, Sequence[str]]], version: str = ""):
+        self.version = version
+        self.languages = sorted(lexicons)
+        # term -> language -> categories it belongs to there
+        self.tags: Dict[str, Dict[str, Set[str]]] = {}
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[str, ...]] = [()]
+
+        for language, categories in lexicons.items():
+            for category, terms in categories.items():
+                for term in terms:
+                    words = term_key(term)
+                    if not words:
+                        continue
+                    key = ' '.join(words)
+                    if key not in self.tags:
+                        self.add_term(words, key)
+                    self.tags.setdefault(key, {}).setdefault(language, set()).add(category)
+        self.build_failure_links()
+        # Symbols that appear in any term; text without them cannot match
+        self.words = frozenset(word for transitions in self.goto for word in transitions)
+        self.stems = frozenset(word[:-1] for word in self.words if word.endswith(STEM_MARK))
+        self.stem_lengths = sorted({len(stem) for stem in self.stems})
+        self.check_stems()
+        self._symbols: Dict[str, str] = {}
+        # Words of multi-word terms, whose matches depend on the words around them
+        self.phrase_words = frozenset(word for key in self.tags if ' ' in key for word in key.split(' '))
+
+    def add_term(self, words: Tuple[str, ...], key: str):
+        state = 0
+        for word in words:
+            if word not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[state][word] = len(self.goto) - 1
+            state = self.goto[state][word]
+        self.output[state] = (key,)
+
+    def build_failure_links(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0) if state else 0
+                # A state also reports the terms that end at its failure state
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue.append(child)
+
+    def check_stems(self):
+        """Every text word must map to one symbol, so no stem may start another stem or a whole-word term"""
+        for word in self.words:
+            bare = word[:-1] if word.endswith(STEM_MARK) else word
+            for length in self.stem_lengths:
+                stem = bare[:length]
+                if length <= len(bare) and stem in self.stems and stem + STEM_MARK != word:
+                    raise ValueError(f"Lexicon term word '{word}' also matches stem '{stem}{STEM_MARK}'; use one of them")
+
+    def stem_of(self, word: str) -> Optional[str]:
+        """Stem that `word` starts with; check_stems makes it unique"""
+        for length in self.stem_lengths:
+            if length > len(word):
+                break
+            if word[:length] in self.stems:
+                return word[:length]
+        return None
+
+    def symbol(self, word: str) -> str:
+        """Automaton symbol of a text word: the stem it starts with (marked), or the word itself"""
+        if not self.stems:
+            return word
+        symbol = self._symbols.get(word)
+        if symbol is None:
+            stem = self.stem_of(word)
+            symbol = word if stem is None else stem + STEM_MARK
+            if len(self._symbols) >= SYMBOL_CACHE_SIZE:
+                self._symbols.clear()
+            self._symbols[word] = symbol
+        return symbol
+
+    def symbols(self, text: str) -> List[str]:
+        return [self.symbol(word) for word in WORD.findall(text)]
+
+    def step(self, state: int, word: str) -> int:
+        while state and word not in self.goto[state]:
+            state = self.fail[state]
+        return self.goto[state].get(word, 0)
+
+    def count_sentences(self, sentences: Iterable[Sequence[str]], counts: Counter) -> Counter:
+        """Add the term occurrences in each word sequence to `counts`; phrases do not cross sequences"""
+        for words in sentences:
+            state = 0
+            for word in words:
+                state = self.step(state, word)
+                for key in self.output[state]:
+                    counts[key] += 1
+        return counts
+
+    def count(self, text: str) -> Counter:
+        """Occurrences of each term in `text`"""
+        return self.count_sentences(
+            (self.symbols(sentence) for sentence in SENTENCE_TERMINATORS.split(text.lower())), Counter()
+        )
+
+    def count_tokens(self, tokens: Sequence[str], vocabulary: Counter, lowered: Sequence[str]) -> Counter:
+        """Same result as count(' '.join(tokens)), tokenizing each distinct token once
+
+        `tokens` is the whitespace split of the text, `vocabulary` counts its distinct tokens and
+        `lowered` holds their lowercase forms in vocabulary order. Only tokens with words of
+        multi-word terms are matched in text order; the rest match the same wherever they appear.
+        """
+        counts = Counter()
+        ordered: Dict[str, List[List[str]]] = {}
+        breaks = set()  # tokens that end any phrase in progress: other words or a terminator
+        for (token, frequency), lower in zip(vocabulary.items(), lowered):
+            sentences = [self.symbols(part) for part in SENTENCE_TERMINATORS.split(lower)]
+            words = [word for words in sentences for word in words]
+            if not self.phrase_words.isdisjoint(words):
+                ordered[token] = sentences
+                continue
+            if len(sentences) > 1 or words:
+                breaks.add(token)
+            if not self.words.isdisjoint(words):
+                for key, occurrences in self.count_sentences(sentences, Counter()).items():
+                    counts[key] += occurrences * frequency
+
+        state = 0
+        previous = -1
+        for index in compress(count(), map(ordered.__contains__, tokens)):
+            if index > previous + 1 and not breaks.isdisjoint(tokens[previous + 1:index]):
+                state = 0
+            for position, words in enumerate(ordered[tokens[index]]):
+                if position:
+                    state = 0
+                for word in words:
+                    state = self.step(state, word)
+                    for key in self.output[state]:
+                        counts[key] += 1
+            previous = index
+        return counts
+
+    def category_counts(self, term_counts: Counter, language: str) -> Counter:
+        """Occurrences per category for a document in `language`, from the base and that language's lexicons"""
+        languages = {BASE_LANGUAGE, language}
+        totals = Counter()
+        for key, occurrences in term_counts.items():
+            categories = set()
+            for term_language, term_categories in self.tags[key].items():
+                if term_language in languages:
+                    categories |= term_categories
+            for category in categories:
+                totals[category] += occurrences
+        return totals
+
+    def stats(self) -> Dict[str, object]:
+        return {"languages": self.languages, "terms": len(self.tags), "version": self.version}
+
+
+def load_lexicons(directory: str = LEXICON_DIR) -> Lexicon:
+    """Build one automaton from every `<language>.json` in `directory`"""
+    lexicons = {}
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            raw = f.read()
+        digest.update(raw)
+        data = json.loads(raw)
+        lexicons[data.get('language', name[:-len('.json')])] = data['categories']
+    lexicon = Lexicon(lexicons, version=digest.hexdigest()[:12])
+    logger.info(f"Loaded {len(lexicon.tags)} lexicon terms for {', '.join(lexicon.languages)} from {directory}")
+    return lexicon
@@ -0,0 +1,220 @@
+# Prometheus metrics
+# Request counts and latency histograms per endpoint and per analysis stage, in the text exposition format
+
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from model_registry import current_rss_bytes
+
+LATENCY_BUCKETS = tuple(
+    float(bound) for bound in
+    os.getenv("AI_METRICS_BUCKETS", "0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",")
+)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# (name, type, help, value) for values read when /metrics is scraped
+Sample = Tuple[str, str, str, float]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        bounds = [format_number(bound) for bound in self.buckets] + ["+Inf"]
+        total = 0
+        result = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class StageTimer:
+    """Durations of the analysis stages of one document
+
+    Plain data, so stages timed in a process-pool worker can be returned with the result
+    and recorded by the service process.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - started
+
+
+def timed_call(stage: str, fn, *args: Any) -> Tuple[Any, Dict[str, float]]:
+    """Run one stage function and return its result with its duration (for executor workers)"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, {stage: time.perf_counter() - started}
+
+
+class MetricsRegistry:
+    """Request and stage metrics for one service process"""
+
+    def __init__(self, namespace: str = "ai_dpr", buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.stage_latency: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, method: str, endpoint: str, status: int, seconds: float):
+        with self._lock:
+            key = (method, endpoint, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.request_latency.get((method, endpoint))
+            if histogram is None:
+                histogram = self.request_latency[(method, endpoint)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.stage_latency.get(stage)
+            if histogram is None:
+                histogram = self.stage_latency[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_stages(self, stage_seconds: Optional[Dict[str, float]]):
+        for stage, seconds in (stage_seconds or {}).items():
+            self.observe_stage(stage, seconds)
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        """Time a stage that runs in the service process"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def render(self, samples: List[Sample] = ()) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        prefix = self.namespace
+        lines = []
+        with self._lock:
+            lines += [
+                f"# HELP {prefix}_requests_total HTTP requests by method, route and status",
+                f"# TYPE {prefix}_requests_total counter"
+            ]
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f"{prefix}_requests_total{labels(method=method, endpoint=endpoint, status=status)} {count}")
+
+            lines += histogram_lines(
+                f"{prefix}_request_duration_seconds", "HTTP request latency by method and route, until the last response byte",
+                {labels(method=method, endpoint=endpoint): histogram for (method, endpoint), histogram in self.request_latency.items()}
+            )
+            lines += histogram_lines(
+                f"{prefix}_stage_duration_seconds", "Analysis stage latency per document",
+                {labels(stage=stage): histogram for stage, histogram in self.stage_latency.items()}
+            )
+
+        for name, kind, help_text, value in samples:
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {kind}", f"{prefix}_{name} {format_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+def histogram_lines(name: str, help_text: str, histograms: Dict[str, Histogram]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for label_text, histogram in sorted(histograms.items()):
+        inner = label_text[1:-1] + ","
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{inner}le="{bound}"}} {count}')
+        lines.append(f"{name}_sum{label_text} {format_number(histogram.sum)}")
+        lines.append(f"{name}_count{label_text} {histogram.count}")
+    return lines
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values: Any) -> str:
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in values.items()) + "}"
+
+
+def format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def service_samples(executor: Any, cache: Any) -> List[Sample]:
+    """Executor, result cache and memory values for /metrics"""
+    inference = executor.stats()
+    cache_stats = cache.stats()
+    samples = [
+        ("executor_queue_depth", "gauge", "Inference calls waiting for a free worker", inference["queued"]),
+        ("executor_workers", "gauge", "Inference executor workers", inference["workers"]),
+        ("inflight_requests", "gauge", "Requests holding an inference slot", inference["in_flight"]),
+        ("inflight_requests_limit", "gauge", "In-flight requests before new ones are rejected", inference["max_in_flight"]),
+        ("rejected_requests_total", "counter", "Requests rejected because the service was at capacity", inference["rejected"]),
+        ("cache_hits_total", "counter", "Result cache hits", cache_stats["hits"]),
+        ("cache_misses_total", "counter", "Result cache misses", cache_stats["misses"]),
+        ("cache_hit_ratio", "gauge", "Result cache hits per lookup since start", cache_stats["hit_rate"]),
+        ("cache_entries", "gauge", "Results held in memory", cache_stats["entries"]),
+    ]
+    rss = current_rss_bytes()
+    if rss is not None:
+        samples.append(("process_resident_memory_bytes", "gauge", "Resident memory of the service process", rss))
+    return samples
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording each HTTP request by route template, timed until its last response byte"""
+
+    def __init__(self, app: Any, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+        self.route_paths: Dict[Any, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.registry.observe_request(scope["method"], self.route_path(scope), status, time.perf_counter() - started)
+
+    def route_path(self, scope) -> str:
+        # The router stores the matched endpoint in the scope; label by its template, not the raw path
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self.route_paths.get(endpoint)
+        if path is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            path = next((route.path for route in routes if getattr(route, "endpoint", None) is endpoint), "unmatched")
+            self.route_paths[endpoint] = path
+        return path
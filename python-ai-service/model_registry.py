@@ -0,0 +1,208 @@
+# Lazy model registry with a memory budget
+# Models load on first use, are tracked by resident size and last use, and the least-recently-used ones are unloaded over budget
+
+import os
+import gc
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("AI_MODEL_MEMORY_BUDGET_MB", "0"))  # 0 = no limit
+PRELOAD_MODELS = [name.strip() for name in os.getenv("AI_PRELOAD_MODELS", "").split(",") if name.strip()]
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def estimate_model_bytes(obj: Any) -> Optional[int]:
+    """Bytes held by the tensors of a torch model, pipeline, or dict of them"""
+    if isinstance(obj, dict):
+        sizes = [estimate_model_bytes(value) for value in obj.values()]
+        sizes = [size for size in sizes if size is not None]
+        return sum(sizes) if sizes else None
+
+    # Pipelines wrap the actual module in .model
+    module = getattr(obj, "model", obj)
+    if not hasattr(module, "parameters"):
+        return None
+    try:
+        total = sum(p.numel() * p.element_size() for p in module.parameters())
+        if hasattr(module, "buffers"):
+            total += sum(b.numel() * b.element_size() for b in module.buffers())
+        return total
+    except Exception:
+        return None
+
+
+class ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], Any], pinned: bool, description: str):
+        self.name = name
+        self.loader = loader
+        self.pinned = pinned
+        self.description = description
+        self.instance: Any = None
+        self.memory_bytes: Optional[int] = None
+        self.rss_delta_bytes: Optional[int] = None
+        self.last_used: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.load_count = 0
+        self.error: Optional[str] = None
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.instance is not None
+
+
+class ModelRegistry:
+    """Loads registered models on first use and keeps them within a memory budget"""
+
+    def __init__(self, memory_budget_mb: float = MODEL_MEMORY_BUDGET_MB):
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb > 0 else None
+        self.evictions = 0
+        self._entries: Dict[str, ModelEntry] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, loader: Callable[[], Any], pinned: bool = False, description: str = ""):
+        """Register a loader; nothing is loaded until the model is first requested"""
+        with self._lock:
+            self._entries[name] = ModelEntry(name, loader, pinned, description)
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._entries
+
+    def is_loaded(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.loaded
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it (and evicting others if over budget) when needed"""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Model '{name}' is not registered")
+
+        instance = entry.instance
+        if instance is None:
+            with entry.lock:
+                instance = entry.instance
+                if instance is None:
+                    instance = self._load(entry)
+
+        entry.last_used = time.time()
+        return instance
+
+    def preload(self, names: List[str]):
+        for name in names:
+            if name not in self._entries:
+                logger.warning(f"Cannot preload unknown model '{name}'")
+                continue
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.warning(f"Could not preload model '{name}': {e}")
+
+    def unload(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        if entry is None or not entry.loaded:
+            return False
+        with entry.lock:
+            entry.instance = None
+        logger.info(f"Unloaded model '{name}' ({self._format_mb(entry.memory_bytes)} MB)")
+        self._release_memory()
+        return True
+
+    def loaded_bytes(self) -> int:
+        return sum(entry.memory_bytes or 0 for entry in self._entries.values() if entry.loaded)
+
+    def status(self) -> Dict[str, Any]:
+        models = {}
+        for name, entry in self._entries.items():
+            models[name] = {
+                "loaded": entry.loaded,
+                "description": entry.description,
+                "memory_mb": self._format_mb(entry.memory_bytes) if entry.loaded else 0.0,
+                "rss_delta_mb": self._format_mb(entry.rss_delta_bytes) if entry.loaded else 0.0,
+                "last_used": datetime.fromtimestamp(entry.last_used).isoformat() if entry.last_used else None,
+                "load_seconds": round(entry.load_seconds, 3) if entry.load_seconds is not None else None,
+                "load_count": entry.load_count,
+                "pinned": entry.pinned,
+                "error": entry.error
+            }
+        return {
+            "models": models,
+            "loaded_memory_mb": self._format_mb(self.loaded_bytes()),
+            "memory_budget_mb": self._format_mb(self.memory_budget_bytes) if self.memory_budget_bytes else None,
+            "process_rss_mb": self._format_mb(current_rss_bytes()),
+            "evictions": self.evictions
+        }
+
+    def _load(self, entry: ModelEntry) -> Any:
+        logger.info(f"Loading model '{entry.name}'...")
+        rss_before = current_rss_bytes()
+        started = time.perf_counter()
+        try:
+            instance = entry.loader()
+        except Exception as e:
+            entry.error = str(e)
+            logger.error(f"Could not load model '{entry.name}': {e}")
+            raise
+
+        entry.load_seconds = time.perf_counter() - started
+        rss_after = current_rss_bytes()
+        entry.rss_delta_bytes = max(rss_after - rss_before, 0) if rss_before is not None and rss_after is not None else None
+        estimated = estimate_model_bytes(instance)
+        entry.memory_bytes = estimated if estimated is not None else entry.rss_delta_bytes
+        entry.instance = instance
+        entry.load_count += 1
+        entry.error = None
+        entry.last_used = time.time()
+        logger.info(
+            f"Loaded model '{entry.name}' in {entry.load_seconds:.2f}s ({self._format_mb(entry.memory_bytes)} MB)"
+        )
+
+        self._enforce_budget(keep=entry.name)
+        return instance
+
+    def _enforce_budget(self, keep: str):
+        if self.memory_budget_bytes is None:
+            return
+        with self._lock:
+            while self.loaded_bytes() > self.memory_budget_bytes:
+                candidates = [
+                    entry for entry in self._entries.values()
+                    if entry.loaded and not entry.pinned and entry.name != keep
+                ]
+                if not candidates:
+                    logger.warning(
+                        f"Loaded models use {self._format_mb(self.loaded_bytes())} MB, over the "
+                        f"{self._format_mb(self.memory_budget_bytes)} MB budget, and nothing else can be unloaded"
+                    )
+                    return
+                victim = min(candidates, key=lambda entry: entry.last_used or 0)
+                self.unload(victim.name)
+                self.evictions += 1
+
+    @staticmethod
+    def _release_memory():
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and hasattr(torch, "cuda") and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @staticmethod
+    def _format_mb(size: Optional[int]) -> Optional[float]:
+        return round(size / (1024 * 1024), 1) if size is not None else None
@@ -0,0 +1,174 @@
+# Near-duplicate detection for analyzed texts
+# Word shingles, MinHash signatures and LSH banding over recently analyzed texts, bounded as an LRU
+
+import os
+import re
+import json
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from result_cache import _json_default
+
+NEAR_DUP_THRESHOLD = float(os.getenv("AI_NEAR_DUP_THRESHOLD", "0.9"))
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("AI_NEAR_DUP_MAX_ENTRIES", "5000"))  # 0 disables reuse
+NEAR_DUP_MAX_BYTES = int(os.getenv("AI_NEAR_DUP_MAX_BYTES", str(32 * 1024 * 1024)))
+NEAR_DUP_TTL_SECONDS = float(os.getenv("AI_NEAR_DUP_TTL_SECONDS", "3600"))
+
+SHINGLE_WORDS = 3
+MIN_SHINGLES = 20  # shorter texts are cheap to analyze and too easily similar by accident
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16     # 16 bands of 8 rows: pairs above ~0.7 Jaccard share a bucket with high probability
+
+# Fixed multiply-shift hash family, so every process computes the same signatures
+_rng = np.random.default_rng(20240601)
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+
+WORD_PATTERN = re.compile(r"\w+")
+DIGITS_PATTERN = re.compile(r"\d+")
+
+
+def shingles(text: str) -> Set[int]:
+    """Hashes of overlapping word triples; digit runs are masked so changed dates and amounts still match"""
+    words = WORD_PATTERN.findall(DIGITS_PATTERN.sub("0", text.lower()))
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(max(0, len(words) - SHINGLE_WORDS + 1))
+    }
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature (NUM_PERMUTATIONS uint32 values), or None for texts too short to compare"""
+    hashes = shingles(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    # Multiply-shift hashing: uint64 arithmetic wraps, the high 32 bits are the hash
+    hashed = (values[:, None] * _MULTIPLIERS[None, :] + _OFFSETS[None, :]) >> np.uint64(32)
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def signature_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """Stored outputs of recent analyses, looked up by the MinHash signature of their text
+
+    Candidates come from LSH band buckets and are accepted when their estimated Jaccard
+    similarity reaches `threshold`. Entries expire after `ttl_seconds`, and the least recently
+    used are evicted beyond `max_entries` or `max_bytes` of stored outputs.
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        max_entries: int = NEAR_DUP_MAX_ENTRIES,
+        max_bytes: int = NEAR_DUP_MAX_BYTES,
+        ttl_seconds: float = NEAR_DUP_TTL_SECONDS,
+        bands: int = LSH_BANDS,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.bands = bands
+        self.rows = NUM_PERMUTATIONS // bands
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_used = 0
+        # key -> (signature, band keys, stage set, serialized outputs, expires_at, stored_at)
+        self._entries: "OrderedDict[bytes, Tuple[np.ndarray, List[bytes], frozenset, str, float, float]]" = OrderedDict()
+        self._buckets: Dict[bytes, Set[bytes]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [bytes([band]) + signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def find(self, signature: Optional[np.ndarray], stages: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Outputs stored for the most similar text above the threshold that ran all `stages`"""
+        if signature is None or not self.enabled:
+            return None
+        stages = frozenset(stages)
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for band_key in self.band_keys(signature):
+                candidates |= self._buckets.get(band_key, set())
+            best, best_similarity = None, self.threshold
+            for key in candidates:
+                stored, _, stored_stages, _, expires_at, _ = self._entries[key]
+                if expires_at <= now or not stages <= stored_stages:
+                    continue
+                similarity = signature_similarity(signature, stored)
+                if similarity >= best_similarity:
+                    best, best_similarity = key, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best)
+            _, _, _, outputs, _, stored_at = self._entries[best]
+        return {"outputs": json.loads(outputs), "similarity": round(best_similarity, 4), "stored_at": stored_at}
+
+    def add(self, signature: Optional[np.ndarray], stages: Iterable[str], outputs: Dict[str, Any]):
+        """Store the outputs of a fresh analysis; replaces an entry with the same signature"""
+        if signature is None or not self.enabled:
+            return
+        value = json.dumps(outputs, default=_json_default)
+        if len(value) > self.max_bytes:
+            return
+        key = signature.tobytes()
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            band_keys = self.band_keys(signature)
+            self._entries[key] = (signature, band_keys, frozenset(stages), value, now + self.ttl_seconds, now)
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(key)
+            self.bytes_used += len(value)
+            while len(self._entries) > self.max_entries or self.bytes_used > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self.bytes_used = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes_used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "threshold": self.threshold,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes
+        }
+
+    def _remove(self, key: bytes):
+        _, band_keys, _, value, _, _ = self._entries.pop(key)
+        self.bytes_used -= len(value)
+        for band_key in band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
@@ -0,0 +1,86 @@
+# Paragraph units for incremental re-analysis
+# Splits documents into stable, content-hashed paragraphs so an edited report only re-runs the models on what changed
+
+import os
+import re
+import hashlib
+from typing import List, NamedTuple
+
+PARAGRAPH_MAX_CHARS = int(os.getenv("AI_PARAGRAPH_MAX_CHARS", "4000"))
+PARAGRAPH_CACHE_ENTRIES = int(os.getenv("AI_PARAGRAPH_CACHE_ENTRIES", "20000"))  # 0 analyzes documents as a whole
+PARAGRAPH_CACHE_MAX_BYTES = int(os.getenv("AI_PARAGRAPH_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+PARAGRAPH_CACHE_TTL_SECONDS = float(os.getenv("AI_PARAGRAPH_CACHE_TTL_SECONDS", "86400"))
+PARAGRAPH_CACHE_DB_PATH = os.getenv("AI_PARAGRAPH_CACHE_DB_PATH", "")
+
+BLANK_LINES = re.compile(r"\n[ \t\r\f\v]*\n\s*")
+LINE_BREAK = re.compile(r"\n\s*")
+SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")  # includes the Devanagari danda
+NON_SPACE = re.compile(r"\S")
+
+
+class Paragraph(NamedTuple):
+    text: str
+    start: int  # character offsets in the document
+    end: int
+    digest: str  # content hash; equal paragraphs share cached outputs wherever they appear
+
+
+def split_spans(text: str, start: int, end: int, separator: re.Pattern) -> List[tuple]:
+    spans = []
+    for match in separator.finditer(text, start, end):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, end))
+    return spans
+
+
+def pack_spans(spans: List[tuple], max_chars: int) -> List[tuple]:
+    """Merge consecutive spans up to `max_chars`; boundaries only move near an edit"""
+    packed = []
+    for start, end in spans:
+        if packed and end - packed[-1][0] <= max_chars:
+            packed[-1] = (packed[-1][0], end)
+        else:
+            packed.append((start, end))
+    return packed
+
+
+def split_long(text: str, start: int, end: int, max_chars: int) -> List[tuple]:
+    """Cut an oversized paragraph at line breaks, then sentence ends, then hard at `max_chars`"""
+    if end - start <= max_chars:
+        return [(start, end)]
+    spans = []
+    for separator in (LINE_BREAK, SENTENCE_END):
+        pieces = split_spans(text, start, end, separator)
+        if len(pieces) > 1:
+            for piece_start, piece_end in pack_spans(pieces, max_chars):
+                spans.extend(split_long(text, piece_start, piece_end, max_chars))
+            return spans
+    # No breaks at all: cut at the last space before the limit, so words stay whole where possible
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + 1, start + max_chars)
+        cut = cut if cut > start else start + max_chars
+        spans.append((start, cut))
+        start = cut + (text[cut] == " ")
+    spans.append((start, end))
+    return spans
+
+
+def split_paragraphs(text: str, max_chars: int = PARAGRAPH_MAX_CHARS) -> List[Paragraph]:
+    """Non-blank paragraphs of a document (separated by blank lines), each at most `max_chars` long"""
+    paragraphs = []
+    for start, end in split_spans(text, 0, len(text), BLANK_LINES):
+        first = NON_SPACE.search(text, start, end)
+        if first is None:
+            continue
+        end = len(text[first.start():end].rstrip()) + first.start()
+        for piece_start, piece_end in split_long(text, first.start(), end, max(1, max_chars)):
+            piece = text[piece_start:piece_end]
+            if piece.strip():
+                paragraphs.append(Paragraph(piece, piece_start, piece_end, hashlib.sha256(piece.encode("utf-8")).hexdigest()))
+    return paragraphs
+
+
+def paragraph_cache_key(paragraph: Paragraph, kind: str, model_version: str) -> str:
+    """Cache key for one kind of output (a model's results, or text statistics) of a paragraph"""
+    return hashlib.sha256(f"{model_version}|{kind}|{paragraph.digest}".encode("utf-8")).hexdigest()
@@ -0,0 +1,221 @@
+# Portfolio risk and delay scoring
+# The full service's rule-based risk score and delay prediction as column operations over whole project tables, read in chunks
+
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+PORTFOLIO_CHUNK_ROWS = int(os.getenv("AI_PORTFOLIO_CHUNK_ROWS", "262144"))
+PORTFOLIO_MAX_BYTES = int(os.getenv("AI_PORTFOLIO_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Rule tables shared with ai_service.calculate_risk_score and predict_delay (delays without a trained delay model)
+BASE_RISK = 0.3
+ISSUE_RISK_WEIGHTS = {
+    'Budget Mismatch': 0.4,
+    'Unrealistic Schedule': 0.35,
+    'Resource Allocation': 0.25,
+    'Compliance Issue': 0.3,
+    'Technical Risk': 0.35
+}
+DEFAULT_ISSUE_RISK = 0.3
+ISSUE_DELAY_DAYS = {
+    'Budget Mismatch': 15,
+    'Unrealistic Schedule': 20,
+    'Resource Allocation': 12,
+    'Compliance Issue': 8,
+    'Technical Risk': 18
+}
+DEFAULT_ISSUE_DELAY_DAYS = 10
+DELAY_CONFIDENCE = 0.75
+
+# Project columns read from a table, with the defaults used when a column or value is missing (as for project_data)
+PROJECT_DEFAULTS = {'budget': 100000, 'timeline_days': 90, 'complexity': 3, 'technical_terms': 0}
+ISSUE_COLUMN = 'issue_type'
+# Copied to the output when present, so scores can be joined back to the projects
+DEFAULT_KEEP_COLUMNS = ['id', 'project_id', 'project_name', 'name']
+
+SCORE_COLUMNS = ['risk_score', 'expected_delay_days', 'delay_probability', 'delay_confidence']
+TABLE_FORMATS = ('csv', 'parquet')
+
+# Risk levels as worded in the analysis text
+HIGH_RISK = 0.7
+MODERATE_RISK = 0.4
+
+
+def issue_values(issue_types: pd.Series, table: Dict[str, float], default: float) -> np.ndarray:
+    return issue_types.map(table).fillna(default).to_numpy(dtype=np.float64)
+
+
+def risk_scores(
+    issue_types: pd.Series, budget: np.ndarray, timeline_days: np.ndarray, complexity: np.ndarray, technical_terms: np.ndarray
+) -> np.ndarray:
+    """calculate_risk_score for every row; the additions happen in the same order, so results are bit-identical"""
+    issue_risk = issue_values(issue_types, ISSUE_RISK_WEIGHTS, DEFAULT_ISSUE_RISK)
+    issue_risk = np.where(budget > 1000000, issue_risk + 0.1, issue_risk)
+    issue_risk = np.where(timeline_days < 30, issue_risk + 0.15, issue_risk)
+    issue_risk = np.where(complexity > 7, issue_risk + 0.1, issue_risk)
+    issue_risk = np.where(technical_terms > 5, issue_risk + 0.05, issue_risk)
+    return np.minimum(BASE_RISK + issue_risk, 1.0)
+
+
+def delay_predictions(
+    issue_types: pd.Series, budget: np.ndarray, timeline_days: np.ndarray, complexity: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Expected delay days and delay probability of predict_delay for every row"""
+    base_delay = (
+        np.where(timeline_days < 30, 10, 0)
+        + np.where(budget > 1000000, 5, 0)
+        + np.where(complexity > 7, 7, 0)
+    )
+    total_delay = base_delay + issue_values(issue_types, ISSUE_DELAY_DAYS, DEFAULT_ISSUE_DELAY_DAYS).astype(np.int64)
+    probability = np.minimum(0.1 + (total_delay / 100), 0.9)
+    return total_delay, probability
+
+
+def project_column(frame: pd.DataFrame, name: str) -> np.ndarray:
+    """A numeric project column; missing columns, empty cells and non-numbers take the default"""
+    if name not in frame:
+        return np.full(len(frame), PROJECT_DEFAULTS[name], dtype=np.float64)
+    return pd.to_numeric(frame[name], errors='coerce').fillna(PROJECT_DEFAULTS[name]).to_numpy(dtype=np.float64)
+
+
+def score_frame(frame: pd.DataFrame, keep_columns: Sequence[str] = (), delay_model: Any = None) -> pd.DataFrame:
+    """Scores for one chunk of projects, next to the `keep_columns` present in it
+
+    Delays come from `delay_model` (a delay_model.DelayModel) when given, else from the rule tables.
+    """
+    issue_types = frame[ISSUE_COLUMN] if ISSUE_COLUMN in frame else pd.Series([None] * len(frame), index=frame.index)
+    budget, timeline_days, complexity, technical_terms = (
+        project_column(frame, name) for name in ('budget', 'timeline_days', 'complexity', 'technical_terms')
+    )
+    scored = frame[[column for column in keep_columns if column in frame]].copy()
+    scored['risk_score'] = risk_scores(issue_types, budget, timeline_days, complexity, technical_terms)
+    if delay_model is None:
+        scored['expected_delay_days'], scored['delay_probability'] = delay_predictions(issue_types, budget, timeline_days, complexity)
+        scored['delay_confidence'] = DELAY_CONFIDENCE
+        return scored
+    predicted = delay_model.predict_projects(issue_types, budget, timeline_days, complexity, technical_terms)
+    for column in ('expected_delay_days', 'median_delay_days', 'p90_delay_days', 'delay_probability'):
+        scored[column] = predicted[column]
+    scored['delay_confidence'] = delay_model.confidence
+    return scored
+
+
+def table_format(filename: Optional[str], content_type: Optional[str] = None, explicit: Optional[str] = None) -> str:
+    """'csv' or 'parquet', from an explicit choice, the file extension or the content type"""
+    if explicit:
+        if explicit.lower() not in TABLE_FORMATS:
+            raise ValueError(f"Unknown table format '{explicit}'; use one of {list(TABLE_FORMATS)}")
+        return explicit.lower()
+    if (filename or '').lower().endswith(('.parquet', '.pq')) or 'parquet' in (content_type or ''):
+        return 'parquet'
+    return 'csv'
+
+
+def keep_columns(value: Optional[str]) -> List[str]:
+    """Comma-separated column names to copy to the output; DEFAULT_KEEP_COLUMNS when not given"""
+    if value is None:
+        return list(DEFAULT_KEEP_COLUMNS)
+    return [column.strip() for column in value.split(',') if column.strip()]
+
+
+def read_columns(available: Sequence[str], keep_columns: Sequence[str]) -> List[str]:
+    wanted = {ISSUE_COLUMN, *PROJECT_DEFAULTS, *keep_columns}
+    return [column for column in available if column in wanted]
+
+
+def iter_table_chunks(
+    source: Union[str, BinaryIO], fmt: str, keep_columns: Sequence[str] = DEFAULT_KEEP_COLUMNS,
+    chunk_rows: int = PORTFOLIO_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """Chunks of at most `chunk_rows` rows, with only the columns scoring needs; memory stays bounded by the chunk size"""
+    chunk_rows = max(1, chunk_rows)
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet input needs pyarrow (pip install pyarrow)")
+        parquet = pq.ParquetFile(source)
+        columns = read_columns(parquet.schema_arrow.names, keep_columns)
+        # Row groups are read in slices of chunk_rows, never whole files
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    wanted = {ISSUE_COLUMN, *PROJECT_DEFAULTS, *keep_columns}
+    reader = pd.read_csv(
+        source, chunksize=chunk_rows, usecols=lambda column: column in wanted,
+        dtype={ISSUE_COLUMN: 'string', **{column: 'string' for column in keep_columns}}
+    )
+    with reader:
+        yield from reader
+
+
+def score_table(
+    source: Union[str, BinaryIO], fmt: str, keep_columns: Sequence[str] = DEFAULT_KEEP_COLUMNS,
+    chunk_rows: int = PORTFOLIO_CHUNK_ROWS, delay_model: Any = None
+) -> Iterator[pd.DataFrame]:
+    """Scored chunks of a CSV or Parquet project table"""
+    for frame in iter_table_chunks(source, fmt, keep_columns, chunk_rows):
+        yield score_frame(frame, keep_columns, delay_model)
+
+
+def csv_pieces(scored_chunks: Iterator[pd.DataFrame]) -> Iterator[str]:
+    """CSV text of scored chunks, one piece per chunk, with the header once"""
+    header = True
+    for scored in scored_chunks:
+        yield scored.to_csv(index=False, header=header)
+        header = False
+
+
+SUMMARY_SUMS = ['projects', 'risk_score', 'expected_delay_days', 'delay_probability', 'high_risk', 'moderate_risk']
+
+
+class PortfolioSummary:
+    """Totals over scored chunks: risk levels, mean scores, and the same per issue type"""
+
+    def __init__(self):
+        self.sums = pd.DataFrame(columns=SUMMARY_SUMS, dtype=np.float64)
+
+    def add(self, frame: pd.DataFrame, scored: pd.DataFrame):
+        issue_types = frame[ISSUE_COLUMN].fillna('unknown') if ISSUE_COLUMN in frame else pd.Series('unknown', index=frame.index)
+        parts = pd.DataFrame({
+            'issue_type': issue_types.astype(str).to_numpy(),
+            'projects': 1,
+            'risk_score': scored['risk_score'].to_numpy(),
+            'expected_delay_days': scored['expected_delay_days'].to_numpy(),
+            'delay_probability': scored['delay_probability'].to_numpy(),
+            'high_risk': scored['risk_score'].to_numpy() > HIGH_RISK,
+            'moderate_risk': (scored['risk_score'].to_numpy() > MODERATE_RISK) & (scored['risk_score'].to_numpy() <= HIGH_RISK)
+        })
+        self.sums = self.sums.add(parts.groupby('issue_type').sum().astype(np.float64), fill_value=0)
+
+    @staticmethod
+    def describe(sums: pd.Series) -> Dict[str, Any]:
+        projects = int(sums['projects'])
+        return {
+            'projects': projects,
+            'mean_risk_score': round(float(sums['risk_score']) / projects, 6) if projects else None,
+            'mean_expected_delay_days': round(float(sums['expected_delay_days']) / projects, 4) if projects else None,
+            'mean_delay_probability': round(float(sums['delay_probability']) / projects, 6) if projects else None,
+            'high_risk': int(sums['high_risk']),
+            'moderate_risk': int(sums['moderate_risk']),
+            'low_risk': projects - int(sums['high_risk']) - int(sums['moderate_risk'])
+        }
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            **self.describe(self.sums.sum()),
+            'by_issue_type': {issue_type: self.describe(row) for issue_type, row in self.sums.iterrows()}
+        }
+
+
+def summarize_table(
+    source: Union[str, BinaryIO], fmt: str, chunk_rows: int = PORTFOLIO_CHUNK_ROWS, delay_model: Any = None
+) -> Dict[str, Any]:
+    """Portfolio totals without keeping per-project scores"""
+    summary = PortfolioSummary()
+    for frame in iter_table_chunks(source, fmt, (), chunk_rows):
+        summary.add(frame, score_frame(frame, delay_model=delay_model))
+    return summary.result()
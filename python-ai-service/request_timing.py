@@ -0,0 +1,175 @@
+# Request timing
+# Monotonic span timer for one request, shared through a context variable, and a sampling profiler for slow requests
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, ContextManager, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SLOW_MS = float(os.getenv("AI_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("AI_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("AI_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ai-dpr-profiles"))
+
+# Leaf frames from these modules are threads waiting for work, not doing it
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+
+class RequestTimer:
+    """Named spans of one request on the perf_counter_ns clock, plus stage durations reported by workers"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter_ns()
+        self.spans: List[Tuple[str, int, int]] = []  # (name, start offset, duration) in ns
+        self.stage_seconds: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        """Seconds since the request started"""
+        return (time.perf_counter_ns() - self.started) / 1e9
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans.append((name, started - self.started, time.perf_counter_ns() - started))
+
+    def add_stages(self, stage_seconds: Optional[Dict[str, float]]):
+        for stage, seconds in (stage_seconds or {}).items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Spans in start order and stage compute times, in milliseconds"""
+        return {
+            "total_ms": round(self.elapsed() * 1000, 3),
+            "spans": [
+                {"name": name, "start_ms": round(start / 1e6, 3), "duration_ms": round(duration / 1e6, 3)}
+                for name, start, duration in sorted(self.spans, key=lambda span: span[1])
+            ],
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in sorted(self.stage_seconds.items())}
+        }
+
+
+current_timer: ContextVar[Optional[RequestTimer]] = ContextVar("current_timer", default=None)
+
+
+def span(name: str) -> ContextManager:
+    """Time a block as a span of the current request (no-op outside one)"""
+    timer = current_timer.get()
+    return timer.span(name) if timer is not None else nullcontext()
+
+
+def add_stages(stage_seconds: Optional[Dict[str, float]]):
+    """Record stage durations measured in an executor worker on the current request"""
+    timer = current_timer.get()
+    if timer is not None:
+        timer.add_stages(stage_seconds)
+
+
+def debug_timing_requested(flag: bool, header: Optional[str]) -> bool:
+    """True when the request body flag or the X-Debug-Timing header asks for the breakdown"""
+    return flag or (header or "").strip().lower() in ("1", "true", "yes")
+
+
+class SlowRequestProfiler:
+    """Samples thread stacks while requests are timed and saves the samples of slow requests
+
+    A daemon thread records every other thread's stack each `interval_ms`, only while a
+    request is in flight. A request slower than `threshold_ms` gets the samples taken during
+    it written to `directory` as collapsed stacks (`frame;frame;frame count` per line, the
+    input of flamegraph.pl and speedscope). Samples cover all threads of the process, so
+    concurrent requests appear too; process-pool workers are not sampled.
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float = PROFILE_INTERVAL_MS, directory: str = PROFILE_DIR, max_samples: int = 200_000):
+        self.threshold = threshold_ms / 1000
+        self.interval = max(interval_ms, 0.5) / 1000
+        self.directory = directory
+        self.samples: Deque[Tuple[int, str]] = deque(maxlen=max_samples)
+        self.active = 0
+        self.profiles_written = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self):
+        with self._condition:
+            self.active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def end(self, timer: RequestTimer):
+        with self._condition:
+            self.active -= 1
+        if timer.elapsed() >= self.threshold:
+            self.write_profile(timer)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._condition:
+                while not self.active:
+                    self._condition.wait()
+            now = time.perf_counter_ns()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id and os.path.basename(frame.f_code.co_filename) not in IDLE_MODULES:
+                    self.samples.append((now, collapse_stack(frame)))
+            time.sleep(self.interval)
+
+    def write_profile(self, timer: RequestTimer) -> Optional[str]:
+        finished = timer.started + int(timer.elapsed() * 1e9)
+        stacks = Counter(stack for sampled_at, stack in list(self.samples) if timer.started <= sampled_at <= finished)
+        if not stacks:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(
+                self.directory,
+                f"{timer.name.strip('/').replace('/', '_') or 'root'}-{int(time.time() * 1000)}-{timer.elapsed() * 1000:.0f}ms.folded"
+            )
+            with open(path, "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        except OSError as e:
+            logger.warning(f"Could not write slow request profile: {e}")
+            return None
+        self.profiles_written += 1
+        logger.warning(f"Slow request {timer.name} took {timer.elapsed() * 1000:.0f}ms; profile written to {path}")
+        return path
+
+
+def collapse_stack(frame) -> str:
+    """`outer;...;inner` for a frame and its callers"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+slow_request_profiler = SlowRequestProfiler(PROFILE_SLOW_MS) if PROFILE_SLOW_MS > 0 else None
+
+
+@contextmanager
+def request_timer(name: str) -> Iterator[RequestTimer]:
+    """Time one request: make its timer current and, when AI_PROFILE_SLOW_MS is set, profile it if slow"""
+    timer = RequestTimer(name)
+    token = current_timer.set(timer)
+    if slow_request_profiler is not None:
+        slow_request_profiler.begin()
+    try:
+        yield timer
+    finally:
+        current_timer.reset(token)
+        if slow_request_profiler is not None:
+            slow_request_profiler.end(timer)
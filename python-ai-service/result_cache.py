@@ -0,0 +1,264 @@
+# Content-addressed cache for analysis results
+# In-memory LRU with TTL and size bounds, plus an optional SQLite tier that survives restarts
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+CACHE_DB_PATH = os.getenv("AI_CACHE_DB_PATH", "")
+CACHE_DB_MAX_ENTRIES = int(os.getenv("AI_CACHE_DB_MAX_ENTRIES", "100000"))
+# Disk tier writes are collected for this long and committed together by a background thread
+CACHE_DB_FLUSH_SECONDS = float(os.getenv("AI_CACHE_DB_FLUSH_SECONDS", "0.5"))
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-submissions that only differ in spacing share an entry"""
+    return " ".join(text.split())
+
+
+def make_cache_key(text: str, issue_type: str, project_data: Optional[Dict[str, Any]], model_version: str, **options: Any) -> str:
+    """Hash of the normalized text, issue type, project data, model version and output options"""
+    payload = json.dumps({
+        'text': normalize_text(text),
+        'issue_type': issue_type,
+        'project_data': project_data or {},
+        'model_version': model_version,
+        'options': options
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars (e.g. pipeline scores) expose .item()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class ResultCache:
+    """LRU + TTL cache of JSON-serializable results, optionally backed by SQLite
+
+    Lookups and the in-memory LRU are synchronous. Disk tier writes are queued and committed
+    in batches by a writer thread, so a cache miss does not wait for an fsync; queued writes
+    are served from memory until they are committed. The SQLite connection is opened on first
+    use in each process and closed before a fork, since a connection must not be carried into
+    a forked child (serve.py workers).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        db_path: str = CACHE_DB_PATH,
+        db_max_entries: int = CACHE_DB_MAX_ENTRIES,
+        db_flush_seconds: float = CACHE_DB_FLUSH_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_max_entries = db_max_entries
+        self.db_flush_seconds = db_flush_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_used = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # Guards the LRU and the pending writes; _db_lock guards the connection and is taken first
+        self._lock = threading.Lock()
+        self.db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._writer: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._writes_since_prune = 0
+
+        if db_path and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self.close_disk, after_in_child=self._reset_after_fork)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or bool(self.db_path)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """This process's disk tier connection, opened on first use; caller holds _db_lock"""
+        if not self.db_path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+            logger.info(f"Result cache disk tier at {self.db_path} (pid {self._db_pid})")
+        return self._db
+
+    def flush(self):
+        """Commit the queued disk writes in one transaction"""
+        with self._db_lock:
+            self._flush_locked()
+
+    def close_disk(self):
+        """Commit queued writes and close this process's connection; the next use reopens it"""
+        with self._db_lock:
+            if self._db_pid == os.getpid():
+                self._flush_locked()
+                self._db.close()
+            self._db = None
+            self._db_pid = None
+
+    def _reset_after_fork(self):
+        # Another thread may have held a lock when the process forked, and threads do not survive it
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._writer = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached value, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                self._remove(key)
+            pending = self._pending.get(key)
+            if pending is not None and pending[1] > now:
+                self.hits += 1
+                return json.loads(pending[0])
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._memory_set(key, value, now + self.ttl_seconds)
+                return json.loads(value)
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        serialized = json.dumps(value, default=_json_default)
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._memory_set(key, serialized, expires_at)
+            if self.db_path:
+                self._pending[key] = (serialized, expires_at)
+                self._start_writer()
+
+    def clear(self):
+        with self._db_lock:
+            with self._lock:
+                self._entries.clear()
+                self._pending.clear()
+                self.bytes_used = 0
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM analysis_cache")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes_used,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_tier": bool(self.db_path),
+            "disk_pending": len(self._pending)
+        }
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.bytes_used -= len(value)
+
+    def _memory_set(self, key: str, value: str, expires_at: float):
+        if self.max_entries <= 0 or len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value)
+        self.bytes_used += len(value)
+
+        while len(self._entries) > self.max_entries or self.bytes_used > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if not self.db_path:
+            return None
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT value FROM analysis_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _start_writer(self):
+        """Wake the writer thread, starting it in this process if needed; caller holds _lock"""
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name="result-cache-writer", daemon=True)
+            self._writer.start()
+        self._wakeup.set()
+
+    def _write_loop(self):
+        while True:
+            self._wakeup.wait()
+            # Writes arriving meanwhile go into the same commit
+            time.sleep(self.db_flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Result cache disk write failed: {e}")
+
+    def _flush_locked(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        db = self._connection()
+        now = time.time()
+        db.executemany(
+            "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+            [(key, value, expires_at, now) for key, (value, expires_at) in pending.items()]
+        )
+        self._writes_since_prune += len(pending)
+        if self._writes_since_prune >= 1000:
+            self._writes_since_prune = 0
+            # Drop expired rows, then the oldest rows beyond the size bound
+            db.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (now,))
+            db.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                "SELECT key FROM analysis_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.db_max_entries,)
+            )
+        db.commit()
@@ -0,0 +1,50 @@
+# Persisted risk model artifacts
+# Scaler + classifier trained offline by train_risk_model.py; workers forked by serve.py share the loaded model copy-on-write
+
+import os
+import logging
+from typing import Any, Dict
+
+from startup_report import timed_import
+
+logger = logging.getLogger(__name__)
+
+RISK_MODEL_PATH = os.getenv(
+    "AI_RISK_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "risk_model.joblib")
+)
+
+ARTIFACT_FORMAT = 1
+
+# Columns produced by features.extract_feature_row, in order
+FEATURE_NAMES = ['word_count', 'sentence_count', 'technical_terms', 'budget_normalized', 'timeline_normalized']
+
+
+def save_risk_artifact(path: str, scaler: Any, model: Any, metadata: Dict[str, Any]):
+    """Write the artifact atomically; stored uncompressed so it loads without decompressing"""
+    joblib = timed_import('joblib')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'metadata': {**metadata, 'feature_names': FEATURE_NAMES},
+        'scaler': scaler,
+        'model': model
+    }
+    temp_path = f"{path}.tmp"
+    joblib.dump(artifact, temp_path, compress=0)
+    os.replace(temp_path, path)
+
+
+def load_risk_artifact(path: str = RISK_MODEL_PATH) -> Dict[str, Any]:
+    """Load an artifact into memory
+
+    Not memory-mapped: unpickling a sklearn tree copies its node arrays out of a mapping anyway.
+    """
+    joblib = timed_import('joblib')
+    artifact = joblib.load(path)
+    if not isinstance(artifact, dict) or artifact.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a format {ARTIFACT_FORMAT} risk model artifact")
+    feature_names = artifact['metadata'].get('feature_names')
+    if feature_names != FEATURE_NAMES:
+        raise ValueError(f"{path} was trained on features {feature_names}, the service extracts {FEATURE_NAMES}")
+    return artifact
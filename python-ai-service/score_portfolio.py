@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Offline portfolio scoring: rule-based risk and delay for every project in a CSV or Parquet table
+Reads and writes in chunks, so memory stays bounded however many projects the table holds
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+from delay_model import DELAY_MODEL_PATH, DelayModel
+from portfolio import (
+    PORTFOLIO_CHUNK_ROWS, PortfolioSummary, iter_table_chunks, keep_columns, score_frame, table_format
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def verify_sample(frame: pd.DataFrame, scored: pd.DataFrame, rows: int, seed: int, delay_model) -> int:
+    """Rescore sampled rows with the service's per-request functions; returns the number of mismatches"""
+    from ai_service import build_features, calculate_risk_score, model_manager, predict_delay
+
+    model_manager.delay_model = delay_model
+    mismatches = 0
+    sample = np.random.default_rng(seed).choice(len(frame), size=min(rows, len(frame)), replace=False)
+    for position in sample:
+        row = frame.iloc[position]
+        project_data = {}
+        for column in ('budget', 'timeline_days', 'complexity'):
+            value = pd.to_numeric(row.get(column), errors='coerce')
+            if not pd.isna(value):
+                project_data[column] = float(value)
+        technical_terms = pd.to_numeric(row.get('technical_terms'), errors='coerce')
+        features = build_features(0, 1, np.nan, 0 if pd.isna(technical_terms) else float(technical_terms), project_data)
+        issue_type = row.get('issue_type')
+        issue_type = None if pd.isna(issue_type) else str(issue_type)
+        delay = predict_delay(features, issue_type)
+        expected = scored.iloc[position]
+        if (calculate_risk_score(features, issue_type) != expected['risk_score']
+                or delay['expected_delay_days'] != expected['expected_delay_days']
+                or delay['delay_probability'] != expected['delay_probability']):
+            mismatches += 1
+            logger.warning(f"Row {position} scores differ from the service: {row.to_dict()}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a portfolio of projects for risk and expected delay")
+    parser.add_argument("input", help="CSV or Parquet table with `issue_type`, `budget`, `timeline_days`, `complexity`, `technical_terms` columns")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Input format (default: from the file extension)")
+    parser.add_argument("--output", help="Scored rows to this CSV, or Parquet for .parquet paths (default: stdout)")
+    parser.add_argument("--summary", action="store_true", help="Print portfolio totals instead of scored rows")
+    parser.add_argument("--keep", help="Comma-separated columns copied to the output (default: id, project_id, project_name, name)")
+    parser.add_argument("--chunk-rows", type=int, default=PORTFOLIO_CHUNK_ROWS)
+    parser.add_argument("--delay-model", default=DELAY_MODEL_PATH, help=f"Trained delay model, used when the file exists (default: {DELAY_MODEL_PATH})")
+    parser.add_argument("--rule-delays", action="store_true", help="Use the rule-based delays even when a delay model exists")
+    parser.add_argument("--verify-sample", type=int, default=0, help="Check this many rows of the first chunk against the service")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    delay_model = None
+    if not args.rule_delays and os.path.exists(args.delay_model):
+        try:
+            delay_model = DelayModel.load(args.delay_model)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Could not load delay model: {e}")
+            sys.exit(1)
+        logger.info(f"Using delay model {delay_model.version} from {args.delay_model}")
+
+    fmt = table_format(args.input, explicit=args.format)
+    keep = keep_columns(args.keep)
+    summary = PortfolioSummary()
+    writer = None
+    out = None
+    rows = 0
+    start_time = time.perf_counter()
+
+    try:
+        if not args.summary:
+            if args.output and args.output.lower().endswith(('.parquet', '.pq')):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            else:
+                out = open(args.output, 'w', newline='') if args.output else sys.stdout
+        for frame in iter_table_chunks(args.input, fmt, keep, args.chunk_rows):
+            scored = score_frame(frame, keep, delay_model)
+            first_chunk = rows == 0
+            if args.verify_sample and first_chunk:
+                mismatches = verify_sample(frame, scored, args.verify_sample, args.seed, delay_model)
+                if mismatches:
+                    logger.error(f"❌ {mismatches} sampled rows differ from the service scores")
+                    sys.exit(1)
+                logger.info(f"✅ {min(args.verify_sample, len(frame))} sampled rows match the service scores")
+            rows += len(frame)
+            if args.summary:
+                summary.add(frame, scored)
+            elif out is not None:
+                out.write(scored.to_csv(index=False, header=first_chunk))
+            else:
+                table = pa.Table.from_pandas(scored, preserve_index=False)
+                writer = writer or pq.ParquetWriter(args.output, table.schema)
+                writer.write_table(table)
+    except ImportError:
+        logger.error("❌ Parquet output needs pyarrow (pip install pyarrow)")
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Could not score {args.input}: {e}")
+        sys.exit(1)
+    finally:
+        if writer is not None:
+            writer.close()
+        if out is not None and out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"✅ Scored {rows} projects in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    if args.summary:
+        print(json.dumps(summary.result(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Production server for the AI DPR services
+Loads the models once in a master process, then forks workers that share the weights copy-on-write
+"""
+
+import os
+import gc
+import sys
+import time
+import random
+import signal
+import socket
+import argparse
+import importlib
+import logging
+from typing import Any, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Read by BLAS and OpenMP when they are first loaded, so they must be set before the service is imported
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"]
+
+# Models the full service loads in the master unless AI_PRELOAD_MODELS says otherwise
+DEFAULT_PRELOAD = {"ai_service": "sentiment,ner", "ai_service_basic": ""}
+
+# A worker that dies sooner than this after starting is restarted with a delay, not in a tight loop
+MIN_WORKER_SECONDS = 5.0
+
+
+def configure_threads(threads: int):
+    """Per-worker BLAS/OpenMP thread counts; explicit environment settings win"""
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+    # Rust tokenizers warn and may deadlock when their thread pool is used before fork
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def limit_torch_threads(threads: int):
+    """Apply the per-worker thread count to torch, when a model loader imported it"""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # only settable before the first inter-op task
+
+
+def check_fork_safe():
+    """CUDA contexts do not survive fork; GPU deployments run one process per device instead"""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        logger.error("❌ CUDA was initialized in the master; forked workers cannot use it. Run one worker per GPU with uvicorn instead")
+        sys.exit(1)
+
+
+def worker_memory(pid: int) -> Optional[Dict[str, float]]:
+    """RSS, proportional and private memory of a process in MB, from /proc (None elsewhere)"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as rollup:
+            for line in rollup:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss_mb": values.get("Rss", 0.0),
+        "pss_mb": values.get("Pss", 0.0),
+        "private_mb": values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0),
+        "shared_mb": values.get("Shared_Clean", 0.0) + values.get("Shared_Dirty", 0.0)
+    }
+
+
+def load_service(name: str) -> Any:
+    """Import the service and load its startup models in this (master) process"""
+    os.environ.setdefault("AI_PRELOAD_MODELS", DEFAULT_PRELOAD.get(name, ""))
+    started = time.perf_counter()
+    service = importlib.import_module(name)
+    service.model_manager.load_models_sync()
+    check_fork_safe()
+    logger.info(f"✅ Loaded {name} models in {time.perf_counter() - started:.1f}s")
+    return service
+
+
+class PreforkMaster:
+    """Forks uvicorn workers from a process that already holds the models and keeps them running
+
+    Workers share one listening socket. A worker exits gracefully after its request limit or
+    when recycled (SIGHUP recycles all of them, one at a time, as does exceeding the private
+    memory limit), and the master forks a replacement from the same loaded state.
+    """
+
+    def __init__(self, service: Any, sock: socket.socket, args: argparse.Namespace):
+        self.service = service
+        self.sock = sock
+        self.args = args
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.recycle_queue: List[int] = []
+        self.recycling: Optional[int] = None
+        self.stopping = False
+        self.spawn_after = 0.0
+        self.next_memory_check = 0.0
+        self.memory_reported = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker()
+        self.workers[pid] = time.monotonic()
+        logger.info(f"🚀 Started worker {pid}")
+
+    def run_worker(self):
+        """Worker process body; never returns"""
+        status = 0
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            # Reloads are the master's business; a HUP sent to the whole process group must not kill workers
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            gc.enable()
+            random.seed()
+            limit_torch_threads(self.args.threads)
+            max_requests = self.args.max_requests
+            if max_requests:
+                # Jitter keeps workers from all restarting at the same moment
+                max_requests += random.randint(0, self.args.max_requests_jitter)
+            config = self.service_config(max_requests)
+            import uvicorn
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except Exception as e:
+            logger.error(f"❌ Worker {os.getpid()} failed: {e}")
+            status = 1
+        finally:
+            os._exit(status)
+
+    def service_config(self, max_requests: Optional[int]):
+        import uvicorn
+        return uvicorn.Config(
+            self.service.app,
+            log_level=self.args.log_level,
+            limit_max_requests=max_requests or None,
+            timeout_graceful_shutdown=self.args.graceful_timeout,
+            timeout_keep_alive=self.args.keep_alive
+        )
+
+    def reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            if pid == self.recycling:
+                self.recycling = None
+            code = os.waitstatus_to_exitcode(status)
+            lifetime = time.monotonic() - started
+            logger.info(f"Worker {pid} exited with status {code} after {lifetime:.0f}s")
+            if not self.stopping and code != 0 and lifetime < MIN_WORKER_SECONDS:
+                logger.warning(f"⚠️ Worker {pid} died right after starting; waiting before restarting it")
+                self.spawn_after = time.monotonic() + MIN_WORKER_SECONDS
+
+    def recycle(self, pids: List[int]):
+        """Queue workers for a graceful restart, one at a time so the others keep serving"""
+        self.recycle_queue += [pid for pid in pids if pid in self.workers and pid not in self.recycle_queue]
+
+    def advance_recycling(self):
+        if self.recycling is not None:
+            return
+        while self.recycle_queue:
+            pid = self.recycle_queue.pop(0)
+            if pid in self.workers:
+                logger.info(f"♻️ Recycling worker {pid}")
+                self.recycling = pid
+                os.kill(pid, signal.SIGTERM)
+                return
+
+    def check_memory(self):
+        now = time.monotonic()
+        if now < self.next_memory_check:
+            return
+        self.next_memory_check = now + self.args.memory_check_interval
+        usage = {pid: worker_memory(pid) for pid in self.workers}
+        usage = {pid: memory for pid, memory in usage.items() if memory is not None}
+        if not usage:
+            return
+        if not self.memory_reported and len(usage) == self.args.workers:
+            master = worker_memory(os.getpid())
+            if master is not None:
+                logger.info(f"📊 Master RSS {master['rss_mb']:.0f} MB")
+            for pid, memory in sorted(usage.items()):
+                logger.info(
+                    f"📊 Worker {pid}: RSS {memory['rss_mb']:.0f} MB, shared {memory['shared_mb']:.0f} MB, "
+                    f"private {memory['private_mb']:.0f} MB"
+                )
+            self.memory_reported = True
+        if self.args.max_worker_private_mb:
+            over = [pid for pid, memory in usage.items() if memory['private_mb'] > self.args.max_worker_private_mb]
+            for pid in over:
+                if pid != self.recycling and pid not in self.recycle_queue:
+                    logger.warning(f"⚠️ Worker {pid} holds {usage[pid]['private_mb']:.0f} MB of private memory")
+            self.recycle(over)
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def handle_reload(self, signum, frame):
+        logger.info("♻️ SIGHUP received, recycling all workers")
+        self.recycle(list(self.workers))
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        # Objects created so far are never collected in the workers, so collections there do not
+        # write to (and un-share) the pages holding them
+        gc.freeze()
+        while not self.stopping:
+            self.reap()
+            while not self.stopping and len(self.workers) < self.args.workers and time.monotonic() >= self.spawn_after:
+                self.spawn()
+            self.advance_recycling()
+            self.check_memory()
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("🛑 Stopping workers")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + (self.args.graceful_timeout or 30) + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers:
+            logger.warning(f"⚠️ Worker {pid} did not stop in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+        self.sock.close()
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Serve an AI DPR service from pre-forked workers that share its models")
+    parser.add_argument("--service", default="ai_service", choices=["ai_service", "ai_service_basic"])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("AI_WORKERS", str(cpus))))
+    parser.add_argument("--threads", type=int, help="torch/BLAS threads per worker (default: CPUs / workers)")
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("AI_WORKER_MAX_REQUESTS", "0")),
+                        help="Restart a worker after this many requests (0: never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(os.getenv("AI_WORKER_MAX_REQUESTS_JITTER", "0")))
+    parser.add_argument("--max-worker-private-mb", type=float, default=float(os.getenv("AI_WORKER_MAX_PRIVATE_MB", "0")),
+                        help="Restart a worker whose private (unshared) memory exceeds this (0: never)")
+    parser.add_argument("--memory-check-interval", type=float, default=10.0, help="Seconds between worker memory checks")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="Seconds a stopping worker gets to finish its requests")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    args.workers = max(1, args.workers)
+    args.threads = max(1, args.threads or cpus // args.workers)
+
+    configure_threads(args.threads)
+    # Keep the collector from freeing objects while the models load, which leaves holes in
+    # pages the workers would otherwise share; frozen and re-enabled in the workers
+    gc.disable()
+
+    logger.info(f"🚀 Starting {args.service} with {args.workers} workers, {args.threads} threads each")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    service = load_service(args.service)
+
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    sock.set_inheritable(True)
+    logger.info(f"🔗 Listening on http://{args.host}:{args.port}")
+    PreforkMaster(service, sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
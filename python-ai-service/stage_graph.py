@@ -0,0 +1,60 @@
+# Stage dependency graph
+# Resolves the response fields a request asks for into the analysis stages that have to run
+
+from typing import Dict, FrozenSet, Iterable, List, Sequence
+
+
+class StageGraph:
+    """Analysis stages with their prerequisites, and the stages each response field reads
+
+    `dependencies` maps every stage to the stages it needs; `outputs` maps every response
+    field to the stages it is computed from. Cycles and unknown names fail at construction.
+    """
+
+    def __init__(self, dependencies: Dict[str, Sequence[str]], outputs: Dict[str, Sequence[str]]):
+        self.dependencies = {stage: tuple(needs) for stage, needs in dependencies.items()}
+        self.outputs = {field: tuple(stages) for field, stages in outputs.items()}
+        for name, needs in [*self.dependencies.items(), *self.outputs.items()]:
+            unknown = [stage for stage in needs if stage not in self.dependencies]
+            if unknown:
+                raise ValueError(f"'{name}' depends on unknown stages {unknown}")
+        self.order = self._topological_order()
+        self.fields: FrozenSet[str] = frozenset(self.outputs)
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        visiting = set()
+
+        def visit(stage: str):
+            if stage in order:
+                return
+            if stage in visiting:
+                raise ValueError(f"Stage dependency cycle through '{stage}'")
+            visiting.add(stage)
+            for needed in self.dependencies[stage]:
+                visit(needed)
+            visiting.discard(stage)
+            order.append(stage)
+
+        for stage in self.dependencies:
+            visit(stage)
+        return order
+
+    def validate_fields(self, fields: Iterable[str]) -> List[str]:
+        """The fields unchanged, or ValueError naming the unknown ones"""
+        fields = list(fields)
+        unknown = sorted(set(fields) - self.fields)
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}; available: {sorted(self.fields)}")
+        return fields
+
+    def stages_for(self, fields: Iterable[str]) -> List[str]:
+        """Every stage the fields need, directly or through prerequisites, in a valid run order"""
+        needed = set()
+        pending = [stage for field in self.validate_fields(fields) for stage in self.outputs[field]]
+        while pending:
+            stage = pending.pop()
+            if stage not in needed:
+                needed.add(stage)
+                pending.extend(self.dependencies[stage])
+        return [stage for stage in self.order if stage in needed]
@@ -0,0 +1,107 @@
+# Startup timing report
+# Breaks service start-up into import, model loading and warmup time, and times deferred heavy imports
+
+import os
+import sys
+import time
+import logging
+import importlib
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("AI_WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+def process_age_seconds() -> Optional[float]:
+    """Seconds since this process was started, from /proc (None elsewhere)"""
+    try:
+        with open("/proc/self/stat") as stat:
+            # The command name may contain spaces; fields after it are fixed
+            fields = stat.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime") as uptime:
+            system_uptime = float(uptime.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupReport:
+    """Collects phase timings from interpreter start until the service is ready"""
+
+    def __init__(self):
+        self.created = time.perf_counter()
+        age = process_age_seconds()
+        # Time the interpreter spent before this module was imported
+        self.interpreter_seconds = age if age is not None and age >= 0 else None
+        self.phases: List[Tuple[str, float]] = []
+        self.deferred_imports: Dict[str, Dict[str, Any]] = {}
+        self.ready_seconds: Optional[float] = None
+        self.models_ready_seconds: Optional[float] = None
+        self._last_mark = self.created
+
+    def mark(self, name: str):
+        """Record the time since the previous mark (or since creation) as a phase"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last_mark))
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+            self._last_mark = time.perf_counter()
+
+    def record_import(self, name: str, seconds: float):
+        self.deferred_imports[name] = {
+            "seconds": round(seconds, 4),
+            "before_ready": self.ready_seconds is None
+        }
+
+    def models_ready(self):
+        """Startup models are loaded and warmed up (may come after ready() when loading in the background)"""
+        self.models_ready_seconds = time.perf_counter() - self.created
+        logger.info(f"Models ready {self.models_ready_seconds * 1000:.0f}ms after import")
+
+    def ready(self):
+        self.ready_seconds = time.perf_counter() - self.created
+        summary = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        logger.info(f"Service ready in {self.total_seconds() * 1000:.0f}ms ({summary})")
+
+    def total_seconds(self) -> Optional[float]:
+        if self.ready_seconds is None:
+            return None
+        return self.ready_seconds + (self.interpreter_seconds or 0.0)
+
+    def summary(self) -> Dict[str, Any]:
+        total = self.total_seconds()
+        return {
+            "ready": self.ready_seconds is not None,
+            "total_seconds": round(total, 4) if total is not None else None,
+            "interpreter_seconds": round(self.interpreter_seconds, 4) if self.interpreter_seconds is not None else None,
+            "models_ready_seconds": round(self.models_ready_seconds, 4) if self.models_ready_seconds is not None else None,
+            "phases": [{"name": name, "seconds": round(seconds, 4)} for name, seconds in self.phases],
+            "deferred_imports": self.deferred_imports
+        }
+
+
+# One report per process, created when the service module first imports this one
+startup_report = StartupReport()
+
+
+def timed_import(name: str) -> Any:
+    """Import a heavy module on demand, recording how long the first import took"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - started
+    startup_report.record_import(name, elapsed)
+    logger.info(f"Imported {name} in {elapsed * 1000:.0f}ms")
+    return module
@@ -0,0 +1,134 @@
+# Streaming file uploads
+# Spools multipart or raw request bodies to a temp file above a size threshold and yields the text in sentence-aligned segments
+
+import os
+import re
+import codecs
+import tempfile
+import logging
+from typing import Any, AsyncIterator, BinaryIO, Dict, NamedTuple, Optional
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_BYTES = int(os.getenv("AI_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("AI_UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+UPLOAD_SEGMENT_CHARS = int(os.getenv("AI_UPLOAD_SEGMENT_CHARS", "65536"))
+
+READ_CHUNK_BYTES = 64 * 1024
+
+# A sentence terminator run followed by whitespace; segments are cut right after the run
+SENTENCE_END = re.compile(r'[.!?]+(?=\s)')
+# Whitespace not preceded by a digit, so amounts like "100 rupees" stay in one segment
+WORD_BREAK = re.compile(r'(?<=[^\d\s])\s')
+
+
+class SpooledUpload(NamedTuple):
+    file: BinaryIO
+    size: int
+    filename: Optional[str]
+    content_type: Optional[str]
+    fields: Dict[str, str]  # form fields for multipart bodies, query parameters otherwise
+
+
+async def limited_stream(request: Request, max_bytes: int, received: Dict[str, int]) -> AsyncIterator[bytes]:
+    """Yield the request body, failing with 413 once it grows past `max_bytes`"""
+    async for chunk in request.stream():
+        received['bytes'] += len(chunk)
+        if received['bytes'] > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload is larger than the {max_bytes} byte limit")
+        yield chunk
+
+
+async def receive_upload(
+    request: Request,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    spool_bytes: int = UPLOAD_SPOOL_BYTES,
+) -> SpooledUpload:
+    """Spool a multipart (`file` part) or raw upload body without holding it in memory"""
+    declared = request.headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload is larger than the {max_bytes} byte limit")
+
+    received = {'bytes': 0}
+    stream = limited_stream(request, max_bytes, received)
+    content_type = request.headers.get('content-type', '')
+
+    if content_type.startswith('multipart/form-data'):
+        parser = MultiPartParser(request.headers, stream)
+        parser.max_file_size = spool_bytes
+        form = await parser.parse()
+        upload = form.get('file')
+        if not isinstance(upload, UploadFile):
+            await form.close()
+            raise HTTPException(status_code=400, detail="Multipart upload needs a `file` part")
+        fields = {key: value for key, value in form.multi_items() if isinstance(value, str)}
+        upload.file.seek(0, os.SEEK_END)
+        size = upload.file.tell()
+        upload.file.seek(0)
+        return SpooledUpload(upload.file, size, upload.filename, upload.content_type, fields)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        async for chunk in stream:
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return SpooledUpload(spool, received['bytes'], None, content_type or None, dict(request.query_params))
+
+
+def find_segment_end(text: str, limit: int) -> int:
+    """Where to cut `text` so the first segment is at most `limit` characters
+
+    Prefers the end of the last sentence, then the last word break, so words and
+    terminator runs are never split across segments.
+    """
+    window = text[:limit + 1]
+    for pattern in (SENTENCE_END, WORD_BREAK):
+        last = None
+        for match in pattern.finditer(window):
+            last = match
+        if last is not None and 0 < last.end() <= limit:
+            return last.end() if pattern is SENTENCE_END else last.start()
+    return limit
+
+
+async def read_chunk(file: BinaryIO) -> bytes:
+    """Next chunk of a spooled upload; reads of a file rolled over to disk run in the threadpool"""
+    if getattr(file, '_rolled', True):
+        return await run_in_threadpool(file.read, READ_CHUNK_BYTES)
+    return file.read(READ_CHUNK_BYTES)
+
+
+async def iter_text_segments(
+    file: BinaryIO,
+    encoding: str = 'utf-8',
+    segment_chars: int = UPLOAD_SEGMENT_CHARS,
+) -> AsyncIterator[str]:
+    """Decode a spooled upload incrementally, yielding sentence-aligned segments of bounded size"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    buffer = ''
+    while True:
+        chunk = await read_chunk(file)
+        buffer += decoder.decode(chunk, final=not chunk)
+        while len(buffer) > segment_chars:
+            cut = find_segment_end(buffer, segment_chars)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+        if not chunk:
+            break
+    if buffer:
+        yield buffer
+
+
+def upload_field(upload: SpooledUpload, name: str, default: Any = None, required: bool = False) -> Any:
+    value = upload.fields.get(name, default)
+    if required and not value:
+        raise HTTPException(status_code=422, detail=f"Missing upload field `{name}`")
+    return value
@@ -0,0 +1,194 @@
+# Single-pass text scanning
+# Computes script presence, word and sentence counts, term and lexicon hits and regex entities for a text together
+
+import re
+import operator
+from bisect import bisect_right
+from collections import Counter
+from contextlib import nullcontext
+from itertools import accumulate
+from typing import TYPE_CHECKING, AbstractSet, Any, Callable, ContextManager, Dict, List, NamedTuple, Optional, Pattern
+
+if TYPE_CHECKING:
+    from lexicon import Lexicon
+
+# Script ranges checked in order by language detection
+SCRIPT_RANGES = [
+    ("hi", "\u0900", "\u097F"),  # Devanagari script (Hindi)
+    ("te", "\u0C00", "\u0C7F"),  # Telugu script
+    ("ta", "\u0B80", "\u0BFF"),  # Tamil script
+    ("bn", "\u0980", "\u09FF"),  # Bengali script
+]
+SCRIPT_PATTERNS = [(language, re.compile(f'[{first}-{last}]')) for language, first, last in SCRIPT_RANGES]
+
+# Every character in these ranges encodes to three UTF-8 bytes, and its first two bytes only
+# ever start characters of that range, so a substring test on the encoded text finds the script
+SCRIPT_UTF8_PREFIXES = [
+    (language, sorted({chr(code).encode('utf-8')[:2] for code in range(ord(first), ord(last) + 1)}))
+    for language, first, last in SCRIPT_RANGES
+]
+
+SENTENCE_TERMINATORS = re.compile(r'[.!?]+')
+
+DATE_PATTERN = re.compile(r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b')
+MONEY_PATTERN = re.compile(
+    r'\$[\d,]+(?:\.\d{2})?|\b\d+(?:,\d{3})*(?:\.\d{2})?\s*(?:dollars?|USD|INR|rupees?)\b', re.IGNORECASE
+)
+PERCENT_PATTERN = re.compile(r'\b\d+(?:\.\d+)?%')
+
+# Entities are reported grouped by label in this order, each group in text order
+ENTITY_PATTERNS = [
+    ("DATE", DATE_PATTERN, 0.9),
+    ("MONEY", MONEY_PATTERN, 0.85),
+    ("PERCENT", PERCENT_PATTERN, 0.9),
+]
+
+# Every entity starts at a `$` or at a digit with a word boundary (`\b\d`) before it; the
+# lookbehind drops digits that follow a word character without leaving the regex engine
+ENTITY_TRIGGERS = re.compile(r'[$\d](?<!\w\d)\d*')
+
+
+# What a scan can compute; callers that only need some outputs pass a subset
+SCAN_PARTS = frozenset({"features", "language", "lexicon", "ner"})
+
+
+def untimed(stage: str) -> ContextManager:
+    return nullcontext()
+
+
+class TextScan(NamedTuple):
+    languages: List[str]  # scripts present, in SCRIPT_RANGES order
+    word_count: int
+    word_length_total: int
+    terminator_runs: int
+    technical_terms: int
+    term_counts: Counter  # lexicon term occurrences
+    entities: List[Dict[str, Any]]
+
+    @property
+    def language(self) -> str:
+        return self.languages[0] if self.languages else "en"
+
+    @property
+    def sentence_count(self) -> int:
+        # Splitting on n terminator runs gives n + 1 sentences
+        return self.terminator_runs + 1
+
+
+def detect_scripts(text: str) -> List[str]:
+    """Languages whose script appears in `text`, in SCRIPT_RANGES order"""
+    if text.isascii():
+        return []
+    encoded = text.encode('utf-8', 'surrogatepass')
+    return [
+        language for language, prefixes in SCRIPT_UTF8_PREFIXES
+        if any(prefix in encoded for prefix in prefixes)
+    ]
+
+
+def find_entities(text: str) -> List[Dict[str, Any]]:
+    """Same entities as running each pattern's findall in turn, from one scan for candidate starts"""
+    dates, amounts, percents = [], [], []
+    match_date, match_money, match_percent = DATE_PATTERN.match, MONEY_PATTERN.match, PERCENT_PATTERN.match
+    # findall resumes after each match, so a pattern is only tried again past its last match
+    date_resume = money_resume = percent_resume = 0
+
+    for trigger in ENTITY_TRIGGERS.finditer(text):
+        start = trigger.start()
+        if text[start] == '$':
+            if start >= money_resume:
+                match = match_money(text, start)
+                if match:
+                    amounts.append(match.group())
+                    money_resume = match.end()
+            # Digits right after the `$` are a candidate start of their own
+            start += 1
+            if start == trigger.end():
+                continue
+        if start >= date_resume:
+            match = match_date(text, start)
+            if match:
+                dates.append(match.group())
+                date_resume = match.end()
+        if start >= money_resume:
+            match = match_money(text, start)
+            if match:
+                amounts.append(match.group())
+                money_resume = match.end()
+        if start >= percent_resume:
+            match = match_percent(text, start)
+            if match:
+                percents.append(match.group())
+                percent_resume = match.end()
+
+    found = {"DATE": dates, "MONEY": amounts, "PERCENT": percents}
+    return [
+        {"text": value, "label": label, "confidence": confidence}
+        for label, _, confidence in ENTITY_PATTERNS
+        for value in found[label]
+    ]
+
+
+class TextScanner:
+    """Everything the rule-based stages read from a text, from one split and one entity scan
+
+    Terminator runs and technical terms never span whitespace, so they are looked for once per
+    distinct word and weighted by its frequency; lexicon terms are matched by Lexicon.count_tokens.
+    """
+
+    def __init__(self, technical_terms: Optional[Pattern] = None, lexicon: Optional["Lexicon"] = None, entities: bool = True):
+        self.lexicon = lexicon
+        self.entities = entities
+        patterns = [f'(?P<terminators>{SENTENCE_TERMINATORS.pattern})']
+        if technical_terms is not None:
+            patterns.append(f'(?P<term>{technical_terms.pattern})')
+        self.word_pattern = re.compile('|'.join(patterns))
+
+    def scan(self, text: str, timer: Callable[[str], ContextManager] = untimed, parts: AbstractSet[str] = SCAN_PARTS) -> TextScan:
+        """Scan `text` for the requested `parts`; the others keep empty values
+
+        `timer(stage)` wraps the work of each stage (features, language, sentiment, ner).
+        """
+        word_count = word_length_total = terminator_runs = technical_terms = 0
+        term_counts = Counter()
+        languages = []
+        entities = []
+
+        if "features" in parts or "lexicon" in parts:
+            with timer("features"):
+                tokens = text.split()
+                vocabulary = Counter(tokens)
+                # Lowercasing never produces or removes a space, so the i-th word of `words` is the i-th distinct word
+                words = ' '.join(vocabulary).lower()
+                lowered = words.split(' ')
+                word_count = len(tokens)
+
+                if "features" in parts:
+                    frequencies = list(vocabulary.values())
+                    word_ends = list(accumulate(map((1).__add__, map(len, lowered))))
+                    counts = {'terminators': 0, 'term': 0}
+                    for match in self.word_pattern.finditer(words):
+                        counts[match.lastgroup] += frequencies[bisect_right(word_ends, match.start())]
+                    terminator_runs, technical_terms = counts['terminators'], counts['term']
+                    word_length_total = sum(map(operator.mul, map(len, vocabulary), frequencies))
+
+        if "language" in parts:
+            with timer("language"):
+                languages = detect_scripts(text)
+        # Lexicon terms feed sentiment (and the technical-term feature)
+        if "lexicon" in parts and self.lexicon:
+            with timer("sentiment"):
+                term_counts = self.lexicon.count_tokens(tokens, vocabulary, lowered)
+        if "ner" in parts and self.entities:
+            with timer("ner"):
+                entities = find_entities(text)
+
+        return TextScan(
+            languages=languages,
+            word_count=word_count,
+            word_length_total=word_length_total,
+            terminator_runs=terminator_runs,
+            technical_terms=technical_terms,
+            term_counts=term_counts,
+            entities=entities
+        )
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Train the full service's delay model from historical project durations
+Fits a Cox proportional hazards model and saves its coefficients and daily baseline hazard as a versioned artifact
+"""
+
+import os
+import sys
+import json
+import math
+import hashlib
+import argparse
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from delay_model import COVARIATE_NAMES, DELAY_MODEL_PATH, DelayModel, delay_covariates
+from portfolio import ISSUE_COLUMN, project_column
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_dataset(path: str, duration_column: str, event_column: str):
+    """Covariates, delay days and completion flags from a CSV of past projects"""
+    frame = pd.read_csv(path, dtype={ISSUE_COLUMN: 'string'})
+    if duration_column not in frame:
+        raise ValueError(f"{path} is missing column: {duration_column}")
+    durations = pd.to_numeric(frame[duration_column], errors='coerce').to_numpy(dtype=np.float64)
+    if np.isnan(durations).any() or (durations < 0).any():
+        raise ValueError(f"{path}: `{duration_column}` must be a number of days >= 0 in every row")
+    if event_column in frame:
+        events = pd.to_numeric(frame[event_column], errors='coerce').to_numpy(dtype=np.float64)
+        if not np.isin(events, (0, 1)).all():
+            raise ValueError(f"{path}: `{event_column}` must be 0 (still running) or 1 (completed) in every row")
+    else:
+        logger.warning(f"No `{event_column}` column; treating every project as completed")
+        events = np.ones(len(frame))
+    if not len(frame):
+        raise ValueError(f"{path} has no rows")
+    issue_types = frame[ISSUE_COLUMN] if ISSUE_COLUMN in frame else [None] * len(frame)
+    covariates = delay_covariates(
+        issue_types, *(project_column(frame, name) for name in ('budget', 'timeline_days', 'complexity', 'technical_terms'))
+    )
+    return covariates, durations, events.astype(bool)
+
+
+def fit_cox(covariates: np.ndarray, durations: np.ndarray, events: np.ndarray, penalizer: float, horizon_days: int):
+    """Coefficients, standardization and the daily baseline cumulative hazard of a fitted Cox model"""
+    from lifelines import CoxPHFitter
+
+    means = covariates.mean(axis=0)
+    scales = covariates.std(axis=0)
+    # Constant covariates (e.g. an issue type absent from the data) cannot be fitted; they keep a zero coefficient
+    varying = scales > 0
+    scales = np.where(varying, scales, 1.0)
+    names = [name for name, keep in zip(COVARIATE_NAMES, varying) if keep]
+
+    # Centred inputs, so the fitted baseline hazard is the one at the training means
+    frame = pd.DataFrame(((covariates - means) / scales)[:, varying], columns=names)
+    frame['duration'] = durations
+    frame['event'] = events
+    fitter = CoxPHFitter(penalizer=penalizer)
+    fitter.fit(frame, duration_col='duration', event_col='event')
+
+    coefficients = np.zeros(len(COVARIATE_NAMES))
+    coefficients[varying] = fitter.params_[names].to_numpy()
+    cumulative = fitter.baseline_cumulative_hazard_.iloc[:, 0]
+    times, hazard = cumulative.index.to_numpy(dtype=np.float64), cumulative.to_numpy(dtype=np.float64)
+    # Step function sampled at whole days: the cumulative hazard of all events up to and including day d
+    positions = np.searchsorted(times, np.arange(horizon_days + 1), side='right') - 1
+    baseline_hazard = np.where(positions >= 0, hazard[np.maximum(positions, 0)], 0.0)
+    return coefficients, means, scales, baseline_hazard, fitter
+
+
+def concordance(model: DelayModel, covariates: np.ndarray, durations: np.ndarray, events: np.ndarray) -> float:
+    from lifelines.utils import concordance_index
+
+    # Higher hazard means a shorter delay, so the predicted score is the negated hazard ratio
+    return float(concordance_index(durations, -model.hazard_ratios(covariates), events))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the DPR delay model (Cox PH) and save a versioned artifact")
+    parser.add_argument("dataset", help="CSV of past projects: `delay_days`, `completed` (0/1) and optional `issue_type`, `budget`, `timeline_days`, `complexity`, `technical_terms` columns")
+    parser.add_argument("--output", default=DELAY_MODEL_PATH, help=f"Artifact path (default: {DELAY_MODEL_PATH})")
+    parser.add_argument("--version", help="Artifact version (default: UTC timestamp plus dataset hash prefix)")
+    parser.add_argument("--duration-column", default="delay_days", help="Days past the planned end until completion, or until now for running projects")
+    parser.add_argument("--event-column", default="completed")
+    parser.add_argument("--horizon-days", type=int, help="Last day of the predicted delay distribution (default: longest delay in the data)")
+    parser.add_argument("--penalizer", type=float, default=0.01, help="L2 penalty on the coefficients")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Fraction held out for evaluation (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import lifelines
+
+    try:
+        covariates, durations, events = load_dataset(args.dataset, args.duration_column, args.event_column)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Could not read dataset: {e}")
+        sys.exit(1)
+    if not events.any():
+        logger.error("❌ Dataset needs at least one completed project")
+        sys.exit(1)
+    logger.info(f"Loaded {len(durations)} projects ({events.mean():.1%} completed) from {args.dataset}")
+
+    horizon_days = args.horizon_days or max(1, math.ceil(durations.max()))
+    dataset_hash = file_sha256(args.dataset)
+    trained_at = datetime.now(timezone.utc)
+    version = args.version or f"{trained_at.strftime('%Y%m%d.%H%M%S')}-{dataset_hash[:8]}"
+
+    evaluation = None
+    if args.test_size > 0:
+        order = np.random.default_rng(args.seed).permutation(len(durations))
+        holdout = order[:int(len(order) * args.test_size)]
+        train = order[len(holdout):]
+        if len(holdout) and events[holdout].any():
+            fitted = fit_cox(covariates[train], durations[train], events[train], args.penalizer, horizon_days)
+            model = DelayModel(*fitted[:4], {'version': version})
+            evaluation = {
+                'holdout_rows': int(len(holdout)),
+                'concordance': concordance(model, covariates[holdout], durations[holdout], events[holdout])
+            }
+            logger.info(f"Holdout: concordance {evaluation['concordance']:.3f}")
+        else:
+            logger.warning("Holdout has no completed projects; skipping evaluation")
+
+    # The shipped model is refit on every row
+    coefficients, means, scales, baseline_hazard, fitter = fit_cox(covariates, durations, events, args.penalizer, horizon_days)
+    metadata = {
+        'version': version,
+        'trained_at': trained_at.isoformat(),
+        'dataset': os.path.basename(args.dataset),
+        'dataset_sha256': dataset_hash,
+        'rows': int(len(durations)),
+        'completed_rate': float(events.mean()),
+        'horizon_days': horizon_days,
+        'penalizer': args.penalizer,
+        'seed': args.seed,
+        'train_concordance': float(fitter.concordance_index_),
+        'hazard_ratios': dict(zip(COVARIATE_NAMES, np.exp(coefficients / scales).round(6).tolist())),
+        'lifelines_version': lifelines.__version__,
+        'evaluation': evaluation
+    }
+    DelayModel(coefficients, means, scales, baseline_hazard, metadata).save(args.output)
+    logger.info(f"✅ Saved delay model {version} to {args.output}")
+    print(json.dumps(metadata, indent=2))
+
+
+if __name__ == "__main__":
+    main()
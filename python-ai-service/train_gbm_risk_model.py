@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Train the full service's gradient-boosted risk model from a labelled dataset
+Fits an XGBoost or LightGBM classifier on the extract_features feature set and saves the native booster as a versioned artifact
+"""
+
+import os
+import sys
+import csv
+import json
+import hashlib
+import argparse
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+
+from features import extract_features
+from gbm_risk import GBM_LIBRARIES, GBM_RISK_MODEL_PATH, GBMRiskModel, risk_feature_rows, save_gbm_artifact
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Optional numeric project columns, passed to extract_features as project_data
+PROJECT_COLUMNS = ['budget', 'timeline_days', 'team_size', 'complexity']
+# Training rows stored in the artifact for warmup and for checking the compiled predictor
+SAMPLE_ROWS = 64
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_dataset(path: str, text_column: str, label_column: str, issue_column: str):
+    """Feature matrix and 0/1 labels from a CSV with text, label, optional issue type and project columns"""
+    features, issue_types, labels = [], [], []
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = {text_column, label_column} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{path} is missing column(s): {', '.join(sorted(missing))}")
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                project_data = {
+                    column: float(row[column]) for column in PROJECT_COLUMNS if row.get(column) not in (None, '')
+                }
+                label = int(float(row[label_column]))
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: {e}")
+            if label not in (0, 1):
+                raise ValueError(f"{path}:{line_number}: label must be 0 or 1, got {label}")
+            features.append(extract_features(row[text_column], project_data))
+            issue_types.append(row.get(issue_column) or None)
+            labels.append(label)
+    if not features:
+        raise ValueError(f"{path} has no rows")
+    return risk_feature_rows(features, issue_types), np.array(labels)
+
+
+def build_classifier(args):
+    if args.library == 'xgboost':
+        from xgboost import XGBClassifier
+        return XGBClassifier(
+            n_estimators=args.n_estimators, max_depth=args.max_depth, learning_rate=args.learning_rate,
+            n_jobs=args.threads, random_state=args.seed, objective='binary:logistic'
+        )
+    from lightgbm import LGBMClassifier
+    return LGBMClassifier(
+        n_estimators=args.n_estimators, max_depth=args.max_depth, num_leaves=args.num_leaves,
+        learning_rate=args.learning_rate, n_jobs=args.threads, random_state=args.seed, verbose=-1
+    )
+
+
+def native_booster(classifier, library: str):
+    return classifier.get_booster() if library == 'xgboost' else classifier.booster_
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the DPR gradient-boosted risk model and save a versioned artifact")
+    parser.add_argument("dataset", help="CSV file with `text`, `high_risk` (0/1) and optional `issue_type`, `budget`, `timeline_days`, `team_size`, `complexity` columns")
+    parser.add_argument("--library", choices=GBM_LIBRARIES, default="xgboost")
+    parser.add_argument("--output", default=GBM_RISK_MODEL_PATH, help=f"Artifact metadata path; the booster is saved next to it (default: {GBM_RISK_MODEL_PATH})")
+    parser.add_argument("--version", help="Artifact version (default: UTC timestamp plus dataset hash prefix)")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="high_risk")
+    parser.add_argument("--issue-column", default="issue_type")
+    parser.add_argument("--n-estimators", type=int, default=200)
+    parser.add_argument("--max-depth", type=int, default=6)
+    parser.add_argument("--num-leaves", type=int, default=31, help="LightGBM only")
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Training threads")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Fraction held out for evaluation (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    from sklearn.model_selection import train_test_split
+
+    try:
+        X, y = load_dataset(args.dataset, args.text_column, args.label_column, args.issue_column)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Could not read dataset: {e}")
+        sys.exit(1)
+    if len(set(y)) < 2:
+        logger.error("❌ Dataset needs both 0 and 1 labels")
+        sys.exit(1)
+    logger.info(f"Loaded {len(y)} rows ({y.mean():.1%} high risk) from {args.dataset}")
+
+    dataset_hash = file_sha256(args.dataset)
+    trained_at = datetime.now(timezone.utc)
+    version = args.version or f"{trained_at.strftime('%Y%m%d.%H%M%S')}-{dataset_hash[:8]}"
+
+    evaluation = None
+    if args.test_size > 0:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=args.test_size, random_state=args.seed, stratify=y
+        )
+        probabilities = build_classifier(args).fit(X_train, y_train).predict_proba(X_test)[:, 1]
+        evaluation = {
+            'holdout_rows': int(len(y_test)),
+            'accuracy': float(accuracy_score(y_test, probabilities > 0.5)),
+            'roc_auc': float(roc_auc_score(y_test, probabilities)) if len(set(y_test)) > 1 else None
+        }
+        logger.info(f"Holdout: accuracy {evaluation['accuracy']:.3f}, ROC AUC {evaluation['roc_auc']}")
+
+    # The shipped model is refit on every row
+    classifier = build_classifier(args).fit(X, y)
+    metadata = {
+        'version': version,
+        'trained_at': trained_at.isoformat(),
+        'dataset': os.path.basename(args.dataset),
+        'dataset_sha256': dataset_hash,
+        'rows': int(len(y)),
+        'positive_rate': float(y.mean()),
+        'n_estimators': args.n_estimators,
+        'max_depth': args.max_depth,
+        'learning_rate': args.learning_rate,
+        'seed': args.seed,
+        'library_version': sys.modules[args.library].__version__,
+        'evaluation': evaluation,
+        'sample_rows': X[:SAMPLE_ROWS].tolist()
+    }
+    save_gbm_artifact(args.output, args.library, native_booster(classifier, args.library), metadata)
+
+    # Reload the way the service does; compiling checks the flattened trees against the booster
+    GBMRiskModel.load(args.output, predictor='compiled', threads=1)
+    logger.info(f"✅ Saved {args.library} risk model {version} to {args.output}")
+    print(json.dumps({key: value for key, value in metadata.items() if key != 'sample_rows'}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Train the basic service's risk model from a labelled dataset
+Fits the feature scaler and random forest and saves them as a versioned artifact
+"""
+
+import os
+import sys
+import csv
+import json
+import hashlib
+import argparse
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+
+from features import extract_feature_row
+from risk_artifact import RISK_MODEL_PATH, save_risk_artifact
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Optional numeric project columns, passed to extract_feature_row as project_data
+PROJECT_COLUMNS = ['budget', 'timeline_days']
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_dataset(path: str, text_column: str, label_column: str):
+    """Feature matrix and 0/1 labels from a CSV with a text column, a label column and optional project columns"""
+    rows, labels = [], []
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = {text_column, label_column} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{path} is missing column(s): {', '.join(sorted(missing))}")
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                project_data = {
+                    column: float(row[column]) for column in PROJECT_COLUMNS if row.get(column) not in (None, '')
+                }
+                label = int(float(row[label_column]))
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: {e}")
+            if label not in (0, 1):
+                raise ValueError(f"{path}:{line_number}: label must be 0 or 1, got {label}")
+            rows.append(extract_feature_row(row[text_column], project_data)[0])
+            labels.append(label)
+    if not rows:
+        raise ValueError(f"{path} has no rows")
+    return np.vstack(rows), np.array(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the DPR risk model and save a versioned artifact")
+    parser.add_argument("dataset", help="CSV file with `text`, `high_risk` (0/1) and optional `budget`, `timeline_days` columns")
+    parser.add_argument("--output", default=RISK_MODEL_PATH, help=f"Artifact path (default: {RISK_MODEL_PATH})")
+    parser.add_argument("--version", help="Artifact version (default: UTC timestamp plus dataset hash prefix)")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="high_risk")
+    parser.add_argument("--n-estimators", type=int, default=50)
+    parser.add_argument("--test-size", type=float, default=0.2, help="Fraction held out for evaluation (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    from sklearn.model_selection import train_test_split
+    import sklearn
+
+    try:
+        X, y = load_dataset(args.dataset, args.text_column, args.label_column)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Could not read dataset: {e}")
+        sys.exit(1)
+    if len(set(y)) < 2:
+        logger.error("❌ Dataset needs both 0 and 1 labels")
+        sys.exit(1)
+    logger.info(f"Loaded {len(y)} rows ({y.mean():.1%} high risk) from {args.dataset}")
+
+    dataset_hash = file_sha256(args.dataset)
+    trained_at = datetime.now(timezone.utc)
+    version = args.version or f"{trained_at.strftime('%Y%m%d.%H%M%S')}-{dataset_hash[:8]}"
+
+    evaluation = None
+    if args.test_size > 0:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=args.test_size, random_state=args.seed, stratify=y
+        )
+        scaler = StandardScaler().fit(X_train)
+        model = RandomForestClassifier(n_estimators=args.n_estimators, random_state=args.seed)
+        model.fit(scaler.transform(X_train), y_train)
+        probabilities = model.predict_proba(scaler.transform(X_test))[:, 1]
+        evaluation = {
+            'holdout_rows': int(len(y_test)),
+            'accuracy': float(accuracy_score(y_test, probabilities > 0.5)),
+            'roc_auc': float(roc_auc_score(y_test, probabilities)) if len(set(y_test)) > 1 else None
+        }
+        logger.info(f"Holdout: accuracy {evaluation['accuracy']:.3f}, ROC AUC {evaluation['roc_auc']}")
+
+    # The shipped model is refit on every row
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=args.n_estimators, random_state=args.seed)
+    model.fit(scaler.transform(X), y)
+
+    metadata = {
+        'version': version,
+        'trained_at': trained_at.isoformat(),
+        'dataset': os.path.basename(args.dataset),
+        'dataset_sha256': dataset_hash,
+        'rows': int(len(y)),
+        'positive_rate': float(y.mean()),
+        'n_estimators': args.n_estimators,
+        'seed': args.seed,
+        'sklearn_version': sklearn.__version__,
+        'evaluation': evaluation
+    }
+    save_risk_artifact(args.output, scaler, model, metadata)
+    logger.info(f"✅ Saved risk model {version} to {args.output}")
+    print(json.dumps(metadata, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -61,16 +61,21 @@ class AIServiceClient {
         issue_type,
         language = 'en',
         include_risk_assessment = true,
-        include_delay_prediction = true
+        include_delay_prediction = true,
+        use_cache = true,
+        fields
       } = data;
 
+      // `fields` (e.g. ['risk', 'completeness']) limits the analysis to what the caller shows
       const requestPayload = {
         text,
         project_data,
         issue_type,
         language,
         include_risk_assessment,
-        include_delay_prediction
+        include_delay_prediction,
+        use_cache,
+        ...(fields && { fields })
       };
 
       const response = await this.client.post('/analyze', requestPayload);
@@ -89,6 +94,84 @@ class AIServiceClient {
     }
   }
 
+  // Streaming DPR analysis - onEvent(event, data) is called for each stage as it completes,
+  // ending with a 'summary' event that carries the full analysis
+  async analyzeDPRStream(data, onEvent) {
+    try {
+      const response = await this.client.post('/analyze/stream', data, {
+        responseType: 'stream',
+        headers: { Accept: 'application/x-ndjson' }
+      });
+
+      let summary = null;
+      let buffered = '';
+      for await (const chunk of response.data) {
+        buffered += chunk.toString('utf8');
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        for (const line of lines.filter(Boolean)) {
+          const { event, data: eventData } = JSON.parse(line);
+          if (event === 'error') {
+            throw new Error(eventData.detail);
+          }
+          if (event === 'summary') {
+            summary = eventData;
+          }
+          onEvent(event, eventData);
+        }
+      }
+
+      return {
+        success: summary !== null,
+        data: summary
+      };
+    } catch (error) {
+      console.error('AI Service streaming analysis error:', error.message);
+      return {
+        success: false,
+        error: error.message,
+        fallback: this.generateFallbackAnalysis(data)
+      };
+    }
+  }
+
+  // Batch DPR analysis - one request for many reports, results in input order
+  async analyzeDPRBatch(items) {
+    try {
+      const requests = items.map(({
+        text,
+        project_data = {},
+        issue_type,
+        language = 'en',
+        include_risk_assessment = true,
+        include_delay_prediction = true,
+        fields
+      }) => ({
+        text,
+        project_data,
+        issue_type,
+        language,
+        include_risk_assessment,
+        include_delay_prediction,
+        ...(fields && { fields })
+      }));
+
+      const response = await this.client.post('/analyze/batch', { requests });
+
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      console.error('AI Service batch analysis error:', error.message);
+      return {
+        success: false,
+        error: error.message,
+        fallback: items.map(item => this.generateFallbackAnalysis(item))
+      };
+    }
+  }
+
   // File analysis
   async analyzeFiles(data) {
     try {
@@ -96,14 +179,16 @@ class AIServiceClient {
         file_content,
         file_type,
         issue_type,
-        language = 'en'
+        language = 'en',
+        fields
       } = data;
 
       const requestPayload = {
         file_content,
         file_type,
         issue_type,
-        language
+        language,
+        ...(fields && { fields })
       };
 
       const response = await this.client.post('/analyze-files', requestPayload);
@@ -122,6 +207,239 @@ class AIServiceClient {
     }
   }
 
+  // File analysis for a file on disk, streamed to the service instead of sent inside JSON
+  async analyzeFileUpload(data) {
+    try {
+      const {
+        file_path,
+        file_type = 'text/plain',
+        issue_type,
+        encoding = 'utf-8'
+      } = data;
+
+      const fs = require('fs');
+      const response = await this.client.post('/analyze-files/upload', fs.createReadStream(file_path), {
+        params: { issue_type, file_type, encoding },
+        headers: { 'Content-Type': file_type },
+        maxBodyLength: Infinity
+      });
+
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      console.error('AI Service file upload analysis error:', error.message);
+      return {
+        success: false,
+        error: error.message,
+        fallback: this.generateFallbackFileAnalysis(data)
+      };
+    }
+  }
+
+  // Queue a file analysis job - returns at once with { job_id, status, queue_position }
+  async submitFileAnalysisJob(data) {
+    try {
+      const {
+        file_content,
+        file_type,
+        issue_type,
+        language = 'en',
+        fields,
+        priority = 0
+      } = data;
+
+      const response = await this.client.post('/jobs/analyze-files', {
+        file_content,
+        file_type,
+        issue_type,
+        language,
+        priority,
+        ...(fields && { fields })
+      });
+
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      console.error('AI Service job submission error:', error.message);
+      return {
+        success: false,
+        error: error.message
+      };
+    }
+  }
+
+  // Queue the analysis of a file on disk, streamed to the service
+  async submitFileUploadJob(data) {
+    try {
+      const {
+        file_path,
+        file_type = 'text/plain',
+        issue_type,
+        encoding = 'utf-8',
+        priority = 0
+      } = data;
+
+      const fs = require('fs');
+      const response = await this.client.post('/jobs/analyze-files/upload', fs.createReadStream(file_path), {
+        params: { issue_type, file_type, encoding, priority },
+        headers: { 'Content-Type': file_type },
+        maxBodyLength: Infinity
+      });
+
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      console.error('AI Service upload job submission error:', error.message);
+      return {
+        success: false,
+        error: error.message
+      };
+    }
+  }
+
+  // Job status: queued, running, succeeded, failed or cancelled
+  async getJob(jobId) {
+    try {
+      const response = await this.client.get(`/jobs/${jobId}`);
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.message
+      };
+    }
+  }
+
+  // Job result; `pending` is true while the job is still queued or running
+  async getJobResult(jobId) {
+    try {
+      const response = await this.client.get(`/jobs/${jobId}/result`);
+      return {
+        success: true,
+        pending: response.status === 202,
+        data: response.data
+      };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.detail?.error || error.message,
+        job: error.response?.data?.detail
+      };
+    }
+  }
+
+  async cancelJob(jobId) {
+    try {
+      const response = await this.client.delete(`/jobs/${jobId}`);
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.message
+      };
+    }
+  }
+
+  // Poll a job until it finishes; each request is short, so long analyses are not cut off by this.timeout
+  async waitForJob(jobId, { pollInterval = 2000, timeout = 30 * 60 * 1000 } = {}) {
+    const deadline = Date.now() + timeout;
+    while (Date.now() < deadline) {
+      const result = await this.getJobResult(jobId);
+      if (!result.success || !result.pending) {
+        return result;
+      }
+      await new Promise(resolve => setTimeout(resolve, pollInterval));
+    }
+    return {
+      success: false,
+      error: `Job ${jobId} did not finish within ${timeout} ms`,
+      job_id: jobId
+    };
+  }
+
+  // File analysis through the job queue, for files too large to analyze within one request
+  async analyzeFilesAsJob(data, options = {}) {
+    const submitted = data.file_path
+      ? await this.submitFileUploadJob(data)
+      : await this.submitFileAnalysisJob(data);
+    const result = submitted.success
+      ? await this.waitForJob(submitted.data.job_id, options)
+      : submitted;
+
+    if (result.success) {
+      return {
+        success: true,
+        data: result.data
+      };
+    }
+    return {
+      success: false,
+      error: result.error,
+      job_id: submitted.data?.job_id,
+      fallback: this.generateFallbackFileAnalysis(data)
+    };
+  }
+
+  // Add reports ({ id, text, metadata }) to the similar-report index; an indexed id is replaced
+  async indexReports(items) {
+    try {
+      const response = await this.client.post('/embeddings/index', { items });
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.detail || error.message
+      };
+    }
+  }
+
+  async removeIndexedReport(id) {
+    try {
+      const response = await this.client.delete(`/embeddings/${encodeURIComponent(id)}`);
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.detail || error.message
+      };
+    }
+  }
+
+  // Most similar indexed reports to a text, or to an indexed report by id
+  async findSimilarReports({ text, id, top_k = 10 }) {
+    try {
+      const response = await this.client.post('/similar', { text, id, top_k });
+      return {
+        success: true,
+        data: response.data
+      };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.detail || error.message,
+        data: { results: [] }
+      };
+    }
+  }
+
   // Fallback analysis when AI service is unavailable
   generateFallbackAnalysis(data) {
     const { issue_type, text } = data;
@@ -230,26 +548,23 @@ async function enhancedFileAnalysis(files, issue_type) {
   const analyses = [];
 
   for (const file of files) {
-    // Read file content (simplified - in practice you'd handle different file types)
-    let fileContent = '';
-    try {
-      if (file.mimetype.startsWith('text/')) {
-        const fs = require('fs').promises;
-        fileContent = await fs.readFile(file.path, 'utf8');
-      } else {
-        fileContent = `Binary file: ${file.originalname} (${file.size} bytes)`;
-      }
-    } catch (error) {
-      fileContent = `Error reading file: ${error.message}`;
+    let result;
+    if (file.mimetype.startsWith('text/') && file.path) {
+      // Text files are streamed from disk so the whole document is analyzed without buffering it here
+      result = await aiService.analyzeFileUpload({
+        file_path: file.path,
+        file_type: file.mimetype,
+        issue_type
+      });
+    } else {
+      result = await aiService.analyzeFiles({
+        file_content: `Binary file: ${file.originalname} (${file.size} bytes)`,
+        file_type: file.mimetype,
+        issue_type,
+        language: 'en'
+      });
     }
 
-    const result = await aiService.analyzeFiles({
-      file_content: fileContent.substring(0, 2000), // Limit content length
-      file_type: file.mimetype,
-      issue_type,
-      language: 'en'
-    });
-
     analyses.push({
       filename: file.originalname,
       size: file.size,